@@ -0,0 +1,111 @@
+"""TicketWorkflow 端到端基准：在模拟设备上多次执行完整流程，输出提交订单耗时的分位数。
+
+用法:
+    python benchmarks/bench_workflow.py --iterations 20
+    python benchmarks/bench_workflow.py --mode fire --popup-rate 0.3 --sold-out 1
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from loguru import logger  # noqa: E402
+
+from ticket_purchase.simulator import FakeDevice, Scenario  # noqa: E402
+from ticket_purchase.workflow import TicketConfig, TicketWorkflow  # noqa: E402
+
+
+def percentile(values: list[float], p: float) -> float:
+    ranked = sorted(values)
+    k = (len(ranked) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(ranked) - 1)
+    return ranked[lo] + (ranked[hi] - ranked[lo]) * (k - lo)
+
+
+def run_once(args, seed: int) -> dict:
+    """执行一次流程，返回耗时与设备统计。"""
+    prices = [("¥380", True), ("¥680", True), ("¥980", True)]
+    for i in range(min(args.sold_out, len(prices))):
+        prices[i] = (prices[i][0], False)
+    scenario = Scenario(
+        keyword="演唱会", prices=prices, viewer_popup=not args.no_viewer_popup,
+        popup_rate=args.popup_rate, rpc_latency=args.rpc_latency,
+        dump_latency=args.dump_latency, page_delay=args.page_delay, seed=seed,
+    )
+    device = FakeDevice(scenario)
+    config = TicketConfig(keyword="演唱会", city="上海", users=["张三", "李四"][:args.users],
+                          max_retry=1, burst_tap=args.burst)
+    workflow = TicketWorkflow(device, config)
+
+    if args.mode == "fire":
+        # 预置不计时，只测量开抢（点击预定）之后的耗时
+        if not workflow.prepare():
+            return {"success": False, "seconds": None, "rpcs": device.rpc_count,
+                    "dumps": device.dump_count, "wasted": device.app.wasted_taps}
+
+    rpcs_before = device.rpc_count
+    dumps_before = device.dump_count
+    start = time.monotonic()
+    success = workflow.run_with_retry()
+    submitted = device.app.submitted_at
+    return {
+        "success": success and submitted is not None,
+        "seconds": submitted - start if submitted is not None else None,
+        "rpcs": device.rpc_count - rpcs_before,
+        "dumps": device.dump_count - dumps_before,
+        "wasted": device.app.wasted_taps,
+    }
+
+
+def report(results: list[dict], args):
+    times = [r["seconds"] for r in results if r["success"]]
+    print()
+    print(f"模式: {args.mode}  迭代: {len(results)}  成功: {len(times)}/{len(results)}")
+    print(f"场景: rpc={args.rpc_latency * 1000:.0f}ms dump={args.dump_latency * 1000:.0f}ms "
+          f"页面跳转={args.page_delay * 1000:.0f}ms 弹窗率={args.popup_rate} 售罄票档={args.sold_out}")
+    if times:
+        print(f"提交订单耗时 (秒): min={min(times):.2f} p50={percentile(times, 50):.2f} "
+              f"p90={percentile(times, 90):.2f} p99={percentile(times, 99):.2f} max={max(times):.2f} "
+              f"mean={statistics.mean(times):.2f}")
+    print(f"每次 RPC: {statistics.mean(r['rpcs'] for r in results):.0f}  "
+          f"dump: {statistics.mean(r['dumps'] for r in results):.0f}  "
+          f"无效点击: {statistics.mean(r['wasted'] for r in results):.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TicketWorkflow 模拟设备基准")
+    parser.add_argument("--iterations", "-n", type=int, default=20)
+    parser.add_argument("--mode", choices=["full", "fire"], default="full",
+                        help="full: 完整流程计时; fire: 预置后只计时开抢步骤")
+    parser.add_argument("--rpc-latency", type=float, default=0.02, help="普通 RPC 耗时（秒）")
+    parser.add_argument("--dump-latency", type=float, default=0.08, help="dump_hierarchy 耗时（秒）")
+    parser.add_argument("--page-delay", type=float, default=0.3, help="页面跳转耗时（秒）")
+    parser.add_argument("--popup-rate", type=float, default=0.0, help="页面跳转后出现广告弹窗的概率")
+    parser.add_argument("--sold-out", type=int, default=0, help="前 N 个票档售罄")
+    parser.add_argument("--users", type=int, default=2, choices=[1, 2], help="购票人数")
+    parser.add_argument("--no-viewer-popup", action="store_true", help="不出现观演人弹窗")
+    parser.add_argument("--burst", action="store_true", help="启用购买按钮连拍")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    # 基准只测量本地流程：禁用 LLM；截图只保留在内存，失败时才写盘
+    os.environ["LLM_PROVIDER"] = ""
+    os.environ.setdefault("SCREENSHOT_RING", "4")
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    results = []
+    for i in range(args.iterations):
+        result = run_once(args, seed=i)
+        results.append(result)
+        seconds = f"{result['seconds']:.2f}s" if result["seconds"] is not None else "-"
+        print(f"[{i + 1}/{args.iterations}] {'成功' if result['success'] else '失败'} {seconds}")
+    report(results, args)
+
+
+if __name__ == "__main__":
+    main()
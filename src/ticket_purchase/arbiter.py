@@ -0,0 +1,228 @@
+"""设备访问仲裁：串行化 u2 RPC，工作流优先于后台轮询，并统计排队耗时。"""
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+
+from loguru import logger
+
+from .trace import tracer
+
+# 优先级：数值越小越优先
+PRIORITY_WORKFLOW = 0  # 工作流热路径（默认）
+PRIORITY_WATCHER = 10  # 后台弹窗监听等轮询
+
+# 排队超过该时长（秒）时记录调试日志
+_SLOW_WAIT = 0.05
+
+# 阻塞等待（UiObject.wait / wait_gone）改为逐次查询，两次查询之间释放设备（秒）
+WAIT_POLL_INTERVAL = 0.05
+_WAIT_METHODS = {"wait", "wait_gone"}
+_DEFAULT_WAIT_TIMEOUT = 10.0
+
+
+class DeviceArbiter:
+    """所有设备 RPC 的仲裁器。
+
+    - 同一时刻只有一个 RPC 在执行（同线程可重入）
+    - 有高优先级线程在排队时，低优先级线程让行
+    - 工作流可声明关键区，期间其他线程的低优先级 RPC 暂停
+    - 线程优先级通过 `thread_priority` 设置，未设置的线程按工作流优先级处理
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self._cond = threading.Condition()
+        self._owner = None
+        self._depth = 0
+        self._waiting: dict[int, int] = {}
+        self._critical: dict[int, int] = {}  # 线程 id -> 关键区嵌套深度
+        self._local = threading.local()
+        self._stats: dict[int, list] = {}  # 优先级 -> [次数, 总排队秒, 最大排队秒]
+
+    def proxy(self) -> "DeviceProxy":
+        """返回经本仲裁器访问设备的代理。"""
+        return DeviceProxy(self)
+
+    @contextmanager
+    def thread_priority(self, priority: int):
+        """在当前线程内以指定优先级访问设备。"""
+        previous = getattr(self._local, "priority", PRIORITY_WORKFLOW)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    @contextmanager
+    def critical(self):
+        """关键区：期间其他线程的低优先级 RPC 暂停（如点击购买、提交订单）。"""
+        tid = threading.get_ident()
+        with self._cond:
+            self._critical[tid] = self._critical.get(tid, 0) + 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._critical[tid] -= 1
+                if not self._critical[tid]:
+                    del self._critical[tid]
+                self._cond.notify_all()
+
+    def paused(self) -> bool:
+        """当前线程的低优先级访问是否被其他线程的关键区暂停。"""
+        tid = threading.get_ident()
+        with self._cond:
+            return any(owner != tid for owner in self._critical)
+
+    @contextmanager
+    def acquire(self, op: str = ""):
+        """获取设备访问权，期间执行一次 RPC。"""
+        tid = threading.get_ident()
+        priority = getattr(self._local, "priority", PRIORITY_WORKFLOW)
+        start = time.perf_counter()
+        with self._cond:
+            if self._owner == tid:
+                self._depth += 1
+                waited = None
+            else:
+                self._waiting[priority] = self._waiting.get(priority, 0) + 1
+                while self._owner is not None or self._must_yield(priority, tid):
+                    self._cond.wait()
+                self._waiting[priority] -= 1
+                self._owner = tid
+                self._depth = 1
+                waited = time.perf_counter() - start
+                stats = self._stats.setdefault(priority, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += waited
+                stats[2] = max(stats[2], waited)
+
+        if waited is not None and waited > _SLOW_WAIT:
+            logger.debug("设备 RPC 排队 {:.0f}ms (op={}, 优先级={})", waited * 1000, op, priority)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._depth -= 1
+                if not self._depth:
+                    self._owner = None
+                    self._cond.notify_all()
+
+    def _must_yield(self, priority: int, tid: int) -> bool:
+        if any(p < priority and n > 0 for p, n in self._waiting.items()):
+            return True
+        if priority > PRIORITY_WORKFLOW and any(owner != tid for owner in self._critical):
+            return True
+        return False
+
+    def stats(self) -> dict[int, dict]:
+        """各优先级的 RPC 次数与排队耗时（秒）。"""
+        with self._cond:
+            return {
+                p: {"count": c, "total_wait": t, "max_wait": m, "avg_wait": t / c if c else 0.0}
+                for p, (c, t, m) in self._stats.items()
+            }
+
+    def log_stats(self):
+        for priority, s in sorted(self.stats().items()):
+            logger.info("设备 RPC 统计 (优先级 {}): {} 次, 平均排队 {:.1f}ms, 最大 {:.1f}ms",
+                        priority, s["count"], s["avg_wait"] * 1000, s["max_wait"] * 1000)
+
+
+def _is_u2_object(value) -> bool:
+    # 模拟 / 回放设备的 UiObject 以 `arbitrated = True` 声明与 u2 对象同样经代理访问
+    return type(value).__module__.startswith("uiautomator2") or getattr(type(value), "arbitrated", False)
+
+
+class DeviceProxy:
+    """u2 设备（及其返回的 u2 对象）的代理，每次访问都经过仲裁器。
+
+    阻塞等待（`wait` / `wait_gone`）拆成逐次查询，只在每次查询时占用设备。
+    """
+
+    __slots__ = ("_arbiter", "_target")
+
+    def __init__(self, arbiter: DeviceArbiter, target=None):
+        object.__setattr__(self, "_arbiter", arbiter)
+        object.__setattr__(self, "_target", target)
+
+    @property
+    def arbiter(self) -> DeviceArbiter:
+        return self._arbiter
+
+    def _resolve(self):
+        return self._target if self._target is not None else self._arbiter.device
+
+    def _wrap(self, value):
+        return DeviceProxy(self._arbiter, value) if _is_u2_object(value) else value
+
+    def __getattr__(self, name):
+        target = self._resolve()
+        # 属性（如 info）本身就是 RPC，需在仲裁下读取
+        if isinstance(inspect.getattr_static(target, name, None), property):
+            with self._arbiter.acquire(name), tracer.span(name, "rpc"):
+                value = getattr(target, name)
+        else:
+            value = getattr(target, name)
+
+        if name in _WAIT_METHODS and callable(value) and not _is_u2_object(value):
+            def wait(*args, **kwargs):
+                if name == "wait_gone":  # wait_gone(timeout=None)
+                    return self._poll_wait(target, False, *args, **kwargs)
+                return self._poll_wait(target, *args, **kwargs)  # wait(exists=True, timeout=None)
+            return wait
+
+        if callable(value) and not _is_u2_object(value):
+            def call(*args, **kwargs):
+                with self._arbiter.acquire(name), tracer.span(name, "rpc"):
+                    result = value(*args, **kwargs)
+                return self._wrap(result)
+            return call
+        return self._wrap(value)
+
+    def _poll_wait(self, target, exists: bool = True, timeout: float | None = None) -> bool:
+        """以逐次 `exists` 查询实现 wait / wait_gone：每次查询单独获取设备，等待期间不阻塞其他 RPC。"""
+        op = "wait" if exists else "wait_gone"
+        if timeout is None:
+            timeout = getattr(target, "wait_timeout", _DEFAULT_WAIT_TIMEOUT)
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._arbiter.acquire(op), tracer.span(op, "rpc"):
+                present = bool(target.exists)
+            if present == bool(exists):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(min(WAIT_POLL_INTERVAL, max(deadline - time.monotonic(), 0.0)))
+
+    def __setattr__(self, name, value):
+        setattr(self._resolve(), name, value)
+
+    def __call__(self, *args, **kwargs):
+        with self._arbiter.acquire("select"):
+            result = self._resolve()(*args, **kwargs)
+        return self._wrap(result)
+
+    def __getitem__(self, key):
+        with self._arbiter.acquire("getitem"):
+            return self._wrap(self._resolve()[key])
+
+    def __setitem__(self, key, value):
+        self._resolve()[key] = value
+
+    def __bool__(self):
+        with self._arbiter.acquire("bool"):
+            return bool(self._resolve())
+
+    def __len__(self):
+        with self._arbiter.acquire("len"):
+            return len(self._resolve())
+
+    def __iter__(self):
+        with self._arbiter.acquire("iter"):
+            items = list(self._resolve())
+        return iter([self._wrap(item) for item in items])
+
+    def __repr__(self):
+        return f"DeviceProxy({self._resolve()!r})"
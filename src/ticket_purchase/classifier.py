@@ -0,0 +1,102 @@
+"""本地页面分类：按页面特征规则对层级快照打分，毫秒级识别当前页面。"""
+from loguru import logger
+
+from .hierarchy import HierarchySnapshot
+
+# 页面特征 resourceId（命中权重高于关键词）
+PAGE_RESOURCE_IDS = {
+    "首页": ["cn.damai:id/homepage_header_search", "cn.damai:id/homepage_header_search_btn"],
+    "搜索页": ["cn.damai:id/tv_word"],
+    "演出详情": ["cn.damai:id/trade_project_detail_purchase_status_bar_container_fl",
+                 "cn.damai:id/btn_buy"],
+    "数量选择": ["img_jia"],
+    "票档选择": ["btn_buy_view"],
+}
+
+# 以覆盖层形式出现的页面（弹窗 / 底部浮层），特征应位于 XML 末尾
+OVERLAY_PAGES = {"观演人弹窗", "城市选择", "场次选择", "票档选择", "数量选择"}
+
+# XML 末尾多大比例的节点视为覆盖层区域
+OVERLAY_TAIL_RATIO = 0.35
+
+_ID_WEIGHT = 2.0
+# 覆盖层页面的关键词出现在非末尾区域时的折扣
+_BURIED_WEIGHT = 0.4
+
+
+class PageClassifier:
+    """基于关键词、resourceId 与覆盖层位置的规则页面分类器。"""
+
+    def __init__(self, signatures: dict[str, list[str]],
+                 resource_ids: dict[str, list[str]] | None = None,
+                 overlay_pages: set[str] | None = None):
+        self.signatures = signatures
+        self.resource_ids = PAGE_RESOURCE_IDS if resource_ids is None else resource_ids
+        self.overlay_pages = OVERLAY_PAGES if overlay_pages is None else overlay_pages
+
+    def classify(self, snapshot: HierarchySnapshot) -> tuple[str, float]:
+        """返回 (页面, 置信度 0-1)，无法识别时返回 ("未知", 0.0)。"""
+        scores = self.score(snapshot)
+        if not scores:
+            return "未知", 0.0
+
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        page, top = ranked[0]
+        second = ranked[1][1] if len(ranked) > 1 else 0.0
+        if top <= 0:
+            return "未知", 0.0
+
+        # 与第二名差距越小，置信度越低
+        confidence = top * (1 - 0.5 * second / top)
+        logger.debug("本地页面识别: {} ({:.2f}), 次优 {} ({:.2f})",
+                     page, confidence, ranked[1][0] if len(ranked) > 1 else "-", second)
+        return page, confidence
+
+    def score(self, snapshot: HierarchySnapshot) -> dict[str, float]:
+        """计算每个页面的特征覆盖率得分（0-1）。"""
+        nodes = snapshot.nodes
+        if not nodes:
+            return {}
+
+        tail_start = int(len(nodes) * (1 - OVERLAY_TAIL_RATIO))
+        # 每段文本最后出现的位置（越靠后越处于上层）
+        labels = []
+        for node in nodes:
+            if node.text:
+                labels.append((node.index, node.text))
+            if node.description:
+                labels.append((node.index, node.description))
+        # resourceId 同时按完整 ID 与短 ID（"/" 之后部分）索引
+        ids = {}
+        for node in nodes:
+            if node.resource_id:
+                ids[node.resource_id] = node.index
+                ids[node.resource_id.rsplit("/", 1)[-1]] = node.index
+
+        scores = {}
+        for page, keywords in self.signatures.items():
+            overlay = page in self.overlay_pages
+            hit = 0.0
+            for keyword in keywords:
+                last = self._last_position(labels, keyword)
+                if last is None:
+                    continue
+                hit += 1.0 if not overlay or last >= tail_start else _BURIED_WEIGHT
+
+            page_ids = self.resource_ids.get(page, [])
+            for rid in page_ids:
+                pos = ids.get(rid)
+                if pos is None:
+                    continue
+                hit += _ID_WEIGHT if not overlay or pos >= tail_start else _ID_WEIGHT * _BURIED_WEIGHT
+
+            total = len(keywords) + _ID_WEIGHT * len(page_ids)
+            scores[page] = hit / total if total else 0.0
+        return scores
+
+    @staticmethod
+    def _last_position(labels: list[tuple[int, str]], keyword: str) -> int | None:
+        for index, label in reversed(labels):
+            if keyword in label:
+                return index
+        return None
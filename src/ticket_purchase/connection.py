@@ -1,10 +1,35 @@
-"""ADB 无线连接与 uiautomator2 设备初始化。"""
+"""ADB 无线连接、uiautomator2 设备初始化与连接保活。"""
+from __future__ import annotations
+
+import os
 import subprocess
+import threading
 import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING
 
-import uiautomator2 as u2
 from loguru import logger
 
+from .arbiter import PRIORITY_WATCHER, DeviceArbiter
+from .startup import lazy_import
+
+if TYPE_CHECKING:
+    import uiautomator2 as u2
+
+# 倒计时期间的设备探活间隔（秒），0 表示不启用连接保活
+PING_INTERVAL = 15.0
+
+# 开抢前该时长（秒）内提高探活频率，保持 uiautomator 服务与连接处于热状态
+HOT_WINDOW = 10.0
+HOT_INTERVAL = 1.0
+
+# 开抢前该时长（秒）内停止探活，避免探活 RPC 占用设备延迟开抢点击
+QUIET_WINDOW = 0.5
+
+# 连续探活失败达到该次数时后台重连
+RECONNECT_AFTER_FAILURES = 1
+
 
 def adb_connect(ip: str, port: int = 5555, max_retries: int = 3) -> bool:
     """通过 ADB 无线连接设备。
@@ -48,10 +73,21 @@ def init_device(ip: str, port: int = 5555) -> u2.Device:
     """
     if not adb_connect(ip, port):
         raise ConnectionError(f"Cannot connect to device {ip}:{port}")
+    return _connect_u2(f"{ip}:{port}")
 
-    addr = f"{ip}:{port}"
+
+def adb_disconnect(ip: str, port: int = 5555):
+    """断开 ADB 无线连接（清理已失效的会话），失败时忽略。"""
+    try:
+        subprocess.run(["adb", "disconnect", f"{ip}:{port}"], capture_output=True, text=True, timeout=5)
+    except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+        logger.debug("ADB 断开失败: {}", e)
+
+
+def _connect_u2(addr: str) -> u2.Device:
+    """创建并配置 u2 设备对象（ADB 已连接）。"""
     logger.info("正在初始化 u2 设备: {}", addr)
-    device = u2.connect(addr)
+    device = lazy_import("uiautomator2").connect(addr)
 
     # 验证连接
     info = device.info
@@ -69,3 +105,138 @@ def init_device(ip: str, port: int = 5555) -> u2.Device:
     device.watcher.remove()
 
     return device
+
+
+@dataclass
+class ConnectionHealth:
+    """设备连接健康状态。"""
+    healthy: bool = True
+    latency: float | None = None  # 最近一次探活的 RPC 往返时延（秒）
+    last_ok: float = 0.0  # 最近一次探活成功的时刻（time.monotonic）
+    failures: int = 0  # 连续探活失败次数
+    reconnects: int = 0  # 累计重连成功次数
+
+    def summary(self) -> str:
+        latency = f"{self.latency * 1000:.0f}ms" if self.latency is not None else "-"
+        return (f"{'正常' if self.healthy else '异常'}, 延迟 {latency}, "
+                f"连续失败 {self.failures}, 重连 {self.reconnects} 次")
+
+
+class ConnectionSupervisor:
+    """倒计时期间的设备连接保活。
+
+    后台线程以观察者优先级经仲裁器周期调用 `device.info` 探活（同时保持 uiautomator 服务活跃），
+    开抢前 `HOT_WINDOW` 秒内提高频率、最后 `QUIET_WINDOW` 秒停止。
+    探活失败时重连 ADB 与 u2，并通过 `arbiter.device` 替换设备，工作流各模块经代理自动使用新连接。
+    """
+
+    def __init__(self, ip: str, port: int, arbiter: DeviceArbiter, interval: float = PING_INTERVAL,
+                 hot_window: float = HOT_WINDOW, hot_interval: float = HOT_INTERVAL):
+        self.ip = ip
+        self.port = port
+        self.arbiter = arbiter
+        self.interval = interval
+        self.hot_window = hot_window
+        self.hot_interval = hot_interval
+        self.health = ConnectionHealth(last_ok=time.monotonic())
+        self._fire_at: float | None = None  # 开抢时刻（time.monotonic）
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._reconnect_lock = threading.Lock()
+
+    @staticmethod
+    def from_env(ip: str, port: int, arbiter: DeviceArbiter) -> "ConnectionSupervisor":
+        return ConnectionSupervisor(
+            ip, port, arbiter,
+            interval=float(os.getenv("DEVICE_PING_INTERVAL", PING_INTERVAL)),
+            hot_window=float(os.getenv("DEVICE_HOT_WINDOW", HOT_WINDOW)),
+            hot_interval=float(os.getenv("DEVICE_HOT_INTERVAL", HOT_INTERVAL)),
+        )
+
+    def start(self, target_time: str = ""):
+        """启动后台探活；`target_time`（"YYYY-MM-DD HH:MM:SS"）用于确定热身与静默窗口。"""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        if target_time.strip():
+            # 换算为单调时钟，NTP 偏移的误差相对热身窗口可以忽略
+            target = datetime.strptime(target_time.strip(), "%Y-%m-%d %H:%M:%S").timestamp()
+            self._fire_at = time.monotonic() + target - time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="device-supervisor", daemon=True)
+        self._thread.start()
+        logger.info("设备连接保活已启动 (间隔 {:g}秒, 开抢前 {:g}秒内每 {:g}秒)",
+                    self.interval, self.hot_window, self.hot_interval)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        logger.info("设备连接: {}", self.health.summary())
+
+    def _next_delay(self) -> float | None:
+        """距下次探活的秒数；进入开抢前的静默窗口后返回 None。"""
+        if self._fire_at is None:
+            return self.interval
+        until_fire = self._fire_at - time.monotonic()
+        if until_fire <= QUIET_WINDOW:
+            return None
+        if until_fire <= self.hot_window:
+            return min(self.hot_interval, until_fire - QUIET_WINDOW)
+        return min(self.interval, until_fire - self.hot_window)
+
+    def _run(self):
+        with self.arbiter.thread_priority(PRIORITY_WATCHER):
+            while True:
+                delay = self._next_delay()
+                if delay is None:
+                    logger.debug("即将开抢，停止设备探活")
+                    return
+                if self._stop.wait(max(delay, 0.0)):
+                    return
+                if not self.ping() and self.health.failures >= RECONNECT_AFTER_FAILURES:
+                    self.reconnect()
+
+    def ping(self) -> bool:
+        """探活一次，更新健康状态。"""
+        start = time.perf_counter()
+        try:
+            with self.arbiter.acquire("ping"):
+                self.arbiter.device.info
+        except Exception as e:
+            self.health.failures += 1
+            self.health.healthy = False
+            logger.warning("设备探活失败 (连续 {} 次): {}", self.health.failures, e)
+            return False
+        health = self.health
+        health.latency = time.perf_counter() - start
+        health.last_ok = time.monotonic()
+        health.failures = 0
+        health.healthy = True
+        logger.debug("设备探活: {:.0f}ms", health.latency * 1000)
+        return True
+
+    def reconnect(self) -> bool:
+        """重连 ADB 与 u2，成功后替换仲裁器中的设备。"""
+        with self._reconnect_lock:
+            logger.warning("设备连接异常，正在重连 {}:{}", self.ip, self.port)
+            adb_disconnect(self.ip, self.port)
+            try:
+                if not adb_connect(self.ip, self.port, max_retries=2):
+                    return False
+                device = _connect_u2(f"{self.ip}:{self.port}")
+            except Exception as e:
+                logger.error("设备重连失败: {}", e)
+                return False
+            # 在仲裁下替换，避免与进行中的 RPC 交错
+            with self.arbiter.acquire("reconnect"):
+                self.arbiter.device = device
+            self.health.reconnects += 1
+            logger.info("设备已重连")
+            return self.ping()
+
+    def ensure_connected(self) -> bool:
+        """连接异常时立即重连（供工作流在开抢前 / 重试前调用）。"""
+        if self.health.healthy:
+            return True
+        return self.reconnect()
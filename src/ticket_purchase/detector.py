@@ -1,12 +1,33 @@
 """Smart element detection: u2 native selectors + optional LLM fallback (Ollama / DeepSeek)."""
+from __future__ import annotations
+
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import TYPE_CHECKING
 
-import uiautomator2 as u2
 from loguru import logger
 
+from .hierarchy import COMPACT_FORMAT, LOCAL_SELECTOR_KEYS, HierarchyCache, Node
+from .locators import LocatorCache
+from .startup import lazy_import
+from .trace import tracer
+
+if TYPE_CHECKING:
+    import uiautomator2 as u2
+
+# Pooled HTTP connections stay open this long (seconds) between calls; httpx defaults to 5s,
+# which would drop the connection during a countdown and pay TCP/TLS setup again at sale open
+LLM_CONNECTION_KEEPALIVE = 300.0
+
+# Default heartbeat interval (seconds) while idle; must stay below LLM_CONNECTION_KEEPALIVE
+LLM_HEARTBEAT_INTERVAL = 60.0
+
 # LLM prompt template for element detection
-_LLM_PROMPT = """分析以下 Android UI XML，找到最佳定位器来定位: "{desc}"
+_LLM_PROMPT = """分析以下 Android 界面节点列表，找到最佳定位器来定位: "{desc}"
 {hint}
 定位策略优先级:
 1. resourceId (最稳定)
@@ -18,34 +39,134 @@ _LLM_PROMPT = """分析以下 Android UI XML，找到最佳定位器来定位: "
 
 找不到时: {{"strategy": "NOT_FOUND", "value": "", "confidence": 0}}
 
-XML:
-{xml}"""
+{format}
+
+节点:
+{nodes}"""
+
+
+def parse_json_response(text: str) -> dict:
+    """Extract the JSON object from an LLM response (handles markdown code blocks).
+
+    Raises json.JSONDecodeError when no valid JSON is present.
+    """
+    json_str = text.strip()
+    if "```json" in json_str:
+        json_str = json_str.split("```json")[1].split("```")[0].strip()
+    elif "```" in json_str:
+        json_str = json_str.split("```")[1].split("```")[0].strip()
+    return json.loads(json_str)
+
+
+class JsonStreamScanner:
+    """Incrementally scan streamed text for the first complete top-level JSON object.
+
+    Tracks brace depth outside of string literals. A balanced candidate that fails to
+    parse (e.g. braces in leading prose) is skipped and scanning resumes after it.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0  # next character to scan
+        self._start = -1  # start of the current candidate object
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> str | None:
+        """Append a chunk; return the JSON object text once one is complete."""
+        self.text += chunk
+        text = self.text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            self._pos += 1
+            if self._start < 0:
+                if ch == "{":
+                    self._start, self._depth = self._pos - 1, 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if not self._depth:
+                    candidate = text[self._start:self._pos]
+                    try:
+                        json.loads(candidate)
+                        return candidate
+                    except json.JSONDecodeError:
+                        self._pos = self._start + 1
+                        self._start = -1
+        return None
+
+
+def _http_limits() -> dict:
+    """httpx client options shared by both backends: a small pool of long-lived connections."""
+    httpx = lazy_import("httpx")
+    return {"limits": httpx.Limits(max_connections=8, max_keepalive_connections=4,
+                                   keepalive_expiry=LLM_CONNECTION_KEEPALIVE)}
 
 
 class LLMClient:
-    """Unified LLM client supporting Ollama and DeepSeek (OpenAI-compatible) backends."""
+    """Unified LLM client supporting Ollama and DeepSeek (OpenAI-compatible) backends.
+
+    With LLM_STREAM enabled (default) responses are streamed and generation is aborted
+    as soon as a complete JSON object has been received; only that object is returned.
+
+    One process-wide instance (`LLMClient.shared()`) is used by the detector, recovery and
+    workflow so they share a pooled HTTP client. `warm_up()` loads the model / opens the
+    connection before the target time and `start_heartbeat()` keeps both warm while idle.
+
+    The backend SDK is imported and the client created on first use (`enabled`), not at
+    construction, so startup does not pay for the Ollama / OpenAI imports.
+    """
+
+    _shared: "LLMClient | None" = None
+    _shared_lock = threading.Lock()
 
     def __init__(self):
         self.provider = os.getenv("LLM_PROVIDER", "").lower()  # "ollama" or "deepseek"
+        self.stream = os.getenv("LLM_STREAM", "true").lower() in ("1", "true", "yes")
         self._client = None
         self._model = None
-
-        if not self.provider:
+        self._keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # Ollama model residency
+        self._last_used = 0.0  # perf_counter of the last request (chat or ping)
+        self._calls = 0
+        self._warmed = False
+        self._heartbeat: threading.Thread | None = None
+        self._heartbeat_stop = threading.Event()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _ensure_client(self):
+        """Import the backend SDK and create the client once."""
+        if self._initialized:
             return
-
-        if self.provider == "ollama":
-            self._init_ollama()
-        elif self.provider == "deepseek":
-            self._init_deepseek()
-        else:
-            logger.warning("Unknown LLM_PROVIDER '{}', disabling LLM", self.provider)
-            self.provider = ""
+        with self._init_lock:
+            if self._initialized:
+                return
+            if self.provider == "ollama":
+                self._init_ollama()
+            elif self.provider == "deepseek":
+                self._init_deepseek()
+            elif self.provider:
+                logger.warning("Unknown LLM_PROVIDER '{}', disabling LLM", self.provider)
+                self.provider = ""
+            self._initialized = True
 
     def _init_ollama(self):
         try:
-            import ollama
+            ollama = lazy_import("ollama")
             host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-            self._client = ollama.Client(host=host)
+            self._client = ollama.Client(host=host, **_http_limits())
             self._model = os.getenv("OLLAMA_MODEL", "gpt-oss:120b-cloud")
             logger.info("LLM: Ollama (host={}, model={})", host, self._model)
         except ImportError:
@@ -57,14 +178,16 @@ class LLMClient:
 
     def _init_deepseek(self):
         try:
-            from openai import OpenAI
+            OpenAI = lazy_import("openai").OpenAI
             api_key = os.getenv("DEEPSEEK_API_KEY", "")
             base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
             if not api_key:
                 logger.warning("DEEPSEEK_API_KEY not set, disabling LLM")
                 self.provider = ""
                 return
-            self._client = OpenAI(api_key=api_key, base_url=base_url)
+            httpx = lazy_import("httpx")
+            self._client = OpenAI(api_key=api_key, base_url=base_url,
+                                  http_client=httpx.Client(**_http_limits()))
             self._model = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
             logger.info("LLM: DeepSeek (model={})", self._model)
         except ImportError:
@@ -74,41 +197,165 @@ class LLMClient:
             logger.warning("DeepSeek init failed: {}", e)
             self.provider = ""
 
+    @classmethod
+    def shared(cls) -> "LLMClient":
+        """Process-wide client (created on first use, after .env is loaded)."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
     @property
     def enabled(self) -> bool:
+        if not self.provider:
+            return False
+        self._ensure_client()
         return bool(self.provider and self._client)
 
     def chat(self, prompt: str) -> str | None:
         """Send prompt to LLM and return response text."""
         if not self.enabled:
             return None
+        start = time.perf_counter()
         try:
+            with tracer.span("llm.chat", "llm", provider=self.provider, prompt_chars=len(prompt),
+                             stream=self.stream):
+                if self.stream:
+                    return self._chat_stream(prompt)
+                return self._chat(prompt)
+        except Exception as e:
+            logger.debug("LLM call failed: {}", e)
+        finally:
+            self._last_used = time.perf_counter()
+            self._calls += 1
+            if self._calls == 1:
+                logger.info("LLM first call ({}): {:.0f}ms", "warm" if self._warmed else "cold",
+                            (self._last_used - start) * 1000)
+        return None
+
+    def ping(self) -> float:
+        """Minimal request that keeps the model loaded and the connection open; returns seconds.
+
+        Ollama: an empty-prompt generate loads the model and refreshes its keep-alive.
+        DeepSeek: listing models opens (or reuses) the pooled TLS connection without using tokens.
+        """
+        start = time.perf_counter()
+        with tracer.span("llm.ping", "llm", provider=self.provider):
             if self.provider == "ollama":
-                resp = self._client.chat(
-                    model=self._model,
-                    messages=[{"role": "user", "content": prompt}],
-                )
-                return resp["message"]["content"]
+                self._client.generate(model=self._model, prompt="", keep_alive=self._keep_alive)
             elif self.provider == "deepseek":
-                resp = self._client.chat.completions.create(
-                    model=self._model,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0,
-                )
-                return resp.choices[0].message.content
+                self._client.models.list()
+        self._last_used = time.perf_counter()
+        return self._last_used - start
+
+    def warm_up(self) -> bool:
+        """Load the model and prime the connection pool; logs cold vs warm request latency."""
+        if not self.enabled:
+            return False
+        try:
+            cold = self.ping()
+            warm = self.ping()
         except Exception as e:
-            logger.debug("LLM call failed: {}", e)
+            logger.warning("LLM warm-up failed: {}", e)
+            return False
+        self._warmed = True
+        logger.info("LLM warm-up: cold {:.0f}ms, warm {:.0f}ms", cold * 1000, warm * 1000)
+        return True
+
+    def start_heartbeat(self, interval: float | None = None):
+        """Ping in the background whenever the client has been idle for `interval` seconds."""
+        if not self.enabled or (self._heartbeat is not None and self._heartbeat.is_alive()):
+            return
+        if interval is None:
+            interval = float(os.getenv("LLM_HEARTBEAT_INTERVAL", LLM_HEARTBEAT_INTERVAL))
+        if interval <= 0:
+            return
+        self._heartbeat_stop.clear()
+
+        def beat():
+            while not self._heartbeat_stop.wait(interval / 4):
+                if time.perf_counter() - self._last_used < interval:
+                    continue
+                try:
+                    logger.debug("LLM heartbeat: {:.0f}ms", self.ping() * 1000)
+                except Exception as e:
+                    logger.debug("LLM heartbeat failed: {}", e)
+                    self._last_used = time.perf_counter()
+
+        self._heartbeat = threading.Thread(target=beat, name="llm-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+        self._heartbeat_stop.set()
+
+    def _chat_stream(self, prompt: str) -> str | None:
+        """Stream the completion and stop at the first complete JSON object."""
+        messages = [{"role": "user", "content": prompt}]
+        if self.provider == "ollama":
+            stream = self._client.chat(model=self._model, messages=messages, stream=True,
+                                       keep_alive=self._keep_alive)
+            chunks = (part["message"]["content"] or "" for part in stream)
+        elif self.provider == "deepseek":
+            stream = self._client.chat.completions.create(
+                model=self._model, messages=messages, temperature=0, stream=True,
+            )
+            chunks = (part.choices[0].delta.content or "" for part in stream if part.choices)
+        else:
+            return None
+
+        start = time.perf_counter()
+        scanner = JsonStreamScanner()
+        try:
+            for chunk in chunks:
+                result = scanner.feed(chunk)
+                if result is not None:
+                    logger.debug("LLM stream: JSON complete after {:.0f}ms ({} chars), aborting generation",
+                                 (time.perf_counter() - start) * 1000, len(scanner.text))
+                    return result
+        finally:
+            # Closing the stream drops the HTTP connection, which stops server-side generation
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        return scanner.text
+
+    def _chat(self, prompt: str) -> str | None:
+        if self.provider == "ollama":
+            resp = self._client.chat(
+                model=self._model,
+                messages=[{"role": "user", "content": prompt}],
+                keep_alive=self._keep_alive,
+            )
+            return resp["message"]["content"]
+        elif self.provider == "deepseek":
+            resp = self._client.chat.completions.create(
+                model=self._model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+            )
+            return resp.choices[0].message.content
         return None
 
 
 class Detector:
     """Unified element finder with multiple strategies."""
 
-    def __init__(self, device: u2.Device):
+    # Minimum interval between hierarchy re-dumps while waiting for an element
+    POLL_INTERVAL = 0.05
+
+    # Head start of the native selector before a hedged lookup starts its LLM leg
+    HEDGE_DELAY = 0.2
+
+    def __init__(self, device: u2.Device, hierarchy: HierarchyCache | None = None,
+                 locators: LocatorCache | None = None):
         self.device = device
-        self._llm = LLMClient()
+        self.hierarchy = hierarchy or HierarchyCache(device)
+        self.locators = locators or LocatorCache.from_env()
+        self._llm = LLMClient.shared()
+        # LLM lookups run here so a slow or abandoned call never blocks the native path
+        self._llm_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="detector-llm")
 
-    def find(self, desc: str, timeout: float = 3.0, **kwargs) -> u2.UiObject | None:
+    def find(self, desc: str, timeout: float = 3.0, **kwargs) -> u2.UiObject | Node | None:
         """Find a single UI element using multiple strategies.
 
         Args:
@@ -117,29 +364,97 @@ class Detector:
             **kwargs: u2 selector kwargs (resourceId, text, textContains, className, etc.)
 
         Returns:
-            UiObject if found, None otherwise.
+            Node (local snapshot match) or UiObject if found, None otherwise.
         """
-        # Strategy 1: LLM priority (when enabled)
-        if self._llm.enabled:
-            element = self._find_with_llm(desc, timeout, **kwargs)
+        if self._llm.enabled and kwargs:
+            # Native selector and LLM race; the common path costs one lookup
+            with tracer.span(f"find:{desc}", "find", strategy="hedged"):
+                element = self._find_hedged(desc, timeout, **kwargs)
+        elif self._llm.enabled:
+            with tracer.span(f"find:{desc}", "find", strategy="llm"):
+                element = self._find_with_llm(desc, timeout)
+        elif kwargs:
+            # u2 selectors, evaluated locally when possible
+            with tracer.span(f"find:{desc}", "find", strategy="native"):
+                element = self.match(timeout, **kwargs)
             if element:
-                return element
-
-        # Strategy 2: u2 native selectors (fallback)
-        if kwargs:
-            element = self.device(**kwargs)
-            if element.wait(timeout=timeout):
-                logger.debug("Found '{}' via native selector: {}", desc, kwargs)
-                return element
+                logger.debug("Found '{}' via selector: {}", desc, kwargs)
+        else:
+            element = None
 
+        if element:
+            return element
         logger.warning("Element not found: '{}'", desc)
         return None
 
+    def _find_hedged(self, desc: str, timeout: float, **kwargs) -> u2.UiObject | Node | None:
+        """Run the native selector wait and the LLM lookup concurrently.
+
+        An element already on screen is returned without starting the LLM leg. Otherwise
+        the LLM leg gets going after `HEDGE_DELAY` (or as soon as a pool worker frees up)
+        and the native wait stops once it produces a verified element. The whole lookup
+        is bounded by `timeout`: when the native selector wins or time runs out the LLM
+        leg is abandoned — it skips its dump and chat if it hasn't started them, and an
+        in-flight chat's selector is neither verified against the device nor cached.
+        """
+        element = self.match(0, **kwargs)
+        if element:
+            logger.debug("Found '{}' via selector: {}", desc, kwargs)
+            return element
+
+        deadline = time.monotonic() + timeout
+        llm_done = threading.Event()
+        abandoned = threading.Event()
+
+        def llm_leg():
+            # Head start for the native wait; legs that sat in the queue past their deadline are dropped
+            if abandoned.wait(self.HEDGE_DELAY) or time.monotonic() >= deadline:
+                return None
+            return self._find_with_llm(desc, max(deadline - time.monotonic(), 0.0), cancel=abandoned, **kwargs)
+
+        llm_future = self._llm_pool.submit(llm_leg)
+
+        def on_llm_done(future):
+            if not future.cancelled() and future.exception() is None and future.result():
+                llm_done.set()
+
+        llm_future.add_done_callback(on_llm_done)
+
+        with tracer.span(f"native:{desc}", "find"):
+            element = self.match(timeout, cancel=llm_done, **kwargs)
+        if element:
+            abandoned.set()
+            llm_future.cancel()
+            logger.debug("Found '{}' via selector: {}", desc, kwargs)
+            return element
+
+        # Native selector failed or was pre-empted: the LLM answer is all that's left
+        try:
+            return llm_future.result(timeout=max(deadline - time.monotonic(), 0.0))
+        except FutureTimeoutError:
+            logger.debug("LLM lookup for '{}' missed the {:.1f}s deadline", desc, timeout)
+            return None
+        except Exception as e:
+            logger.debug("LLM lookup failed for '{}': {}", desc, e)
+            return None
+        finally:
+            abandoned.set()
+
     def find_all(self, desc: str, **kwargs) -> list:
         """Find all matching UI elements."""
         if not kwargs:
             return []
 
+        if self._is_local(kwargs):
+            nodes = self.hierarchy.get().query(**kwargs)
+            if not nodes:
+                nodes = self.hierarchy.refresh().query(**kwargs)
+            if nodes:
+                logger.debug("Found {} elements for '{}': {}", len(nodes), desc, kwargs)
+                return nodes
+            logger.warning("No elements found for '{}'", desc)
+            return []
+
         elements = self.device(**kwargs)
         count = elements.count
         if count > 0:
@@ -151,46 +466,108 @@ class Detector:
 
     def exists(self, timeout: float = 1.0, **kwargs) -> bool:
         """Check if an element exists without full wait."""
-        return bool(self.device(**kwargs).wait(timeout=timeout))
-
-    def _extract_relevant_xml(self, xml_full: str, hints: dict, context_size: int = 15000) -> str:
-        """Extract XML portion around target element or use start if not found."""
-        # Try to find position by resourceId or text
-        search_terms = []
-        if hints.get("resourceId"):
-            search_terms.append(hints["resourceId"])
-        if hints.get("text"):
-            search_terms.append(hints["text"])
-        if hints.get("textContains"):
-            search_terms.append(hints["textContains"])
-
-        for term in search_terms:
-            pos = xml_full.find(term)
-            if pos != -1:
-                # Extract context around the found position
-                start = max(0, pos - context_size // 2)
-                end = min(len(xml_full), pos + context_size // 2)
-                logger.debug("Found '{}' at pos {}, extracting XML[{}:{}]", term, pos, start, end)
-                return xml_full[start:end]
-
-        # Fallback: return first portion
-        return xml_full[:context_size]
-
-    def _find_with_llm(self, desc: str, timeout: float = 5.0, **hints) -> u2.UiObject | None:
-        """Use LLM to analyze page XML and find element."""
+        return self.match(timeout, **kwargs) is not None
+
+    @staticmethod
+    def _is_local(selector: dict) -> bool:
+        return bool(selector) and all(k in LOCAL_SELECTOR_KEYS for k in selector)
+
+    def match(self, timeout: float = 0.0, cancel: threading.Event | None = None,
+              **selector) -> u2.UiObject | Node | None:
+        """Resolve a selector without the LLM, evaluated on the hierarchy snapshot when supported.
+
+        Polling stops early (returning None) once `cancel` is set.
+        """
+        if not self._is_local(selector):
+            element = self.device(**selector)
+            return element if element.wait(timeout=timeout) else None
+
+        deadline = time.monotonic() + timeout
+        snapshot = self.hierarchy.get()
+        fresh = snapshot.age < self.POLL_INTERVAL
+        while True:
+            node = snapshot.first(**selector)
+            if node:
+                return node
+            remaining = deadline - time.monotonic()
+            # A cached snapshot always gets one re-dump before giving up
+            if fresh and remaining <= 0:
+                return None
+            if cancel is not None and cancel.is_set():
+                return None
+            if fresh and snapshot.age < self.POLL_INTERVAL:
+                delay = min(self.POLL_INTERVAL - snapshot.age, max(remaining, 0))
+                if cancel is not None:
+                    if cancel.wait(delay):
+                        return None
+                else:
+                    time.sleep(delay)
+            snapshot = self.hierarchy.refresh()
+            fresh = True
+
+    def resolve_cached(self, desc: str, query, timeout: float = 2.0,
+                       cancel: threading.Event | None = None) -> u2.UiObject | Node | None:
+        """Resolve an element through the persistent locator cache.
+
+        `query(snapshot)` returns a u2 selector dict (usually from the LLM) or None and
+        is only called on a cache miss or when the cached selector no longer matches.
+        Only selectors validated against the live UI are cached. Once `cancel` is set
+        nothing further is dumped or queried and a queried selector is dropped without
+        touching the device or the cache.
+        """
+        if cancel is not None and cancel.is_set():
+            return None
         try:
-            xml_full = self.device.dump_hierarchy()
+            snapshot = self.hierarchy.get()
+        except Exception as e:
+            logger.debug("Hierarchy dump failed for '{}': {}", desc, e)
+            return None
 
-            # Extract relevant XML portion around target element
-            xml = self._extract_relevant_xml(xml_full, hints)
-            logger.debug("XML length: {} (extracted from {})", len(xml), len(xml_full))
+        self.locators.ensure_app_version(self.device)
+        cached = self.locators.get(desc, snapshot)
+        if cached:
+            element = self.match(0, **cached)
+            if element:
+                logger.debug("Locator cache hit for '{}': {}", desc, cached)
+                return element
+            logger.debug("Cached locator for '{}' no longer matches: {}", desc, cached)
+            self.locators.discard(desc, snapshot)
+
+        if cancel is not None and cancel.is_set():
+            return None
+        selector = query(snapshot)
+        if not selector or (cancel is not None and cancel.is_set()):
+            return None
+
+        element = self.match(timeout, cancel=cancel, **selector)
+        if cancel is not None and cancel.is_set():
+            return None
+        if element:
+            self.locators.put(desc, snapshot, selector)
+        else:
+            logger.debug("Locator didn't match actual UI for '{}': {}", desc, selector)
+        return element
+
+    def _find_with_llm(self, desc: str, timeout: float = 5.0, cancel: threading.Event | None = None,
+                       **hints) -> u2.UiObject | Node | None:
+        """Use LLM to analyze the page and find element (cached per page and app version)."""
+        with tracer.span(f"llm:{desc}", "find"):
+            return self.resolve_cached(
+                desc, lambda snapshot: self._llm_locate(desc, snapshot, hints), timeout, cancel,
+            )
+
+    def _llm_locate(self, desc: str, snapshot, hints: dict) -> dict | None:
+        """Ask the LLM for a selector for `desc` on the given snapshot."""
+        try:
+            nodes = snapshot.compact()
+            logger.debug("Prompt nodes: {} chars (XML {} chars)", len(nodes), len(snapshot.xml))
 
             # Build hint from kwargs (resourceId, text, etc.)
             hint_str = ""
             if hints:
                 hint_parts = [f"{k}={v}" for k, v in hints.items()]
                 hint_str = f"\n参考提示（可能的选择器）: {', '.join(hint_parts)}"
-            prompt = _LLM_PROMPT.format(desc=desc, hint=hint_str, xml=xml)
+            prompt = _LLM_PROMPT.format(desc=desc, hint=hint_str, format=COMPACT_FORMAT, nodes=nodes)
 
             response_text = self._llm.chat(prompt)
             if not response_text:
@@ -198,15 +575,7 @@ class Detector:
                 return None
 
             logger.debug("LLM raw response for '{}': {}", desc, response_text[:500])
-
-            # Extract JSON from response (handle markdown code blocks)
-            json_str = response_text.strip()
-            if "```json" in json_str:
-                json_str = json_str.split("```json")[1].split("```")[0].strip()
-            elif "```" in json_str:
-                json_str = json_str.split("```")[1].split("```")[0].strip()
-
-            result = json.loads(json_str)
+            result = parse_json_response(response_text)
 
             if result["strategy"] == "NOT_FOUND" or result.get("confidence", 0) < 0.3:
                 logger.debug("LLM couldn't find '{}' (confidence: {})", desc, result.get("confidence", 0))
@@ -215,15 +584,13 @@ class Detector:
             # Map strategy to u2 selector
             strategy = result["strategy"]
             value = result["value"]
-            selector = {strategy: value}
-
-            element = self.device(**selector)
-            if element.wait(timeout=timeout):
-                logger.info("LLM found '{}' via {}='{}' (confidence: {:.2f})",
-                           desc, strategy, value, result["confidence"])
-                return element
-
-            logger.debug("LLM locator didn't match actual UI for '{}'", desc)
+            if strategy == "className" and "." not in value:
+                # The prompt shows short class names; map back to the full name on this page
+                value = next((n.class_name for n in snapshot.nodes
+                              if n.class_name.rsplit(".", 1)[-1] == value), value)
+            logger.info("LLM located '{}' via {}='{}' (confidence: {:.2f})",
+                        desc, strategy, value, result["confidence"])
+            return {strategy: value}
         except json.JSONDecodeError as e:
             logger.debug("LLM JSON parse failed: {}", e)
         except Exception as e:
@@ -1,21 +1,66 @@
 """UI 操作执行：点击、滑动、输入。"""
-import uiautomator2 as u2
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING
+
 from loguru import logger
 
+from .hierarchy import HierarchyCache, Node
+
+if TYPE_CHECKING:
+    import uiautomator2 as u2
+
 
 class Executor:
-    """在设备上执行 UI 操作。"""
+    """在设备上执行 UI 操作。
+
+    传入 `hierarchy` 时，每次动作后使层级快照失效，并在动作前记录当时的页面指纹
+    （`baseline`，供等待页面变化使用，不受其他线程之后的 dump 影响）。
+    `actions` 不为 None 时记录执行过的动作（用于演练录制点击计划）；
+    设置 `recorder` 时同时写入运行录制。
+    """
 
-    def __init__(self, device: u2.Device):
+    def __init__(self, device: u2.Device, hierarchy: HierarchyCache | None = None):
         self.device = device
+        self.hierarchy = hierarchy
+        self.actions: list | None = None
+        self.recorder = None
+        self.baseline: str | None = None  # 最近一次动作前的页面指纹
+
+    def _mark(self):
+        if self.hierarchy is not None:
+            self.baseline = self.hierarchy.last_fingerprint
+
+    def _invalidate(self):
+        if self.hierarchy is not None:
+            self.hierarchy.invalidate()
+
+    def _record(self, *action):
+        if self.actions is not None:
+            self.actions.append((time.monotonic(), *action))
+        if self.recorder is not None:
+            self.recorder.action(*action)
 
     def tap(self, x: int, y: int):
         """坐标点击（最快方式）。"""
         logger.debug("点击坐标 ({}, {})", x, y)
+        self._mark()
         self.device.click(x, y)
+        self._record("tap", x, y)
+        self._invalidate()
 
-    def click(self, element: u2.UiObject):
+    def click(self, element: u2.UiObject | Node):
         """点击 UI 元素。"""
+        if isinstance(element, Node):
+            # 快照节点：直接点击缓存的中心坐标，无需额外 RPC
+            cx, cy = element.center
+            if cx > 0 and cy > 0:
+                self.tap(cx, cy)
+                return
+            element = self.device(**element.selector())
+
+        self._mark()
         try:
             info = element.info
             bounds = info.get("bounds", {})
@@ -24,6 +69,8 @@ class Executor:
             cy = (bounds.get("top", 0) + bounds.get("bottom", 0)) // 2
             if cx > 0 and cy > 0:
                 self.device.click(cx, cy)
+                self._record("tap", cx, cy)
+                self._invalidate()
                 logger.debug("点击元素坐标 ({}, {})", cx, cy)
                 return
         except Exception as e:
@@ -31,6 +78,8 @@ class Executor:
 
         # 备用方式：元素点击
         element.click()
+        self._record("click")
+        self._invalidate()
         logger.debug("点击元素（备用方式）")
 
     def swipe(self, direction: str = "up", scale: float = 0.5):
@@ -41,18 +90,32 @@ class Executor:
             scale: 滑动距离占屏幕比例 (0.0-1.0)
         """
         logger.debug("滑动 {} (比例={})", direction, scale)
+        self._mark()
         self.device.swipe_ext(direction, scale=scale)
+        self._record("swipe", direction, scale)
+        self._invalidate()
 
-    def input_text(self, element: u2.UiObject, text: str):
+    def input_text(self, element: u2.UiObject | Node, text: str):
         """清除并向元素输入文本。"""
-        element.clear_text()
-        element.set_text(text)
+        self._mark()
+        if isinstance(element, Node):
+            # 快照节点：先点击获取焦点，再通过输入法清空并输入
+            self.tap(*element.center)
+            self.device.send_keys(text, clear=True)
+        else:
+            element.clear_text()
+            element.set_text(text)
+        self._record("input", text)
+        self._invalidate()
         logger.debug("输入文本: '{}'", text)
 
     def press_key(self, key: str):
         """按下按键（如 'enter'、'back'、'home'）。"""
         logger.debug("按键: {}", key)
+        self._mark()
         self.device.press(key)
+        self._record("key", key)
+        self._invalidate()
 
     def press_back(self):
         """按下返回键。"""
@@ -0,0 +1,207 @@
+"""多设备并行抢票：每台设备一个进程，共享时钟同时开抢，任一设备提交成功后通知其余设备停止。"""
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from loguru import logger
+
+from . import startup
+from .log import setup_logging
+from .main import DEFAULT_CONFIG, DEFAULT_ENV
+from .scheduler import ClockSync
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DEFAULT_FLEET = BASE_DIR / "config" / "fleet.yaml"
+
+
+@dataclass
+class FleetDevice:
+    """单台设备的连接信息与配置覆盖。"""
+    name: str
+    ip: str
+    port: int = 5555
+    config: str = ""  # 该设备专用的 config.yaml，为空则使用公共配置
+    overrides: dict = field(default_factory=dict)  # 覆盖配置项，如 users、price_index
+
+
+@dataclass
+class DeviceOutcome:
+    """单台设备的运行结果。"""
+    name: str
+    success: bool = False
+    stopped: bool = False  # 因其他设备成功而提前停止
+    error: str = ""
+    connect_seconds: float = 0.0
+    run_seconds: float = 0.0
+    finished_at: float = 0.0  # 结束时刻（time.time()）
+
+
+def load_fleet(path: str) -> tuple[dict, list[FleetDevice]]:
+    """读取 fleet.yaml，返回 (公共配置覆盖, 设备列表)。"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = startup.lazy_import("yaml").safe_load(f) or {}
+    devices = [FleetDevice(**d) for d in data.get("devices", [])]
+    if not devices:
+        raise ValueError(f"No devices defined in {path}")
+    names = [d.name for d in devices]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate device names in {path}: {names}")
+    return data.get("overrides", {}) or {}, devices
+
+
+def _run_device(spec: FleetDevice, config_path: str, common: dict, env_path: str,
+                start_now: bool, clock: ClockSync | None, stop_event, results):
+    """子进程入口：连接设备、等待开抢、执行工作流并上报结果。"""
+    from .connection import ConnectionSupervisor
+    from .preflight import run_preflight
+    from .scheduler import wait_until
+    from .workflow import TicketConfig, TicketWorkflow
+
+    if Path(env_path).exists():
+        startup.lazy_import("dotenv").load_dotenv(env_path)
+    setup_logging(os.getenv("LOG_LEVEL", "INFO"), tag=spec.name)
+
+    outcome = DeviceOutcome(spec.name)
+    try:
+        with open(spec.config or config_path, "r", encoding="utf-8") as f:
+            data = startup.lazy_import("yaml").safe_load(f) or {}
+        config = TicketConfig.from_dict({**data, **common, **spec.overrides})
+
+        # 与单设备相同的预检：连接（+ 启动 App）与 LLM 预热并发，使用父进程的时钟而不再同步 NTP
+        preflight = run_preflight(spec.ip, spec.port, "" if start_now else config.target_time, clock=clock)
+        outcome.connect_seconds = preflight.durations.get("设备连接", 0.0)
+
+        workflow = TicketWorkflow(preflight.device, config, stop_event=stop_event,
+                                  on_order_submitted=stop_event.set)
+        startup.report("设备就绪")
+        if not start_now:
+            if config.preposition and config.target_time.strip():
+                if not workflow.prepare():
+                    logger.warning("预置失败，开抢后执行完整流程")
+            lead = 0.0
+            if config.target_time.strip():
+                lead = workflow.calibrate_fire_lead()
+                # 倒计时期间保活设备连接，异常时后台重连
+                workflow.supervisor = ConnectionSupervisor.from_env(spec.ip, spec.port, workflow.arbiter)
+                workflow.supervisor.start(config.target_time)
+            wait_until(config.target_time, on_tick=workflow.keep_alive, clock=preflight.join_clock(),
+                       lead=lead)
+            if workflow.supervisor is not None:
+                workflow.supervisor.stop()
+
+        if stop_event.is_set():
+            outcome.stopped = True
+        else:
+            start = time.perf_counter()
+            outcome.success = workflow.run_with_retry()
+            outcome.run_seconds = time.perf_counter() - start
+            outcome.stopped = not outcome.success and stop_event.is_set()
+    except Exception as e:
+        logger.error("设备 {} 运行出错: {}", spec.name, e)
+        outcome.error = str(e)
+    outcome.finished_at = time.time()
+    results.put(outcome)
+    # 子进程退出时不执行 atexit，主动等待队列中的日志写完
+    logger.complete()
+
+
+def run_fleet(devices: list[FleetDevice], config_path: str, common: dict, env_path: str,
+              start_now: bool = False) -> list[DeviceOutcome]:
+    """为每台设备启动一个进程并等待全部结束。"""
+    ctx = mp.get_context("spawn")
+    stop_event = ctx.Event()
+    results = ctx.Queue()
+
+    # 父进程统一 NTP 校时，所有设备共享同一锚点的时钟（子进程不再各自同步）
+    clock = None
+    if not start_now:
+        clock = ClockSync()
+        clock.sync()
+        clock = clock.shared()
+
+    processes = []
+    for spec in devices:
+        proc = ctx.Process(
+            target=_run_device,
+            args=(spec, config_path, common, env_path, start_now, clock, stop_event, results),
+            name=f"ticket-{spec.name}",
+        )
+        proc.start()
+        processes.append(proc)
+    logger.info("已启动 {} 台设备: {}", len(devices), [d.name for d in devices])
+
+    outcomes = {}
+    while len(outcomes) < len(processes):
+        try:
+            outcome = results.get(timeout=1.0)
+            outcomes[outcome.name] = outcome
+            if outcome.success:
+                logger.info("设备 {} 抢票成功，通知其余设备停止", outcome.name)
+                stop_event.set()
+        except queue.Empty:
+            # 子进程异常退出时不会上报结果
+            for proc, spec in zip(processes, devices):
+                if not proc.is_alive() and spec.name not in outcomes:
+                    outcomes[spec.name] = DeviceOutcome(
+                        spec.name, error=f"process exited with code {proc.exitcode}",
+                        finished_at=time.time())
+
+    for proc in processes:
+        proc.join()
+    return [outcomes[d.name] for d in devices]
+
+
+def report(outcomes: list[DeviceOutcome]):
+    """输出每台设备的结果与耗时。"""
+    first_success = min((o.finished_at for o in outcomes if o.success), default=None)
+    logger.info("=" * 50)
+    logger.info("{:<12} {:<6} {:>8} {:>8}  {}", "设备", "结果", "连接(s)", "流程(s)", "备注")
+    for o in outcomes:
+        status = "成功" if o.success else ("停止" if o.stopped else "失败")
+        note = o.error
+        if o.success and first_success is not None and o.finished_at > first_success:
+            note = f"晚于首个成功 {o.finished_at - first_success:.2f}s"
+        logger.info("{:<12} {:<6} {:>8.2f} {:>8.2f}  {}",
+                    o.name, status, o.connect_seconds, o.run_seconds, note)
+    logger.info("=" * 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大麦自动购票系统（多设备）")
+    parser.add_argument("--fleet", "-f", default=str(DEFAULT_FLEET),
+                        help="fleet.yaml 设备列表路径")
+    parser.add_argument("--config", "-c", default=str(DEFAULT_CONFIG),
+                        help="公共 config.yaml 配置文件路径")
+    parser.add_argument("--env", default=str(DEFAULT_ENV),
+                        help=".env 环境文件路径")
+    parser.add_argument("--now", action="store_true",
+                        help="忽略定时设置，立即执行")
+    args = parser.parse_args()
+
+    if Path(args.env).exists():
+        startup.lazy_import("dotenv").load_dotenv(args.env)
+    setup_logging(os.getenv("LOG_LEVEL", "INFO"), tag="fleet")
+
+    if not Path(args.fleet).exists():
+        logger.error("设备列表未找到: {}", args.fleet)
+        logger.info("请复制 config/fleet.example.yaml 到 config/fleet.yaml 并编辑")
+        sys.exit(1)
+
+    try:
+        common, devices = load_fleet(args.fleet)
+    except (TypeError, ValueError) as e:
+        logger.error("设备列表无效: {}", e)
+        sys.exit(1)
+
+    outcomes = run_fleet(devices, args.config, common, args.env, start_now=args.now)
+    report(outcomes)
+    sys.exit(0 if any(o.success for o in outcomes) else 1)
+
+
+if __name__ == "__main__":
+    main()
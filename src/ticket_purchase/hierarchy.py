@@ -0,0 +1,307 @@
+"""UI 层级快照：一次 dump，本地索引并求值选择器。"""
+import hashlib
+import json
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+from loguru import logger
+
+from .trace import tracer
+
+# 支持本地求值的 u2 选择器键
+LOCAL_SELECTOR_KEYS = frozenset({"resourceId", "text", "textContains", "className", "description"})
+
+_BOUNDS_RE = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+
+# LLM prompt 中单个节点文本的最大长度，超出部分以 "…" 截断
+PROMPT_TEXT_LIMIT = 40
+
+# 紧凑表示的默认长度上限（字符），超出时省略中间节点，保留开头与末尾（覆盖层）
+PROMPT_MAX_CHARS = 12000
+
+# 紧凑表示的格式说明，拼接在各 LLM prompt 中
+COMPACT_FORMAT = """界面节点列表：每行一个可见且有意义的节点，纯布局容器已省略。
+格式: 序号 类名 "文本" id=resourceId desc="描述" [click] [disabled] [左,上][右,下]
+类名省略 android.widget. 等包名前缀；文本以 "…" 结尾表示已截断（此时用 textContains 定位）。
+节点按绘制顺序排列，越靠后越在上层（弹窗等覆盖层在末尾）。"""
+
+
+class Node:
+    """层级中的单个节点（精简表示）。
+
+    提供与 u2.UiObject 兼容的 `info` 属性，便于上层代码统一处理。
+    """
+
+    __slots__ = ("index", "text", "resource_id", "class_name", "description",
+                 "package", "clickable", "enabled", "bounds")
+
+    def __init__(self, index: int, attrib: dict):
+        self.index = index
+        self.text = attrib.get("text", "")
+        self.resource_id = attrib.get("resource-id", "")
+        self.class_name = attrib.get("class", "")
+        self.description = attrib.get("content-desc", "")
+        self.package = attrib.get("package", "")
+        self.clickable = attrib.get("clickable") == "true"
+        self.enabled = attrib.get("enabled", "true") == "true"
+        match = _BOUNDS_RE.match(attrib.get("bounds", ""))
+        self.bounds = tuple(int(v) for v in match.groups()) if match else (0, 0, 0, 0)
+
+    @property
+    def center(self) -> tuple[int, int]:
+        left, top, right, bottom = self.bounds
+        return (left + right) // 2, (top + bottom) // 2
+
+    @property
+    def info(self) -> dict:
+        left, top, right, bottom = self.bounds
+        return {
+            "text": self.text,
+            "resourceName": self.resource_id,
+            "className": self.class_name,
+            "contentDescription": self.description,
+            "packageName": self.package,
+            "clickable": self.clickable,
+            "enabled": self.enabled,
+            "bounds": {"left": left, "top": top, "right": right, "bottom": bottom},
+        }
+
+    def selector(self) -> dict:
+        """返回可用于 u2 原生定位该节点的选择器。"""
+        if self.resource_id:
+            return {"resourceId": self.resource_id}
+        if self.text:
+            return {"text": self.text}
+        if self.description:
+            return {"description": self.description}
+        return {"className": self.class_name}
+
+    def compact(self) -> str:
+        """节点的单行紧凑表示（供 LLM prompt 使用）。"""
+        parts = [str(self.index), self.class_name.rsplit(".", 1)[-1] or "-"]
+        if self.text:
+            text = self.text if len(self.text) <= PROMPT_TEXT_LIMIT else self.text[:PROMPT_TEXT_LIMIT] + "…"
+            parts.append(json.dumps(text, ensure_ascii=False))
+        if self.resource_id:
+            parts.append(f"id={self.resource_id}")
+        if self.description:
+            parts.append(f"desc={json.dumps(self.description[:PROMPT_TEXT_LIMIT], ensure_ascii=False)}")
+        if self.clickable:
+            parts.append("click")
+        if not self.enabled:
+            parts.append("disabled")
+        left, top, right, bottom = self.bounds
+        parts.append(f"[{left},{top}][{right},{bottom}]")
+        return " ".join(parts)
+
+    def __repr__(self) -> str:
+        return (f"Node({self.class_name.rsplit('.', 1)[-1]}, id={self.resource_id!r}, "
+                f"text={self.text!r}, bounds={self.bounds})")
+
+
+class HierarchySnapshot:
+    """一次 dump_hierarchy 的解析结果，按 resourceId/text/className/description 建索引。
+
+    节点按 XML 文档顺序保存，越靠后的节点越处于上层（弹窗等覆盖层）。
+    """
+
+    def __init__(self, xml: str, taken_at: float | None = None):
+        self.xml = xml
+        self.taken_at = taken_at if taken_at is not None else time.monotonic()
+        self.nodes: list[Node] = []
+        self._index: dict[str, dict[str, list[Node]]] = {
+            "resourceId": {}, "text": {}, "className": {}, "description": {},
+        }
+        self._fingerprint = None
+        self._page_key = None
+        self._compact = None
+        self._parse(xml)
+
+    def _parse(self, xml: str):
+        try:
+            root = ET.fromstring(xml)
+        except ET.ParseError as e:
+            logger.debug("层级 XML 解析失败: {}", e)
+            return
+
+        by_id = self._index["resourceId"]
+        by_text = self._index["text"]
+        by_class = self._index["className"]
+        by_desc = self._index["description"]
+        for i, element in enumerate(root.iter("node")):
+            node = Node(i, element.attrib)
+            self.nodes.append(node)
+            if node.resource_id:
+                by_id.setdefault(node.resource_id, []).append(node)
+            if node.text:
+                by_text.setdefault(node.text, []).append(node)
+            if node.class_name:
+                by_class.setdefault(node.class_name, []).append(node)
+            if node.description:
+                by_desc.setdefault(node.description, []).append(node)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.taken_at
+
+    @property
+    def fingerprint(self) -> str:
+        """页面结构指纹（忽略与布局无关的属性），用于判断页面是否变化。"""
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=12)
+            for node in self.nodes:
+                digest.update(f"{node.class_name}|{node.resource_id}|{node.text}|"
+                              f"{node.description}|{node.bounds}\n".encode("utf-8"))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    @property
+    def page_key(self) -> str:
+        """跨运行稳定的页面类型指纹：仅由出现的 resourceId 集合决定，忽略文本与坐标。"""
+        if self._page_key is None:
+            digest = hashlib.blake2b(digest_size=8)
+            for rid in sorted(self._index["resourceId"]):
+                digest.update(rid.encode("utf-8") + b"\n")
+            self._page_key = digest.hexdigest()
+        return self._page_key
+
+    def compact(self, max_chars: int = PROMPT_MAX_CHARS) -> str:
+        """供 LLM 使用的紧凑页面表示，格式见 COMPACT_FORMAT。
+
+        只保留有文本、描述或可点击且面积非零的节点，保持文档顺序（覆盖层在末尾）。
+        超过 `max_chars` 时省略中间部分的节点，开头（页面主体）与末尾（覆盖层）各保留一半。
+        """
+        if self._compact is None:
+            self._compact = [
+                node.compact() for node in self.nodes
+                if (node.text or node.description or node.clickable)
+                and node.bounds[2] > node.bounds[0] and node.bounds[3] > node.bounds[1]
+            ]
+        lines = self._compact
+        total = sum(len(line) + 1 for line in lines)
+        if total <= max_chars:
+            return "\n".join(lines)
+
+        head, tail, size = [], [], 0
+        budget = max_chars // 2
+        for line in lines:
+            if size + len(line) + 1 > budget:
+                break
+            head.append(line)
+            size += len(line) + 1
+        size = 0
+        for line in reversed(lines[len(head):]):
+            if size + len(line) + 1 > budget:
+                break
+            tail.append(line)
+            size += len(line) + 1
+        tail.reverse()
+        omitted = len(lines) - len(head) - len(tail)
+        return "\n".join(head + [f"…（省略 {omitted} 个节点）…"] + tail)
+
+    def query(self, **selector) -> list[Node]:
+        """本地求值选择器，返回按文档顺序排列的匹配节点。
+
+        仅支持 LOCAL_SELECTOR_KEYS 中的键，多个键之间为“与”关系；选择器为空或含其他键时
+        抛出 ValueError（调用方应改用 u2 原生查询），避免忽略条件后误匹配任意节点。
+        """
+        if not selector:
+            raise ValueError("Empty selector")
+        unsupported = set(selector) - LOCAL_SELECTOR_KEYS
+        if unsupported:
+            raise ValueError(f"Unsupported selector keys: {sorted(unsupported)}")
+        exact = [(k, v) for k, v in selector.items() if k in self._index]
+        if exact:
+            # 从候选最少的索引开始过滤
+            exact.sort(key=lambda kv: len(self._index[kv[0]].get(kv[1], ())))
+            key, value = exact[0]
+            candidates = self._index[key].get(value, [])
+            rest = exact[1:]
+        else:
+            candidates = self.nodes
+            rest = []
+
+        contains = selector.get("textContains")
+        result = []
+        for node in candidates:
+            if contains is not None and contains not in node.text:
+                continue
+            if rest and not all(self._attr(node, k) == v for k, v in rest):
+                continue
+            result.append(node)
+        return result
+
+    def first(self, **selector) -> Node | None:
+        nodes = self.query(**selector)
+        return nodes[0] if nodes else None
+
+    @staticmethod
+    def _attr(node: Node, key: str) -> str:
+        if key == "resourceId":
+            return node.resource_id
+        if key == "text":
+            return node.text
+        if key == "className":
+            return node.class_name
+        return node.description
+
+
+class HierarchyCache:
+    """设备层级快照缓存。
+
+    快照在执行器动作后失效（`invalidate`），下次访问时重新 dump；
+    线程安全，可在工作流与后台线程间共享。设置 `recorder` 时每次 dump 写入运行录制。
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self._snapshot: HierarchySnapshot | None = None
+        self._last: HierarchySnapshot | None = None  # 最近一次 dump，失效后仍保留
+        self._lock = threading.Lock()
+        self.generation = 0  # 每次失效递增
+        self.dump_count = 0
+        self.recorder = None
+
+    def get(self) -> HierarchySnapshot:
+        """返回当前快照，已失效时重新 dump。"""
+        with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+        return self.refresh()
+
+    def peek(self) -> HierarchySnapshot | None:
+        """返回当前快照（可能为 None），不触发 dump。"""
+        return self._snapshot
+
+    @property
+    def last_fingerprint(self) -> str | None:
+        """最近一次 dump 的页面指纹（不受失效影响），用作等待页面变化的基准。"""
+        last = self._last
+        return last.fingerprint if last is not None else None
+
+    def refresh(self) -> HierarchySnapshot:
+        """强制重新 dump 并解析层级。"""
+        generation = self.generation
+        start = time.perf_counter()
+        xml = self.device.dump_hierarchy()
+        if self.recorder is not None:
+            self.recorder.dump(xml)
+        with tracer.span("parse_hierarchy", "parse"):
+            snapshot = HierarchySnapshot(xml)
+        with self._lock:
+            self.dump_count += 1
+            self._last = snapshot
+            # dump 期间发生了新的动作时，不覆盖失效状态
+            if generation == self.generation:
+                self._snapshot = snapshot
+        logger.debug("层级快照已刷新: {} 个节点, 耗时 {:.0f}ms",
+                     len(snapshot.nodes), (time.perf_counter() - start) * 1000)
+        return snapshot
+
+    def invalidate(self):
+        """标记快照失效（页面可能已变化）。"""
+        with self._lock:
+            self._snapshot = None
+            self.generation += 1
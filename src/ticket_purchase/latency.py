@@ -0,0 +1,62 @@
+"""设备延迟校准：测量主机 → u2 → 设备的 RPC 往返时延，计算开抢提前量。"""
+import math
+import time
+from dataclasses import dataclass, field
+
+from loguru import logger
+
+CALIBRATION_SAMPLES = 20
+CALIBRATION_WARMUP = 2  # 丢弃的预热请求（建立 HTTP 连接等）
+CALIBRATION_INTERVAL = 0.05  # 两次采样间隔（秒）
+
+# 提前量上限（秒），防止异常测量导致过早点击
+MAX_FIRE_LEAD = 0.5
+
+
+@dataclass
+class LatencyProfile:
+    """一次校准的 RPC 往返时延分布（秒）。"""
+    samples: list = field(default_factory=list)
+
+    def percentile(self, p: float) -> float:
+        """往返时延的第 p 百分位（最近秩法），无样本时为 0。"""
+        if not self.samples:
+            return 0.0
+        ranked = sorted(self.samples)
+        rank = max(1, math.ceil(p / 100 * len(ranked)))
+        return ranked[min(rank, len(ranked)) - 1]
+
+    def one_way(self, p: float) -> float:
+        """单程时延估计：往返时延百分位的一半。"""
+        return self.percentile(p) / 2
+
+    def fire_lead(self, percentile: float, margin: float) -> float:
+        """开抢提前量：单程时延估计减去安全余量，限制在 [0, MAX_FIRE_LEAD]。"""
+        return min(max(self.one_way(percentile) - margin, 0.0), MAX_FIRE_LEAD)
+
+    def summary(self) -> str:
+        return (f"n={len(self.samples)} p50={self.percentile(50) * 1000:.0f}ms "
+                f"p90={self.percentile(90) * 1000:.0f}ms max={max(self.samples, default=0) * 1000:.0f}ms")
+
+
+def measure_rpc_latency(device, samples: int = CALIBRATION_SAMPLES,
+                        interval: float = CALIBRATION_INTERVAL) -> LatencyProfile:
+    """测量设备 RPC 往返时延。
+
+    使用 `device.info`（一次 jsonrpc 调用，与点击走相同的 HTTP → u2 通道，但不产生输入事件）。
+    单次失败的采样被忽略。
+    """
+    profile = LatencyProfile()
+    for i in range(samples + CALIBRATION_WARMUP):
+        start = time.perf_counter()
+        try:
+            device.info
+        except Exception as e:
+            logger.debug("延迟采样失败: {}", e)
+            continue
+        elapsed = time.perf_counter() - start
+        if i >= CALIBRATION_WARMUP:
+            profile.samples.append(elapsed)
+        time.sleep(interval)
+    logger.info("设备 RPC 延迟: {}", profile.summary())
+    return profile
@@ -0,0 +1,126 @@
+"""LLM 定位结果持久化缓存：按 (元素描述, 页面指纹, App 版本) 复用已验证的选择器。"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from loguru import logger
+
+from .hierarchy import HierarchySnapshot
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DEFAULT_CACHE_PATH = BASE_DIR / "cache" / "locators.json"
+
+DAMAI_PACKAGE = "cn.damai"
+
+_FORMAT_VERSION = 1
+
+
+class LocatorCache:
+    """磁盘持久化的 LRU 选择器缓存。
+
+    只缓存已在真实界面上验证成功的选择器；命中后仍需调用方再次验证，
+    验证失败时调用 `discard` 移除。线程安全。
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_CACHE_PATH, max_entries: int = 500):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.app_version: str | None = None
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> "LocatorCache":
+        """根据环境变量创建缓存（LOCATOR_CACHE_PATH / LOCATOR_CACHE_SIZE）。"""
+        path = os.getenv("LOCATOR_CACHE_PATH") or DEFAULT_CACHE_PATH
+        max_entries = int(os.getenv("LOCATOR_CACHE_SIZE", "500"))
+        return cls(path, max_entries)
+
+    def ensure_app_version(self, device) -> str:
+        """查询并缓存大麦 App 版本号（每个进程只查询一次）。"""
+        if self.app_version is None:
+            try:
+                self.app_version = device.app_info(DAMAI_PACKAGE).get("versionName") or "unknown"
+            except Exception as e:
+                logger.debug("获取大麦版本失败: {}", e)
+                self.app_version = "unknown"
+        return self.app_version
+
+    def _key(self, desc: str, snapshot: HierarchySnapshot) -> str:
+        return f"{self.app_version or 'unknown'}|{snapshot.page_key}|{desc}"
+
+    def get(self, desc: str, snapshot: HierarchySnapshot) -> dict | None:
+        """查找缓存的选择器，命中时刷新 LRU 顺序。"""
+        key = self._key(desc, snapshot)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry["hits"] += 1
+            self.hits += 1
+            self._dirty = True
+            return dict(entry["selector"])
+
+    def put(self, desc: str, snapshot: HierarchySnapshot, selector: dict):
+        """保存已验证的选择器并立即落盘。"""
+        key = self._key(desc, snapshot)
+        with self._lock:
+            self._entries[key] = {"selector": dict(selector), "hits": 0, "updated": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                logger.debug("定位缓存淘汰: {}", evicted)
+            self._dirty = True
+        self.flush()
+
+    def discard(self, desc: str, snapshot: HierarchySnapshot):
+        """移除已失效的选择器。"""
+        key = self._key(desc, snapshot)
+        with self._lock:
+            if self._entries.pop(key, None) is None:
+                return
+            self._dirty = True
+        logger.debug("定位缓存失效: {}", key)
+        self.flush()
+
+    def flush(self):
+        """有变更时原子写入磁盘。"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "version": _FORMAT_VERSION,
+                "entries": [{"key": k, **v} for k, v in self._entries.items()],
+            }
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("定位缓存写入失败: {}", e)
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") != _FORMAT_VERSION:
+                logger.info("定位缓存格式已变更，忽略旧缓存")
+                return
+            for entry in data.get("entries", [])[-self.max_entries:]:
+                key = entry.pop("key")
+                self._entries[key] = entry
+            logger.info("定位缓存已加载: {} 条 ({})", len(self._entries), self.path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("定位缓存读取失败，忽略: {}", e)
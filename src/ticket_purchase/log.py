@@ -1,18 +1,43 @@
 """日志与截图管理。"""
+import atexit
+import io
 import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
 
 from loguru import logger
 
+from .arbiter import PRIORITY_WATCHER
+
 # 基础目录
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 LOG_DIR = BASE_DIR / "logs"
 SCREENSHOT_DIR = BASE_DIR / "screenshots"
 
+# LOG_DEBUG_RING 模式下保存 DEBUG 日志的内存环形缓冲（None 表示未启用）
+_debug_ring: deque | None = None
+_log_tag = ""
+
+# 截图输出格式 -> (PIL 格式名, 扩展名)
+_IMAGE_FORMATS = {"png": ("PNG", "png"), "jpeg": ("JPEG", "jpg"), "jpg": ("JPEG", "jpg"),
+                  "webp": ("WEBP", "webp")}
+
 
-def setup_logging(level: str = "INFO"):
-    """配置 loguru：控制台（彩色）+ 滚动日志文件。"""
+def setup_logging(level: str = "INFO", tag: str = ""):
+    """配置 loguru：控制台（彩色）+ 滚动日志文件。
+
+    tag 非空时作为每行日志的前缀（如多设备运行时的设备名）。
+    控制台与文件在后台线程写出（enqueue），不阻塞调用线程。
+    环境变量 LOG_DEBUG_RING=N（N > 0）时文件只记录 INFO 及以上，
+    DEBUG 日志仅保留最近 N 条在内存，由 `flush_debug_ring` 在失败时写盘。
+    """
+    global _debug_ring, _log_tag
+    prefix = f"[{tag}] ".replace("{", "{{").replace("}", "}}").replace("<", r"\<") if tag else ""
     LOG_DIR.mkdir(exist_ok=True)
     SCREENSHOT_DIR.mkdir(exist_ok=True)
 
@@ -24,21 +49,48 @@ def setup_logging(level: str = "INFO"):
     logger.add(
         sink=sys.stderr,
         level=level,
-        format="<green>{time:HH:mm:ss}</green> | <level>{level:<7}</level> | <cyan>{name}</cyan> - <level>{message}</level>",
+        format="<green>{time:HH:mm:ss}</green> | <level>{level:<7}</level> | " + prefix
+               + "<cyan>{name}</cyan> - <level>{message}</level>",
         colorize=True,
+        enqueue=True,
     )
 
     # 文件：滚动、详细
+    ring_size = int(os.getenv("LOG_DEBUG_RING", "0"))
+    file_format = ("{time:YYYY-MM-DD HH:mm:ss.SSS} | {level:<7} | " + prefix
+                   + "{name}:{function}:{line} - {message}")
     logger.add(
         LOG_DIR / "ticket_{time:YYYY-MM-DD}.log",
-        level="DEBUG",
-        format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level:<7} | {name}:{function}:{line} - {message}",
+        level="INFO" if ring_size > 0 else "DEBUG",
+        format=file_format,
         rotation="10 MB",
         retention="7 days",
         encoding="utf-8",
+        enqueue=True,
     )
 
-    logger.info("日志已初始化，级别={}", level)
+    # DEBUG 环形缓冲：只在内存追加，开销远小于写文件
+    _log_tag = tag
+    _debug_ring = deque(maxlen=ring_size) if ring_size > 0 else None
+    if _debug_ring is not None:
+        logger.add(_debug_ring.append, level="DEBUG", format=file_format)
+
+    logger.info("日志已初始化，级别={}{}", level,
+                f", DEBUG 环形缓冲 {ring_size} 条" if ring_size > 0 else "")
+
+
+def flush_debug_ring(reason: str = "failure") -> Path | None:
+    """将内存中的 DEBUG 日志写入 logs/debug_*.log 并清空缓冲，未启用时返回 None。"""
+    if not _debug_ring:
+        return None
+    records = list(_debug_ring)
+    _debug_ring.clear()
+    LOG_DIR.mkdir(exist_ok=True)
+    tag = f"{_log_tag}_" if _log_tag else ""
+    path = LOG_DIR / f"debug_{tag}{reason}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    path.write_text("".join(records), encoding="utf-8")
+    logger.info("DEBUG 日志已写出: {} ({} 条)", path, len(records))
+    return path
 
 
 def take_screenshot(device, name: str = "debug") -> str | None:
@@ -55,3 +107,141 @@ def take_screenshot(device, name: str = "debug") -> str | None:
     except Exception as e:
         logger.warning("截图失败: {}", e)
         return None
+
+
+class ScreenshotWriter:
+    """后台截图：采集、缩放、编码与写盘都在独立线程完成，不阻塞工作流。
+
+    - 队列有界，满时丢弃新的普通请求；等待超过 `max_lag` 秒的普通请求也直接丢弃
+      （画面已不代表请求时的页面；排队等待设备后再检查一次），失败截图不受影响
+    - `ring_size` > 0 时普通截图只保留在内存环形缓冲中，失败截图时连同缓冲一起写盘
+    - 传入仲裁器时以后台优先级访问设备，不与工作流 RPC 抢占
+    """
+
+    def __init__(self, device, arbiter=None, max_queue: int = 8, scale: float = 1.0,
+                 fmt: str = "png", quality: int = 80, ring_size: int = 0, max_lag: float = 2.0,
+                 directory: Path = SCREENSHOT_DIR):
+        if fmt not in _IMAGE_FORMATS:
+            raise ValueError(f"Unsupported screenshot format: {fmt}")
+        self.device = device
+        self.arbiter = arbiter
+        self.scale = scale
+        self.format, self.extension = _IMAGE_FORMATS[fmt]
+        self.quality = quality
+        self.max_lag = max_lag
+        self.directory = Path(directory)
+        self.ring: deque = deque(maxlen=ring_size) if ring_size > 0 else None
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._worker, name="screenshot-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, device, arbiter=None) -> "ScreenshotWriter":
+        """按环境变量 SCREENSHOT_* 构造。"""
+        return cls(
+            device, arbiter=arbiter,
+            max_queue=int(os.getenv("SCREENSHOT_QUEUE", "8")),
+            scale=float(os.getenv("SCREENSHOT_SCALE", "1.0")),
+            fmt=os.getenv("SCREENSHOT_FORMAT", "png").lower(),
+            quality=int(os.getenv("SCREENSHOT_QUALITY", "80")),
+            ring_size=int(os.getenv("SCREENSHOT_RING", "0")),
+            max_lag=float(os.getenv("SCREENSHOT_MAX_LAG", "2.0")),
+        )
+
+    def capture(self, name: str, failure: bool = False):
+        """请求截图（立即返回）。failure 为 True 时同时写出内存中的最近画面。"""
+        request = (name, datetime.now(), time.monotonic(), failure)
+        if failure:
+            # 失败截图不丢弃：队列满时等待（此时流程已失败，不在热路径上）
+            self._queue.put(request)
+            return
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            self.dropped += 1
+            logger.debug("截图队列已满，丢弃: {}", name)
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """等待已提交的截图全部处理完。"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """处理完剩余截图后停止后台线程。"""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self.dropped:
+            logger.info("截图丢弃 {} 张（队列积压）", self.dropped)
+
+    def _worker(self):
+        while True:
+            request = self._queue.get()
+            try:
+                if request is None:
+                    return
+                self._process(*request)
+            except Exception as e:
+                logger.warning("截图失败: {}", e)
+            finally:
+                self._queue.task_done()
+
+    def _late(self, name: str, queued_at: float) -> bool:
+        lag = time.monotonic() - queued_at
+        if lag <= self.max_lag:
+            return False
+        self.dropped += 1
+        logger.debug("截图 {} 已延迟 {:.1f}秒，丢弃", name, lag)
+        return True
+
+    def _process(self, name: str, requested: datetime, queued_at: float, failure: bool):
+        if not failure and self._late(name, queued_at):
+            return
+
+        if self.arbiter is not None:
+            priority = self.arbiter.thread_priority(PRIORITY_WATCHER)
+            device_lock = self.arbiter.acquire("screenshot")
+        else:
+            priority = device_lock = nullcontext()
+        with priority, device_lock:
+            # 以观察者优先级排队等待设备期间可能已超时：获取设备后再检查一次
+            if not failure and self._late(name, queued_at):
+                return
+            image = self.device.screenshot()
+        lag = time.monotonic() - queued_at  # 请求到实际采集完成
+        data = self._encode(image)
+        frame = (f"{name}_{requested.strftime('%Y%m%d_%H%M%S')}.{self.extension}", data)
+
+        if self.ring is not None and not failure:
+            self.ring.append(frame)
+            return
+        if failure and self.ring:
+            for buffered in self.ring:
+                self._write(*buffered)
+            self.ring.clear()
+        path = self._write(*frame)
+        logger.info("截图已保存: {} (延迟 {:.0f}ms)", path, lag * 1000)
+
+    def _encode(self, image) -> bytes:
+        if self.scale < 1.0:
+            w, h = image.size
+            image = image.resize((max(int(w * self.scale), 1), max(int(h * self.scale), 1)))
+        if self.format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        options = {} if self.format == "PNG" else {"quality": self.quality}
+        image.save(buffer, format=self.format, **options)
+        return buffer.getvalue()
+
+    def _write(self, filename: str, data: bytes) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / filename
+        path.write_bytes(data)
+        return path
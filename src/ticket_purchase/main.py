@@ -4,12 +4,14 @@ import os
 import sys
 from pathlib import Path
 
-from dotenv import load_dotenv
 from loguru import logger
 
-from .connection import init_device
+from . import startup
+from .connection import ConnectionSupervisor
 from .log import setup_logging
+from .preflight import PreflightError, run_preflight
 from .scheduler import wait_until
+from .tapplan import DEFAULT_PLAN_PATH, TapPlan
 from .workflow import TicketConfig, TicketWorkflow
 
 # 默认路径
@@ -19,6 +21,7 @@ DEFAULT_ENV = BASE_DIR / "config" / ".env"
 
 
 def main():
+    startup.mark("模块导入")
     parser = argparse.ArgumentParser(description="大麦自动购票系统")
     parser.add_argument("--config", "-c", default=str(DEFAULT_CONFIG),
                         help="config.yaml 配置文件路径")
@@ -26,16 +29,23 @@ def main():
                         help=".env 环境文件路径")
     parser.add_argument("--now", action="store_true",
                         help="忽略定时设置，立即执行")
+    parser.add_argument("--rehearse", action="store_true",
+                        help="演练：立即执行完整流程但不提交订单，录制点击计划")
+    parser.add_argument("--replay", action="store_true",
+                        help="开抢时回放演练录制的点击计划")
+    parser.add_argument("--plan", default=str(DEFAULT_PLAN_PATH),
+                        help="点击计划文件路径")
     args = parser.parse_args()
 
     # 加载环境变量
     env_path = Path(args.env)
     if env_path.exists():
-        load_dotenv(env_path)
+        startup.lazy_import("dotenv").load_dotenv(env_path)
 
     # 设置日志
     log_level = os.getenv("LOG_LEVEL", "INFO")
     setup_logging(log_level)
+    startup.mark("环境与日志")
 
     # 加载配置
     config_path = Path(args.config)
@@ -47,23 +57,55 @@ def main():
     config = TicketConfig.load(str(config_path))
     logger.info("配置已加载: keyword='{}', city='{}', users={}",
                 config.keyword, config.city, config.users)
+    startup.mark("配置加载")
 
-    # 连接设备
+    # 预检：并发连接设备（并启动大麦 App）、NTP 同步、预热 LLM
     device_ip = os.getenv("DEVICE_IP", "127.0.0.1")
     device_port = int(os.getenv("DEVICE_PORT", "5555"))
+    target_time = "" if args.now else config.target_time
 
     try:
-        device = init_device(device_ip, device_port)
-    except ConnectionError as e:
-        logger.error("设备连接失败: {}", e)
+        preflight = run_preflight(device_ip, device_port, target_time)
+    except PreflightError as e:
+        logger.error("预检失败: {}", e)
         sys.exit(1)
+    startup.mark("预检")
+
+    workflow = TicketWorkflow(preflight.device, config)
+    startup.mark("工作流初始化")
+    startup.report("设备就绪")
+
+    # 演练模式：录制点击计划后退出
+    if args.rehearse:
+        sys.exit(0 if workflow.rehearse(args.plan) else 1)
+
+    if args.replay:
+        plan_path = Path(args.plan)
+        if plan_path.exists():
+            try:
+                workflow.use_tap_plan(TapPlan.load(plan_path))
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning("点击计划读取失败: {}，使用常规流程", e)
+        else:
+            logger.warning("点击计划未找到: {}，使用常规流程", plan_path)
 
     # 等待目标时间（除非使用 --now）
     if not args.now:
-        wait_until(config.target_time)
+        # 预置模式：开抢前先走到演出详情页，倒计时期间保持页面
+        if config.preposition and config.target_time.strip():
+            if not workflow.prepare():
+                logger.warning("预置失败，开抢后执行完整流程")
+        lead = 0.0
+        if config.target_time.strip():
+            lead = workflow.calibrate_fire_lead()
+            # 倒计时期间保活设备连接，异常时后台重连
+            workflow.supervisor = ConnectionSupervisor.from_env(device_ip, device_port, workflow.arbiter)
+            workflow.supervisor.start(config.target_time)
+        wait_until(config.target_time, on_tick=workflow.keep_alive, clock=preflight.join_clock(), lead=lead)
+        if workflow.supervisor is not None:
+            workflow.supervisor.stop()
 
     # 执行工作流
-    workflow = TicketWorkflow(device, config)
     success = workflow.run_with_retry()
 
     sys.exit(0 if success else 1)
@@ -1,11 +1,23 @@
 """屏幕监控与页面状态检测。"""
+from __future__ import annotations
+
 import time
+from typing import TYPE_CHECKING
 
-import uiautomator2 as u2
 from loguru import logger
 
+if TYPE_CHECKING:
+    import uiautomator2 as u2
+
 DAMAI_PACKAGE = "cn.damai"
 
+# 启动 App 后等待进入前台的最长时间与轮询间隔（秒）
+APP_START_TIMEOUT = 3.0
+APP_START_POLL = 0.2
+
+# 等待页面稳定时两次 dump 之间的最小间隔（秒）
+SETTLE_POLL_INTERVAL = 0.05
+
 
 def wait_for_element(device: u2.Device, timeout: float = 5.0, **kwargs) -> u2.UiObject | None:
     """等待 UI 元素出现。
@@ -38,14 +50,52 @@ def ensure_damai_running(device: u2.Device):
     if not is_damai_foreground(device):
         logger.info("正在启动大麦 App...")
         device.app_start(DAMAI_PACKAGE)
-        time.sleep(3)  # 等待应用加载
-        if not is_damai_foreground(device):
-            raise RuntimeError("启动大麦 App 失败")
+        # 应用进入前台即返回；逐次查询前台应用（而非 app_wait 阻塞等待），等待期间不占用设备
+        deadline = time.monotonic() + APP_START_TIMEOUT
+        while not is_damai_foreground(device):
+            if time.monotonic() >= deadline:
+                raise RuntimeError("启动大麦 App 失败")
+            time.sleep(APP_START_POLL)
         logger.info("大麦 App 已启动")
     else:
         logger.info("大麦 App 已在前台运行")
 
 
+def wait_for_settle(hierarchy, timeout: float, baseline: str | None = None,
+                    interval: float = SETTLE_POLL_INTERVAL) -> bool:
+    """等待页面响应动作并稳定，替代固定时长的 sleep。
+
+    Args:
+        hierarchy: HierarchyCache，每次轮询重新 dump 并比较页面指纹
+        timeout: 最长等待时间（秒）
+        baseline: 动作前的页面指纹；给出时先等待指纹与之不同（页面已变化）
+        interval: 两次 dump 之间的最小间隔（秒）
+
+    Returns:
+        连续两次 dump 指纹相同（且已变化）时返回 True，超时返回 False。
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    changed = baseline is None
+    previous = None
+    while True:
+        snapshot = hierarchy.refresh()
+        fingerprint = snapshot.fingerprint
+        if not changed:
+            changed = fingerprint != baseline
+        elif fingerprint == previous:
+            logger.debug("页面已稳定，耗时 {:.0f}ms", (time.monotonic() - start) * 1000)
+            return True
+        previous = fingerprint if changed else None
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.debug("等待页面稳定超时 ({}秒, 已变化={})", timeout, changed)
+            return False
+        if snapshot.age < interval:
+            time.sleep(min(interval - snapshot.age, remaining))
+
+
 def get_page_xml(device: u2.Device, max_length: int = 15000) -> str:
     """获取当前页面 XML 源码（截断以供 LLM 使用）。"""
     try:
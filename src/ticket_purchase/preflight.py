@@ -0,0 +1,145 @@
+"""开抢前预检：并发执行设备连接（+ 启动大麦 App）、NTP 同步与 LLM 预热，输出各阶段耗时。
+
+设备连接是关键阶段：连接失败或到目标时间仍未完成时立即失败（`PreflightError`），
+其余阶段失败只记录警告（NTP 失败时使用本地时间，LLM 失败时只用原生识别，App 启动交给工作流）。
+设备就绪即返回，NTP 与 LLM 预热在后台继续：预置与延迟校准不等待它们，倒计时前才经 `join_clock` 取时钟。
+"""
+import time
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, TimeoutError, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from loguru import logger
+
+from .connection import init_device
+from .detector import LLMClient
+from .monitor import ensure_damai_running
+from .scheduler import ClockSync
+
+
+class PreflightError(RuntimeError):
+    """关键预检阶段失败或未能在目标时间前完成。"""
+
+
+@dataclass
+class PreflightResult:
+    """预检结果（设备就绪时返回，后台阶段完成后继续补充）。"""
+    device: object = None
+    target_time: str = ""
+    durations: dict = field(default_factory=dict)  # 阶段名 -> 耗时（秒）
+    errors: dict = field(default_factory=dict)  # 阶段名 -> 错误信息
+    clock_future: Future | None = None  # NTP 同步（未设置目标时间时为 None）
+
+    def join_clock(self) -> ClockSync | None:
+        """等待 NTP 同步（最多到目标时间），返回时钟；未同步完成时返回 None（由 wait_until 自行同步）。"""
+        if self.clock_future is None:
+            return None
+        remaining = _seconds_until(self.target_time)
+        try:
+            return self.clock_future.result(timeout=max(remaining or 0.0, 0.0))
+        except TimeoutError:
+            logger.warning("NTP 同步未在目标时间前完成，倒计时重新同步")
+        except Exception as e:
+            logger.warning("NTP 同步失败: {}", e)
+        return None
+
+
+def _seconds_until(target_time: str) -> float | None:
+    """距目标时间的秒数（本地时钟估计），未设置目标时间时返回 None。"""
+    if not target_time.strip():
+        return None
+    target = datetime.strptime(target_time.strip(), "%Y-%m-%d %H:%M:%S")
+    return target.timestamp() - time.time()
+
+
+def run_preflight(ip: str, port: int, target_time: str = "",
+                  clock: ClockSync | None = None) -> PreflightResult:
+    """并发执行预检阶段，设备连接（及启动 App）完成即返回。
+
+    设置了 `target_time` 时同步 NTP 并在 LLM 预热后保持心跳，两者在后台完成并记录耗时；
+    传入已同步的 `clock`（如多设备共享父进程的时钟）时不再同步 NTP，`join_clock` 直接返回它。
+    关键阶段（设备连接）出错或超过目标时间仍未完成时抛出 PreflightError。
+    """
+    result = PreflightResult(target_time=target_time)
+    start = time.perf_counter()
+
+    def timed(name, func):
+        def run():
+            phase_start = time.perf_counter()
+            try:
+                return func()
+            except Exception as e:
+                result.errors[name] = str(e)
+                raise
+            finally:
+                result.durations[name] = time.perf_counter() - phase_start
+        return run
+
+    def report_late(name):
+        def callback(future):
+            error = result.errors.get(name)
+            logger.info("预检: {} 完成 {:.2f}秒{}", name, result.durations.get(name, 0.0),
+                        f" (失败: {error})" if error else "")
+        return callback
+
+    def connect():
+        device = init_device(ip, port)
+        result.durations["设备连接"] = time.perf_counter() - start
+        launch_start = time.perf_counter()
+        try:
+            ensure_damai_running(device)
+        except Exception as e:
+            # App 启动由工作流的启动步骤重试
+            result.errors["启动 App"] = str(e)
+            logger.warning("预检: 启动大麦 App 失败: {}", e)
+        result.durations["启动 App"] = time.perf_counter() - launch_start
+        return device
+
+    def sync_clock():
+        clock = ClockSync()
+        if not clock.sync():
+            result.errors["NTP 同步"] = "所有服务器同步失败，使用本地时间"
+        return clock
+
+    def warm_llm():
+        llm = LLMClient.shared()
+        if llm.warm_up() and target_time.strip():
+            llm.start_heartbeat()
+
+    remaining = _seconds_until(target_time)
+    logger.info("开始预检{}", f" (距开抢 {remaining:.1f}秒)" if remaining is not None else "")
+
+    pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="preflight")
+    critical = pool.submit(connect)
+    others = {"LLM 预热": pool.submit(timed("LLM 预热", warm_llm))}
+    if remaining is not None and clock is None:
+        others["NTP 同步"] = pool.submit(timed("NTP 同步", sync_clock))
+
+    # 等待关键阶段：出错立即失败，超过目标时间仍未完成同样失败（目标时间已过时等待连接完成）
+    deadline = remaining if remaining is not None and remaining > 0 else None
+    done, _ = wait([critical], timeout=deadline, return_when=FIRST_EXCEPTION)
+    if critical not in done:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise PreflightError(f"设备连接未能在目标时间前完成 ({time.perf_counter() - start:.1f}秒)")
+    try:
+        result.device = critical.result()
+    except Exception as e:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise PreflightError(f"设备连接失败: {e}") from e
+
+    # 非关键阶段不阻塞预置与校准：未完成的在后台继续，完成时单独记录耗时
+    result.clock_future = others.get("NTP 同步")
+    if remaining is not None and clock is not None:
+        result.clock_future = Future()
+        result.clock_future.set_result(clock)
+    pool.shutdown(wait=False)
+
+    logger.info("预检完成，设备就绪耗时 {:.2f}秒", time.perf_counter() - start)
+    for name, seconds in sorted(result.durations.copy().items(), key=lambda kv: kv[1], reverse=True):
+        error = result.errors.get(name)
+        logger.info("  {:<8} {:>6.2f}秒{}", name, seconds, f" (失败: {error})" if error else "")
+    for name, future in others.items():
+        if name not in result.durations:
+            logger.info("  {:<8} 后台进行中", name)
+            future.add_done_callback(report_late(name))
+    return result
@@ -0,0 +1,253 @@
+"""运行录制与离线回放：记录每次 dump_hierarchy 与执行器动作，回放为只读设备。
+
+录制文件为 gzip 压缩的 JSON（logs/recordings/run_*.json.gz），相同的层级 XML 只保存一份：
+
+    {"meta": {...}, "dumps": {哈希: xml}, "events": [[秒, "dump", 哈希], [秒, "tap", x, y], ...]}
+
+通过环境变量 RECORD_ENABLED=true 启用。回放：
+
+    device = ReplayDevice.load("logs/recordings/run_xxx.json.gz")
+    for t, snapshot in device.recording.snapshots():
+        classifier.classify(snapshot)
+
+或 `python -m ticket_purchase.recorder <录制文件>` 输出时间线与本地页面分类。
+"""
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from loguru import logger
+
+from .hierarchy import HierarchySnapshot
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+RECORD_DIR = BASE_DIR / "logs" / "recordings"
+
+RECORDING_VERSION = 1
+
+
+def _digest(xml: str) -> str:
+    return hashlib.blake2b(xml.encode("utf-8"), digest_size=12).hexdigest()
+
+
+class RunRecorder:
+    """线程安全的运行录制器。
+
+    事件时间为相对录制开始的秒数（time.monotonic）。
+    """
+
+    def __init__(self, label: str = "run", directory: str | Path = RECORD_DIR):
+        self.label = label
+        self.directory = Path(directory)
+        self.started = time.monotonic()
+        self.created = datetime.now()
+        self._dumps: dict[str, str] = {}
+        self._events: list[list] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_env(label: str = "run") -> "RunRecorder | None":
+        """按 RECORD_ENABLED 创建录制器，未启用时返回 None。"""
+        if os.getenv("RECORD_ENABLED", "").lower() not in ("1", "true", "yes"):
+            return None
+        return RunRecorder(label)
+
+    def _event(self, kind: str, *args):
+        self._events.append([round(time.monotonic() - self.started, 4), kind, *args])
+
+    def dump(self, xml: str):
+        """记录一次层级 dump，相同内容只保存一份。"""
+        key = _digest(xml)
+        with self._lock:
+            self._dumps.setdefault(key, xml)
+            self._event("dump", key)
+
+    def action(self, kind: str, *args):
+        """记录一次执行器动作（tap / click / swipe / input / key）。"""
+        with self._lock:
+            self._event(kind, *args)
+
+    def mark(self, name: str):
+        """记录流程标记（如步骤开始），便于离线分析时对齐。"""
+        with self._lock:
+            self._event("mark", name)
+
+    def close(self) -> Path | None:
+        """写出录制文件并清空记录，没有事件时返回 None。"""
+        with self._lock:
+            events, self._events = self._events, []
+            dumps, self._dumps = self._dumps, {}
+        if not events:
+            return None
+        data = {
+            "meta": {"version": RECORDING_VERSION, "label": self.label, "pid": os.getpid(),
+                     "created": self.created.strftime("%Y-%m-%d %H:%M:%S")},
+            "dumps": dumps,
+            "events": events,
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{self.label}_{self.created.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.json.gz"
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        dump_count = sum(1 for e in events if e[1] == "dump")
+        logger.info("运行录制已保存: {} ({} 个事件, {} 次 dump / {} 个不同页面, {:.0f}KB)",
+                    path, len(events), dump_count, len(dumps), path.stat().st_size / 1024)
+        # 下一次运行重新计时
+        self.started = time.monotonic()
+        self.created = datetime.now()
+        return path
+
+
+class Recording:
+    """加载后的录制文件。"""
+
+    def __init__(self, meta: dict, dumps: dict[str, str], events: list[list]):
+        self.meta = meta
+        self.dumps = dumps
+        self.events = events
+
+    @staticmethod
+    def load(path: str | Path) -> "Recording":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        return Recording(data.get("meta", {}), data["dumps"], data["events"])
+
+    def dump_events(self) -> list[tuple[float, str]]:
+        """按时间顺序返回 (秒, xml)。"""
+        return [(e[0], self.dumps[e[2]]) for e in self.events if e[1] == "dump"]
+
+    def snapshots(self, unique: bool = False):
+        """逐个生成 (秒, HierarchySnapshot)；unique=True 时每个不同页面只生成一次。"""
+        seen = set()
+        for event in self.events:
+            if event[1] != "dump":
+                continue
+            if unique:
+                if event[2] in seen:
+                    continue
+                seen.add(event[2])
+            yield event[0], HierarchySnapshot(self.dumps[event[2]], taken_at=event[0])
+
+    def actions(self) -> list[list]:
+        return [e for e in self.events if e[1] not in ("dump", "mark")]
+
+
+class ReplayDevice:
+    """只读回放设备：按录制顺序返回 dump，输入类操作不产生效果。
+
+    每次 `dump_hierarchy()` 返回下一个录制的层级，录制结束后停留在最后一个；
+    选择器在当前层级上本地求值。用于离线验证识别 / 分类逻辑，而非重现完整流程。
+    """
+
+    def __init__(self, recording: Recording):
+        from .simulator import FakeUiObject
+
+        self.recording = recording
+        self._ui_object = FakeUiObject
+        self._frames = recording.dump_events()
+        self._cursor = 0
+        self.ignored_actions = 0
+
+    @staticmethod
+    def load(path: str | Path) -> "ReplayDevice":
+        return ReplayDevice(Recording.load(path))
+
+    def __call__(self, **selector):
+        return self._ui_object(self, selector)
+
+    @property
+    def current(self) -> str:
+        """当前层级 XML（不前进）。"""
+        if not self._frames:
+            return '<?xml version="1.0" ?><hierarchy rotation="0" />'
+        return self._frames[min(self._cursor, len(self._frames) - 1)][1]
+
+    def seek(self, index: int):
+        self._cursor = max(0, min(index, len(self._frames) - 1))
+
+    def dump_hierarchy(self, *args, **kwargs) -> str:
+        xml = self.current
+        if self._cursor < len(self._frames) - 1:
+            self._cursor += 1
+        return xml
+
+    @property
+    def info(self) -> dict:
+        width, height = self.window_size()
+        return {"productName": "replay", "displayWidth": width, "displayHeight": height, "screenOn": True}
+
+    def window_size(self) -> tuple[int, int]:
+        """由首个层级中节点的最大边界推算屏幕尺寸。"""
+        if not self._frames:
+            return 0, 0
+        nodes = HierarchySnapshot(self._frames[0][1]).nodes
+        return (max((n.bounds[2] for n in nodes), default=0),
+                max((n.bounds[3] for n in nodes), default=0))
+
+    def _ignore(self, name: str, *args):
+        self.ignored_actions += 1
+        logger.debug("回放设备忽略操作: {}{}", name, args)
+
+    def click(self, x: int, y: int):
+        self._ignore("click", x, y)
+
+    def swipe_ext(self, direction: str, scale: float = 0.9, **kwargs):
+        self._ignore("swipe", direction, scale)
+
+    def send_keys(self, text: str, clear: bool = False):
+        self._ignore("send_keys", text)
+
+    def press(self, key: str):
+        self._ignore("press", key)
+
+    def screen_on(self):
+        pass
+
+    def app_current(self) -> dict:
+        nodes = HierarchySnapshot(self.current).nodes
+        return {"package": nodes[0].package if nodes else "", "activity": ""}
+
+    def app_start(self, package: str, *args, **kwargs):
+        self._ignore("app_start", package)
+
+    def app_wait(self, package: str, front: bool = False, timeout: float = 20.0) -> int:
+        return 1 if self.app_current()["package"] == package else 0
+
+    def app_info(self, package: str) -> dict:
+        return {"packageName": package, "versionName": "replay"}
+
+
+def main():
+    """输出录制时间线：动作、标记，以及每次 dump 的本地页面分类。"""
+    if len(sys.argv) != 2:
+        print("用法: python -m ticket_purchase.recorder <录制文件.json.gz>")
+        sys.exit(2)
+    from .classifier import PageClassifier
+    from .workflow import TicketWorkflow
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+    recording = Recording.load(sys.argv[1])
+    classifier = PageClassifier(TicketWorkflow.PAGE_SIGNATURES)
+    pages: dict[str, tuple[str, float]] = {}
+    print(f"{recording.meta}  事件 {len(recording.events)}  不同页面 {len(recording.dumps)}")
+    for event in recording.events:
+        t, kind, args = event[0], event[1], event[2:]
+        if kind == "dump":
+            key = args[0]
+            if key not in pages:
+                pages[key] = classifier.classify(HierarchySnapshot(recording.dumps[key]))
+            page, confidence = pages[key]
+            print(f"{t:9.3f}  dump   {key[:8]}  {page or '-'} ({confidence:.2f})")
+        else:
+            print(f"{t:9.3f}  {kind:<6} {' '.join(str(a) for a in args)}")
+
+
+if __name__ == "__main__":
+    main()
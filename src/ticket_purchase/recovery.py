@@ -1,12 +1,22 @@
 """异常恢复：弹窗关闭、步骤重试、页面导航。"""
-import json
+from __future__ import annotations
+
 import os
 import threading
 import time
+from contextlib import nullcontext
+from typing import TYPE_CHECKING
 
-import uiautomator2 as u2
 from loguru import logger
 
+from .arbiter import PRIORITY_WATCHER
+from .detector import parse_json_response
+from .hierarchy import COMPACT_FORMAT, LOCAL_SELECTOR_KEYS, HierarchySnapshot, Node
+from .trace import tracer
+
+if TYPE_CHECKING:
+    import uiautomator2 as u2
+
 # 常见弹窗关闭按钮匹配模式（LLM 失败时的回退）
 POPUP_DISMISS_PATTERNS = [
     # 弹窗专用关闭按钮 (resourceId 最可靠)
@@ -26,38 +36,92 @@ POPUP_DISMISS_PATTERNS = [
     # 注意：不要加 "取消"、"关闭" 等通用词
 ]
 
+# 定位缓存中弹窗关闭按钮的描述键
+_POPUP_LOCATOR_DESC = "popup dismiss"
+
 # LLM 弹窗检测 prompt
-_POPUP_DETECT_PROMPT = """分析以下 Android UI XML，判断是否有弹窗需要关闭。
+_POPUP_DETECT_PROMPT = """分析以下 Android 界面节点列表，判断是否有弹窗需要关闭。
 
-重要：Android XML 中，**最后出现的元素在最上层**（后绘制覆盖先绘制）。
-弹窗作为覆盖层，通常出现在 XML 末尾部分。请重点分析 XML 末尾的元素。
+重要：节点按绘制顺序排列，**越靠后的节点越在上层**（后绘制覆盖先绘制）。
+弹窗作为覆盖层，通常出现在列表末尾。请重点分析末尾的节点。
 
 弹窗特征：
-- XML 末尾出现的 FrameLayout/LinearLayout 包含按钮
+- 列表末尾出现的一组节点包含按钮
 - 包含 "知道了"、"我知道了"、"确定"、"取消"、"关闭"、"同意" 等文本的按钮
-- 可能有 dialog、popup、alert 等关键词的 resourceId
+- 可能有 dialog、popup、alert、close 等关键词的 resourceId
 - bounds 坐标显示居中或覆盖大部分屏幕
 
 不是弹窗的情况：
-- 搜索页面顶部的"取消"按钮（通常在 XML 开头）
+- 搜索页面顶部的"取消"按钮（通常在列表开头）
 - 页面正常的功能按钮
 - 底部导航栏
 
 只输出 JSON:
 {{"has_popup": true/false, "dismiss_strategy": "resourceId"|"text"|"none", "dismiss_value": "用于定位关闭按钮的值", "reason": "简短说明"}}
 
-XML (末尾部分是最上层):
-{xml}"""
+{format}
+
+节点 (末尾是最上层):
+{nodes}"""
 
 DAMAI_PACKAGE = "cn.damai"
 
 
+class PopupRules:
+    """预编译的弹窗关闭规则索引。
+
+    规则按 resourceId 集合、精确文本集合、子串列表分组，一次遍历快照即可
+    找出优先级最高（规则列表中最靠前）的匹配节点。
+    """
+
+    def __init__(self, patterns: list[dict]):
+        self.patterns = patterns
+        self._resource_ids: dict[str, int] = {}
+        self._texts: dict[str, int] = {}
+        self._contains: list[tuple[str, int]] = []
+        for priority, pattern in enumerate(patterns):
+            if "resourceId" in pattern:
+                self._resource_ids.setdefault(pattern["resourceId"], priority)
+            elif "text" in pattern:
+                self._texts.setdefault(pattern["text"], priority)
+            elif "textContains" in pattern:
+                self._contains.append((pattern["textContains"], priority))
+            else:
+                raise ValueError(f"Unsupported popup pattern: {pattern}")
+
+    def match(self, snapshot: HierarchySnapshot):
+        """返回 (节点, 规则)，无匹配时返回 None。同优先级时取最上层节点。"""
+        best_node, best_priority = None, len(self.patterns)
+        for node in reversed(snapshot.nodes):
+            if node.bounds[2] <= node.bounds[0] or node.bounds[3] <= node.bounds[1]:
+                continue
+            priority = min(
+                self._resource_ids.get(node.resource_id, best_priority),
+                self._texts.get(node.text, best_priority),
+            )
+            for substring, p in self._contains:
+                if p < priority and substring in node.text:
+                    priority = p
+            if priority < best_priority:
+                best_node, best_priority = node, priority
+                if priority == 0:
+                    break
+        if best_node is None:
+            return None
+        return best_node, self.patterns[best_priority]
+
+
 class RecoveryManager:
     """管理异常恢复和弹窗关闭。"""
 
-    def __init__(self, device: u2.Device, llm_client=None):
+    def __init__(self, device: u2.Device, llm_client=None, hierarchy=None, locators=None,
+                 arbiter=None):
         self.device = device
+        self._arbiter = arbiter  # 设备访问仲裁器，后台监听以低优先级访问设备
         self._llm = llm_client
+        self._hierarchy = hierarchy  # 共享层级快照，关闭弹窗后使其失效
+        self._locators = locators  # 共享定位缓存，复用已验证的关闭按钮
+        self._rules = PopupRules(POPUP_DISMISS_PATTERNS)
         self._popup_thread = None
         self._stop_event = threading.Event()
 
@@ -84,18 +148,51 @@ class RecoveryManager:
 
     def _popup_watch_loop(self, interval: float):
         """后台循环关闭弹窗。"""
+        if self._arbiter is None:
+            return self._popup_watch_sweeps(interval)
+        with self._arbiter.thread_priority(PRIORITY_WATCHER):
+            self._popup_watch_sweeps(interval)
+
+    def _popup_watch_sweeps(self, interval: float):
         while not self._stop_event.is_set():
-            try:
-                self._dismiss_popup()
-            except Exception:
-                pass
+            # 工作流处于关键区时跳过本轮，避免点击与关键操作交错
+            if self._arbiter is None or not self._arbiter.paused():
+                try:
+                    with tracer.span("popup_sweep", "watcher"):
+                        self._dismiss_popup()
+                except Exception:
+                    pass
             self._stop_event.wait(interval)
 
+    def dismiss_popup(self) -> bool:
+        """立即尝试关闭一次弹窗，关闭成功返回 True。"""
+        try:
+            return self._dismiss_popup()
+        except Exception as e:
+            logger.debug("关闭弹窗失败: {}", e)
+            return False
+
     def _dismiss_popup(self):
-        """尝试关闭任何可见弹窗，优先使用 LLM 判断。"""
-        # Strategy 1: LLM 智能判断
+        """尝试关闭任何可见弹窗，优先使用 LLM 判断。
+
+        每次只 dump 一次层级，LLM 判断、定位缓存与规则匹配均在同一快照上完成，
+        命中后直接点击节点中心坐标。
+        """
+        generation = self._hierarchy.generation if self._hierarchy is not None else 0
+        snapshot = self._snapshot()
+
+        # Strategy 1: LLM 智能判断（已验证的关闭按钮按页面缓存，命中时跳过 LLM）
         if self._llm and self._llm.enabled:
-            result = self._llm_detect_popup()
+            if self._locators is not None:
+                self._locators.ensure_app_version(self.device)
+                cached = self._locators.get(_POPUP_LOCATOR_DESC, snapshot)
+                # 未匹配说明弹窗当前未出现，属正常情况，不移除缓存
+                node = self._locate(snapshot, cached) if cached else None
+                if node and self._click_node(node, generation):
+                    logger.info("缓存规则关闭弹窗: {}", cached)
+                    return True
+
+            result = self._llm_detect_popup(snapshot)
             if result:
                 has_popup = result.get("has_popup", False)
                 if not has_popup:
@@ -105,52 +202,80 @@ class RecoveryManager:
                 value = result.get("dismiss_value", "")
                 reason = result.get("reason", "")
 
-                if strategy != "none" and value:
+                if strategy in ("resourceId", "text") and value:
                     selector = {strategy: value}
-                    element = self.device(**selector)
-                    if element.exists(timeout=0.5):
-                        element.click()
+                    node = self._locate(snapshot, selector)
+                    if node and self._click_node(node, generation):
+                        if self._locators is not None:
+                            self._locators.put(_POPUP_LOCATOR_DESC, snapshot, selector)
                         logger.info("LLM 关闭弹窗: {} ({})", selector, reason)
-                        time.sleep(0.3)
                         return True
-                    else:
-                        logger.debug("LLM 建议的元素不存在: {}", selector)
-
-        # Strategy 2: 规则匹配回退
-        for pattern in POPUP_DISMISS_PATTERNS:
-            element = self.device(**pattern)
-            if element.exists(timeout=0.3):
-                element.click()
+                    logger.debug("LLM 建议的元素不存在: {}", selector)
+
+        # Strategy 2: 规则匹配回退（一次遍历匹配全部规则）
+        hit = self._rules.match(snapshot)
+        if hit:
+            node, pattern = hit
+            if self._click_node(node, generation):
                 logger.info("规则关闭弹窗: {}", pattern)
-                time.sleep(0.3)
                 return True
         return False
 
-    def _llm_detect_popup(self) -> dict | None:
-        """使用 LLM 分析页面是否有弹窗。"""
+    def _locate(self, snapshot: HierarchySnapshot, selector: dict):
+        """在快照上求值选择器；含本地不支持的键时回退到 u2 原生查询（返回 UiObject）。"""
+        if set(selector) <= LOCAL_SELECTOR_KEYS:
+            return snapshot.first(**selector)
         try:
-            xml_full = self.device.dump_hierarchy()
-            xml_len = len(xml_full)
-            # 弹窗在最上层，对应 XML 末尾。只取末尾 20000 字符
-            if xml_len > 20000:
-                xml = xml_full[-20000:]
+            element = self.device(**selector)
+            return element if element.exists else None
+        except Exception as e:
+            logger.debug("原生查询失败 {}: {}", selector, e)
+            return None
+
+    def _click_node(self, node, generation: int) -> bool:
+        """点击快照节点（或原生 UiObject）中心并等待弹窗消失动画。
+
+        快照之后工作流已执行过动作（页面可能已变化）时放弃点击。
+        """
+        with self._arbiter.acquire("popup-click") if self._arbiter else nullcontext():
+            if self._hierarchy is not None and self._hierarchy.generation != generation:
+                logger.debug("快照后页面已变化，放弃关闭弹窗")
+                return False
+            if isinstance(node, Node):
+                x, y = node.center
             else:
-                xml = xml_full
-            logger.debug("弹窗检测 XML: 总长={}, 取末尾={}", xml_len, len(xml))
-            prompt = _POPUP_DETECT_PROMPT.format(xml=xml)
+                bounds = node.info.get("bounds", {})
+                x = (bounds.get("left", 0) + bounds.get("right", 0)) // 2
+                y = (bounds.get("top", 0) + bounds.get("bottom", 0)) // 2
+            self.device.click(x, y)
+            self._invalidate()
+        with tracer.span("popup_dismiss_wait", "sleep"):
+            time.sleep(0.3)
+        return True
+
+    def _invalidate(self):
+        if self._hierarchy is not None:
+            self._hierarchy.invalidate()
+
+    def _snapshot(self) -> HierarchySnapshot:
+        """获取最新层级快照（共享缓存时同时刷新缓存）。"""
+        if self._hierarchy is not None:
+            return self._hierarchy.refresh()
+        return HierarchySnapshot(self.device.dump_hierarchy())
+
+    def _llm_detect_popup(self, snapshot: HierarchySnapshot) -> dict | None:
+        """使用 LLM 分析页面是否有弹窗。"""
+        try:
+            # 紧凑表示保留节点顺序，超长时省略中间部分，末尾的覆盖层始终保留
+            nodes = snapshot.compact()
+            logger.debug("弹窗检测: 节点列表 {} 字符 (XML {} 字符)", len(nodes), len(snapshot.xml))
+            prompt = _POPUP_DETECT_PROMPT.format(format=COMPACT_FORMAT, nodes=nodes)
 
             response = self._llm.chat(prompt)
             if not response:
                 return None
 
-            # 提取 JSON
-            json_str = response.strip()
-            if "```json" in json_str:
-                json_str = json_str.split("```json")[1].split("```")[0].strip()
-            elif "```" in json_str:
-                json_str = json_str.split("```")[1].split("```")[0].strip()
-
-            result = json.loads(json_str)
+            result = parse_json_response(response)
             logger.debug("LLM 弹窗检测: {}", result)
             return result
         except Exception as e:
@@ -207,7 +332,8 @@ class RecoveryManager:
 
             if attempt < max_retries:
                 self._dismiss_popup()  # 重试前尝试关闭弹窗
-                time.sleep(delay)
+                with tracer.span("retry_delay", "sleep"):
+                    time.sleep(delay)
 
         logger.error("步骤 '{}' 在 {} 次尝试后失败", step_name, max_retries)
         return False
@@ -1,33 +1,211 @@
 """精准调度：NTP 时间同步 + 倒计时定时器。"""
+import copy
+import os
+import statistics
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
 
 from loguru import logger
 
+DEFAULT_NTP_SERVERS = ["ntp.aliyun.com", "ntp.tencent.com", "pool.ntp.org"]
+NTP_PORT = 123
+NTP_SAMPLES = 4  # 每台服务器的采样次数
+NTP_TIMEOUT = 2.0  # 单次请求超时（秒）
 
-def get_ntp_offset() -> float:
-    """获取 NTP 服务器时间偏移。
+# 保留往返时延最小的这部分样本（高 RTT 样本的偏移误差大）
+RTT_KEEP_RATIO = 0.5
 
-    返回偏移量（秒），local_time + offset = 精确时间。
-    NTP 同步失败时返回 0.0。
+# 长时间等待中重新同步的间隔（秒），以及剩余时间少于该值时不再同步
+RESYNC_INTERVAL = 300.0
+RESYNC_GUARD = 30.0
+
+# 两次同步间隔超过该时长（秒）才估计漂移；漂移超出范围视为异常丢弃
+DRIFT_MIN_SPAN = 60.0
+MAX_DRIFT = 500e-6
+
+_NS = 1_000_000_000
+
+
+@dataclass
+class NtpSample:
+    """一次 NTP 请求的结果。"""
+    server: str
+    offset: float  # 秒，本地时间 + offset = 服务器时间
+    delay: float  # 往返时延（秒）
+
+
+def ntp_servers() -> list[tuple[str, int]]:
+    """读取 NTP 服务器列表（环境变量 NTP_SERVERS，逗号分隔，支持 host:port）。"""
+    raw = os.getenv("NTP_SERVERS", "")
+    entries = [e.strip() for e in raw.split(",") if e.strip()] or DEFAULT_NTP_SERVERS
+    servers = []
+    for entry in entries:
+        host, _, port = entry.rpartition(":")
+        if host and port.isdigit():
+            servers.append((host, int(port)))
+        else:
+            servers.append((entry, NTP_PORT))
+    return servers
+
+
+def sample_ntp(servers: list[tuple[str, int]] | None = None, samples: int | None = None,
+               timeout: float = NTP_TIMEOUT) -> list[NtpSample]:
+    """并发向所有服务器各请求 `samples` 次，返回成功的样本。
+
+    某台服务器请求失败后不再继续采样该服务器。ntplib 未安装时返回空列表。
     """
     try:
         import ntplib
-        client = ntplib.NTPClient()
-        # 尝试多个 NTP 服务器
-        servers = ["ntp.aliyun.com", "ntp.tencent.com", "pool.ntp.org"]
-        for server in servers:
-            try:
-                response = client.request(server, timeout=3)
-                offset = response.offset
-                logger.info("NTP 已同步: {} (偏移: {:.3f}秒)", server, offset)
-                return offset
-            except Exception:
-                continue
-        logger.warning("所有 NTP 服务器均失败，使用本地时间")
     except ImportError:
         logger.warning("ntplib 未安装，使用本地时间")
-    return 0.0
+        return []
+
+    servers = servers or ntp_servers()
+    samples = samples or int(os.getenv("NTP_SAMPLES", NTP_SAMPLES))
+
+    def burst(host: str, port: int) -> list[NtpSample]:
+        client = ntplib.NTPClient()
+        result = []
+        for _ in range(samples):
+            try:
+                response = client.request(host, version=3, port=port, timeout=timeout)
+            except Exception as e:
+                logger.debug("NTP 请求失败: {}:{} ({})", host, port, e)
+                break
+            result.append(NtpSample(f"{host}:{port}", response.offset, response.delay))
+        return result
+
+    with ThreadPoolExecutor(max_workers=len(servers), thread_name_prefix="ntp") as pool:
+        bursts = list(pool.map(lambda s: burst(*s), servers))
+    return [sample for b in bursts for sample in b]
+
+
+def estimate_offset(samples: list[NtpSample]) -> tuple[float, float] | None:
+    """由多个样本估计时钟偏移：丢弃高 RTT 样本，取其余样本偏移的中位数。
+
+    返回 (偏移, 保留样本的最大 RTT)，没有样本时返回 None。
+    """
+    if not samples:
+        return None
+    ranked = sorted(samples, key=lambda s: s.delay)
+    kept = ranked[:max(1, int(len(ranked) * RTT_KEEP_RATIO))]
+    return statistics.median(s.offset for s in kept), kept[-1].delay
+
+
+class ClockSync:
+    """NTP 校正后锚定到单调时钟的时间源。
+
+    同步时记录 (perf_counter_ns, 真实时间) 锚点，此后的时间由单调时钟推算，
+    不受本地系统时间跳变影响；多次同步后估计本地时钟相对 NTP 的漂移。
+    """
+
+    def __init__(self, servers: list[tuple[str, int]] | None = None,
+                 resync_interval: float = RESYNC_INTERVAL):
+        self.servers = servers
+        self.resync_interval = resync_interval
+        self.offset = 0.0  # 同步时刻的 NTP 偏移（秒）
+        self.drift = 0.0  # 单调时钟相对真实时间的速率误差
+        self.synced = False
+        self._first: tuple[int, int] | None = None  # 首次成功同步的锚点
+        self._anchor()
+
+    @classmethod
+    def from_offset(cls, offset: float) -> "ClockSync":
+        """由已知偏移构造（如多设备共享父进程的同步结果），不再自动重新同步。"""
+        clock = cls(resync_interval=0.0)
+        clock.offset = offset
+        clock._anchor()
+        return clock
+
+    def shared(self) -> "ClockSync":
+        """返回共享当前锚点（偏移与漂移）且不再自动重新同步的副本，可传给子进程。
+
+        锚点基于 perf_counter_ns（系统级单调时钟），子进程据此推算的时间与本进程一致，
+        不受此后本地系统时间调整的影响；各子进程不各自重新同步，保证同一时钟开抢。
+        """
+        clock = copy.copy(self)
+        clock.resync_interval = 0.0
+        return clock
+
+    def _anchor(self):
+        self._anchor_perf = time.perf_counter_ns()
+        self._anchor_true = time.time_ns() + int(self.offset * _NS)
+        self.synced_at = self._anchor_perf
+
+    def sync(self) -> bool:
+        """采样所有服务器并更新锚点，失败时保留之前的锚点。"""
+        start = time.perf_counter()
+        samples = sample_ntp(self.servers)
+        estimate = estimate_offset(samples)
+        if estimate is None:
+            self.synced_at = time.perf_counter_ns()  # 失败后同样等待一个间隔再重试
+            logger.warning("所有 NTP 服务器均失败，{}", "沿用上次同步结果" if self.synced else "使用本地时间")
+            return False
+
+        offset, delay = estimate
+        predicted = self.now_ns()
+        self.offset = offset
+        self._anchor()
+        if self.synced:
+            logger.info("NTP 重新同步: 与推算时间相差 {:.1f}ms",
+                        (self._anchor_true - predicted) / 1e6)
+        self._estimate_drift()
+        self.synced = True
+        logger.info("NTP 已同步: {} 个样本 / {} 台服务器 (偏移: {:.3f}秒, RTT ≤ {:.0f}ms, 耗时 {:.2f}秒)",
+                    len(samples), len({s.server for s in samples}), offset, delay * 1000,
+                    time.perf_counter() - start)
+        return True
+
+    def _estimate_drift(self):
+        if self._first is None:
+            self._first = (self._anchor_perf, self._anchor_true)
+            return
+        span = self._anchor_perf - self._first[0]
+        if span < DRIFT_MIN_SPAN * _NS:
+            return
+        drift = (self._anchor_true - self._first[1]) / span - 1.0
+        if abs(drift) > MAX_DRIFT:
+            logger.warning("时钟漂移估计异常 ({:.0f}ppm)，忽略", drift * 1e6)
+            return
+        self.drift = drift
+        logger.info("本地时钟漂移: {:+.1f}ppm", drift * 1e6)
+
+    def maybe_resync(self, remaining: float) -> bool:
+        """距上次同步超过 `resync_interval` 且离目标时间足够远时重新同步。"""
+        if not self.resync_interval or remaining < RESYNC_GUARD:
+            return False
+        if time.perf_counter_ns() - self.synced_at < self.resync_interval * _NS:
+            return False
+        return self.sync()
+
+    def now_ns(self) -> int:
+        """当前真实时间（Unix 纳秒）。"""
+        elapsed = time.perf_counter_ns() - self._anchor_perf
+        return self._anchor_true + int(elapsed * (1.0 + self.drift))
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.now_ns() / _NS)
+
+    def deadline_ns(self, target_ns: int) -> int:
+        """真实时间 `target_ns` 对应的 perf_counter_ns 读数。"""
+        return self._anchor_perf + int((target_ns - self._anchor_true) / (1.0 + self.drift))
+
+    def remaining(self, target_ns: int) -> float:
+        """距真实时间 `target_ns` 的剩余秒数。"""
+        return (target_ns - self.now_ns()) / _NS
+
+
+def get_ntp_offset() -> float:
+    """获取 NTP 服务器时间偏移。
+
+    返回偏移量（秒），local_time + offset = 精确时间。
+    NTP 同步失败时返回 0.0。
+    """
+    clock = ClockSync()
+    clock.sync()
+    return clock.offset
 
 
 def accurate_now(offset: float = 0.0) -> datetime:
@@ -35,44 +213,61 @@ def accurate_now(offset: float = 0.0) -> datetime:
     return datetime.fromtimestamp(time.time() + offset)
 
 
-def wait_until(target_time_str: str):
+def wait_until(target_time_str: str, on_tick=None, ntp_offset: float | None = None,
+               clock: ClockSync | None = None, lead: float = 0.0):
     """精确等待至目标时间。
 
-    使用粗略休眠（>1秒）+ 忙等待（<1秒）实现毫秒级精度。
+    使用粗略休眠（>1秒）+ 忙等待（<1秒）实现毫秒级精度；倒计时基于单调时钟，
+    不受等待期间本地系统时间调整的影响，长时间等待中定期重新 NTP 同步。
 
     Args:
         target_time_str: 目标时间，格式为 "YYYY-MM-DD HH:MM:SS"
+        on_tick: 可选回调 `on_tick(剩余秒数)`，剩余时间 >10 秒时在每次倒计时日志后调用（如保持页面活跃），
+            回调应在剩余时间内返回，否则会错过开抢时刻
+        ntp_offset: 已同步的 NTP 偏移（多进程共享同一时钟），为 None 时重新同步
+        clock: 已同步的时钟，优先于 ntp_offset
+        lead: 提前返回的秒数（补偿主机到设备的点击延迟），0 表示准点
     """
     if not target_time_str or not target_time_str.strip():
         logger.info("未设置目标时间，立即执行")
         return
 
     target = datetime.strptime(target_time_str.strip(), "%Y-%m-%d %H:%M:%S")
-    ntp_offset = get_ntp_offset()
-    now = accurate_now(ntp_offset)
+    target_ns = int(target.timestamp()) * _NS - int(lead * _NS)
+    if clock is None:
+        if ntp_offset is None:
+            clock = ClockSync()
+            clock.sync()
+        else:
+            clock = ClockSync.from_offset(ntp_offset)
 
-    if now >= target:
+    diff = clock.remaining(target_ns)
+    if diff <= 0:
         logger.info("目标时间 {} 已过，立即执行", target_time_str)
         return
 
-    diff = (target - now).total_seconds()
-    logger.info("等待目标时间: {} (还剩 {:.1f}秒)", target_time_str, diff)
+    logger.info("等待目标时间: {} (还剩 {:.1f}秒{})", target_time_str, diff,
+                f", 提前 {lead * 1000:.0f}ms" if lead else "")
 
     # 阶段一：粗略休眠（节省 CPU）— 休眠到目标时间前 1 秒
     while True:
-        now = accurate_now(ntp_offset)
-        remaining = (target - now).total_seconds()
+        remaining = clock.remaining(target_ns)
         if remaining <= 1.0:
             break
         if remaining > 10:
             logger.info("倒计时: 还剩 {:.0f}秒", remaining)
-            time.sleep(min(remaining - 1.0, 5.0))
+            if on_tick:
+                on_tick(remaining)
+            clock.maybe_resync(clock.remaining(target_ns))
+            remaining = clock.remaining(target_ns)
+            time.sleep(max(min(remaining - 1.0, 5.0), 0))
         else:
             time.sleep(0.1)
 
-    # 阶段二：忙等待以提升精度（最后约 1 秒）
+    # 阶段二：忙等待以提升精度（最后约 1 秒），直接比较单调时钟读数
     logger.info("进入精确等待...")
-    while accurate_now(ntp_offset) < target:
+    deadline = clock.deadline_ns(target_ns)
+    while time.perf_counter_ns() < deadline:
         pass  # 忙等待以达到毫秒级精度
 
     logger.info("已到达目标时间！立即执行。")
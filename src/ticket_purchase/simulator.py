@@ -0,0 +1,469 @@
+"""本地模拟设备：实现本项目用到的 u2.Device 接口子集，由脚本化的大麦页面状态机驱动。
+
+用于在没有真机、没有真实开售的情况下测量与回归 TicketWorkflow 的速度：
+
+    device = FakeDevice(Scenario(keyword="演唱会", rpc_latency=0.03))
+    TicketWorkflow(device, config).run()
+    device.app.submitted_at  # 提交订单的时刻（time.monotonic）
+"""
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from xml.sax.saxutils import quoteattr
+
+from loguru import logger
+
+from .hierarchy import LOCAL_SELECTOR_KEYS, HierarchySnapshot
+
+DAMAI_PACKAGE = "cn.damai"
+SCREEN_SIZE = (1080, 2400)
+
+BUY_BAR_ID = "cn.damai:id/trade_project_detail_purchase_status_bar_container_fl"
+
+
+@dataclass
+class Scenario:
+    """模拟场景：页面内容、延迟与干扰。"""
+    keyword: str = "演唱会"
+    cities: list = field(default_factory=lambda: ["北京", "上海", "长沙"])
+    # (场次描述, 状态)，状态为 "有票" / "预售" 时可购买
+    sessions: list = field(default_factory=lambda: [
+        ("03月14日 周五 19:30", "已售罄"), ("03月15日 周六 20:00", "有票"), ("03月16日 周日 20:00", "预售"),
+    ])
+    # (票档, 是否有票)
+    prices: list = field(default_factory=lambda: [("¥380", True), ("¥680", True), ("¥980", True)])
+    viewers: list = field(default_factory=lambda: ["张三", "李四"])
+    viewer_popup: bool = True  # 首次进入演出详情时弹出观演人弹窗
+    popup_rate: float = 0.0  # 每次页面跳转后出现广告弹窗的概率
+    rpc_latency: float = 0.02  # 普通 RPC 耗时（秒）
+    dump_latency: float = 0.08  # dump_hierarchy 耗时（秒）
+    page_delay: float = 0.3  # 页面跳转耗时（秒），期间仍显示旧页面
+    sale_opens_in: float = 0.0  # 设备创建后多久开售（秒），开售前购买按钮为 "即将开售"
+    app_version: str = "sim-1.0"
+    seed: int | None = None
+
+
+@dataclass
+class _Element:
+    text: str = ""
+    rid: str = ""
+    cls: str = "android.widget.TextView"
+    bounds: tuple = (0, 0, 0, 0)
+    action: object = None  # 点击回调；None 表示点击穿透到下层元素
+    desc: str = ""
+
+    def contains(self, x: int, y: int) -> bool:
+        left, top, right, bottom = self.bounds
+        return left <= x < right and top <= y < bottom
+
+
+def _noop():
+    pass
+
+
+class DamaiApp:
+    """大麦 App 页面状态机。
+
+    页面：home → search → results → detail → sku（购买浮层）→ confirm → paid；
+    覆盖层（观演人弹窗、观演人列表、广告弹窗）叠加在当前页面之上。
+    动作触发的跳转在 `page_delay` 后生效，期间界面仍为旧页面。
+    """
+
+    def __init__(self, scenario: Scenario):
+        self.scenario = scenario
+        self.rng = random.Random(scenario.seed)
+        self.created_at = time.monotonic()
+        self.sale_open_at = self.created_at + scenario.sale_opens_in
+        self.page = "home"
+        self.overlays: list[str] = []
+        self.history: list[str] = []
+        self.query = ""
+        self.city = ""
+        self.session = None
+        self.price = None
+        self.quantity = 1
+        self.selected_viewers: list[str] = []
+        self.viewer_popup_shown = False
+        self.submitted_at: float | None = None
+        self.taps = 0
+        self.wasted_taps = 0  # 未命中可操作元素、被弹窗遮挡、开售前点击购买或点击售罄票档
+        self._pending: tuple[str, float] | None = None
+        self._lock = threading.RLock()
+
+    # === 状态推进 ===
+
+    def _advance(self):
+        if self._pending and time.monotonic() >= self._pending[1]:
+            page = self._pending[0]
+            self._pending = None
+            self.history.append(self.page)
+            self.page = page
+            self._on_enter(page)
+
+    def _go(self, page: str):
+        self._pending = (page, time.monotonic() + self.scenario.page_delay)
+
+    def _on_enter(self, page: str):
+        if page == "detail" and self.scenario.viewer_popup and not self.viewer_popup_shown:
+            self.viewer_popup_shown = True
+            self.overlays.append("viewer")
+        if self.scenario.popup_rate and self.rng.random() < self.scenario.popup_rate:
+            self.overlays.append("ad")
+
+    @property
+    def sale_open(self) -> bool:
+        return time.monotonic() >= self.sale_open_at
+
+    # === 输入 ===
+
+    def tap(self, x: int, y: int):
+        with self._lock:
+            self._advance()
+            self.taps += 1
+            for element in reversed(self._elements()):
+                if element.action is not None and element.contains(x, y):
+                    element.action()
+                    return
+            self.wasted_taps += 1
+
+    def type_text(self, text: str, clear: bool = True):
+        with self._lock:
+            self._advance()
+            if self.page == "search":
+                self.query = text if clear else self.query + text
+
+    def press(self, key: str):
+        with self._lock:
+            self._advance()
+            if key == "back":
+                if self.overlays:
+                    self.overlays.pop()
+                elif self.history:
+                    self.page = self.history.pop()
+                self._pending = None
+            elif key == "enter" and self.page == "search" and self.query:
+                self._go("results")
+
+    # === 渲染 ===
+
+    def dump(self) -> str:
+        with self._lock:
+            self._advance()
+            w, h = SCREEN_SIZE
+            nodes = "".join(_render(i + 1, e) for i, e in enumerate(self._elements()))
+            return ("<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>"
+                    '<hierarchy rotation="0">'
+                    f'<node index="0" text="" resource-id="" class="android.widget.FrameLayout" '
+                    f'package="{DAMAI_PACKAGE}" content-desc="" clickable="false" enabled="true" '
+                    f'bounds="[0,0][{w},{h}]">{nodes}</node></hierarchy>')
+
+    def _elements(self) -> list[_Element]:
+        page = "detail" if self.page == "sku" else self.page
+        elements = getattr(self, f"_page_{page}")()
+        if self.page == "sku":
+            elements += self._sheet_sku()
+        for overlay in self.overlays:
+            elements += getattr(self, f"_overlay_{overlay}")()
+        return elements
+
+    def _page_home(self) -> list[_Element]:
+        return [
+            _Element("搜索演出、艺人、场馆", "cn.damai:id/homepage_header_search",
+                     "android.widget.LinearLayout", (40, 120, 900, 220), lambda: self._go("search")),
+            _Element("推荐", bounds=(40, 260, 200, 330)),
+            _Element("热门演出", bounds=(40, 360, 400, 430)),
+            _Element("首页", bounds=(0, 2300, 216, 2400), action=_noop),
+        ]
+
+    def _page_search(self) -> list[_Element]:
+        return [
+            _Element(self.query, "cn.damai:id/header_search_v2_input", "android.widget.EditText",
+                     (120, 100, 900, 200), _noop),
+            _Element("取消", bounds=(920, 100, 1060, 200), action=self._back),
+            _Element("搜索历史", bounds=(40, 260, 400, 320)),
+        ]
+
+    def _page_results(self) -> list[_Element]:
+        return [
+            _Element("", "", "androidx.recyclerview.widget.RecyclerView", (0, 280, 1080, 2300)),
+            _Element("搜索结果", bounds=(40, 200, 400, 270)),
+            _Element(self.scenario.keyword, "cn.damai:id/tv_word", bounds=(40, 300, 1040, 700),
+                     action=lambda: self._go("detail")),
+            _Element("演出 · 场次", bounds=(40, 720, 1040, 800)),
+        ]
+
+    def _page_detail(self) -> list[_Element]:
+        elements = [
+            _Element(self.scenario.keyword, bounds=(40, 200, 1040, 300)),
+            _Element("场次", bounds=(40, 600, 200, 660)),
+            _Element("票档", bounds=(240, 600, 400, 660)),
+        ]
+        for i, city in enumerate(self.scenario.cities):
+            left = 40 + i * 240
+            elements.append(_Element(city, bounds=(left, 400, left + 200, 480),
+                                     action=lambda c=city: setattr(self, "city", c)))
+        elements.append(_Element("", BUY_BAR_ID, "android.widget.FrameLayout",
+                                 (0, 2250, 1080, 2400), self._buy))
+        elements.append(_Element("立即购买" if self.sale_open else "即将开售", bounds=(0, 2250, 1080, 2400)))
+        return elements
+
+    def _sheet_sku(self) -> list[_Element]:
+        elements = [_Element("", "", "android.widget.FrameLayout", (0, 800, 1080, 2400), _noop),
+                    _Element("场次", bounds=(40, 820, 200, 880))]
+        y = 900
+        for i, (label, status) in enumerate(self.scenario.sessions):
+            select = (lambda i=i: setattr(self, "session", i)) if status in ("有票", "预售") else _noop
+            elements += [
+                _Element("", "", "android.widget.LinearLayout", (40, y, 1040, y + 110), select),
+                _Element(label, bounds=(60, y + 20, 600, y + 90)),
+                _Element(status, bounds=(800, y + 20, 1000, y + 90)),
+            ]
+            y += 120
+        elements.append(_Element("票档", bounds=(40, y + 20, 200, y + 80)))
+        y += 100
+        for i, (label, available) in enumerate(self.scenario.prices):
+            left = 40 + (i % 3) * 340
+            top = y + (i // 3) * 130
+            select = (lambda i=i: setattr(self, "price", i)) if available else self._wasted
+            elements.append(_Element(label, bounds=(left, top, left + 300, top + 110), action=select))
+            if not available:
+                elements.append(_Element("缺货登记", bounds=(left + 150, top, left + 300, top + 40)))
+        y += 130 * ((len(self.scenario.prices) + 2) // 3) + 20
+        elements += [
+            _Element("数量", bounds=(40, y, 200, y + 80)),
+            _Element("-", "img_jian", "android.widget.ImageView", (700, y, 780, y + 80),
+                     lambda: setattr(self, "quantity", max(1, self.quantity - 1)), desc="减少"),
+            _Element(f"{self.quantity}张", bounds=(800, y, 900, y + 80)),
+            _Element("+", "img_jia", "android.widget.ImageView", (920, y, 1000, y + 80),
+                     lambda: setattr(self, "quantity", min(6, self.quantity + 1)), desc="增加"),
+            _Element("确定", "btn_buy_view", "android.widget.Button", (40, 2250, 1040, 2380), self._confirm),
+        ]
+        return elements
+
+    def _page_confirm(self) -> list[_Element]:
+        return [
+            _Element("确认订单", bounds=(40, 120, 500, 200)),
+            _Element("订单信息", bounds=(40, 260, 500, 330)),
+            _Element("支付方式", bounds=(40, 1800, 500, 1870)),
+            _Element("立即提交", "cn.damai:id/bottom_submit", "android.widget.Button",
+                     (600, 2250, 1040, 2380), self._submit),
+        ]
+
+    def _page_paid(self) -> list[_Element]:
+        return [
+            _Element("支付", bounds=(40, 120, 300, 200)),
+            _Element("付款", bounds=(40, 260, 300, 330)),
+            _Element("微信", bounds=(40, 400, 300, 470), action=_noop),
+            _Element("支付宝", bounds=(40, 500, 300, 570), action=_noop),
+        ]
+
+    def _overlay_viewer(self) -> list[_Element]:
+        return [
+            _Element("", "", "android.widget.FrameLayout", (0, 0, 1080, 2400), self._wasted),
+            _Element("观演人信息", bounds=(40, 1450, 1040, 1530)),
+            _Element("预选实名观演人", bounds=(40, 2200, 520, 2350), action=self._open_viewer_list),
+            _Element("知道了", bounds=(560, 2200, 1040, 2350), action=self._close_overlay),
+        ]
+
+    def _overlay_viewer_list(self) -> list[_Element]:
+        elements = [_Element("", "", "android.widget.FrameLayout", (0, 0, 1080, 2400), self._wasted)]
+        for i, name in enumerate(self.scenario.viewers):
+            top = 1300 + i * 120
+            elements.append(_Element(name, bounds=(40, top, 1040, top + 100),
+                                     action=lambda n=name: self._toggle_viewer(n)))
+        elements.append(_Element("确定", bounds=(40, 2200, 1040, 2350), action=self._close_overlay))
+        return elements
+
+    def _overlay_ad(self) -> list[_Element]:
+        return [
+            _Element("", "", "android.widget.FrameLayout", (0, 0, 1080, 2400), self._wasted),
+            _Element("限时福利", bounds=(240, 900, 840, 1000)),
+            _Element("", "cn.damai:id/iv_close", "android.widget.ImageView", (800, 700, 900, 800),
+                     self._close_overlay),
+        ]
+
+    # === 动作 ===
+
+    def _back(self):
+        self.press("back")
+
+    def _wasted(self):
+        self.wasted_taps += 1
+
+    def _close_overlay(self):
+        if self.overlays:
+            self.overlays.pop()
+
+    def _open_viewer_list(self):
+        self.overlays[-1] = "viewer_list"
+
+    def _toggle_viewer(self, name: str):
+        if name in self.selected_viewers:
+            self.selected_viewers.remove(name)
+        else:
+            self.selected_viewers.append(name)
+
+    def _buy(self):
+        if not self.sale_open:
+            self.wasted_taps += 1
+            return
+        if self._pending is None:
+            self._go("sku")
+
+    def _confirm(self):
+        if self.session is None or self.price is None:
+            self.wasted_taps += 1
+            return
+        if self._pending is None:
+            self._go("confirm")
+
+    def _submit(self):
+        if self.submitted_at is None:
+            self.submitted_at = time.monotonic()
+            self._go("paid")
+
+
+def _render(index: int, e: _Element) -> str:
+    left, top, right, bottom = e.bounds
+    return (f'<node index="{index}" text={quoteattr(e.text)} resource-id={quoteattr(e.rid)} '
+            f'class="{e.cls}" package="{DAMAI_PACKAGE}" content-desc={quoteattr(e.desc)} '
+            f'clickable="{"true" if e.action is not None else "false"}" enabled="true" '
+            f'bounds="[{left},{top}][{right},{bottom}]" />')
+
+
+class FakeUiObject:
+    """u2 UiObject 的本地实现：在设备的 dump_hierarchy 上求值选择器，点击节点中心坐标。
+
+    只要设备提供 `dump_hierarchy()` 与 `click(x, y)` 即可使用（模拟设备与回放设备共用）。
+    经 DeviceProxy 访问时与 u2 对象一样被包装，每次调用受仲裁。
+    """
+
+    arbitrated = True
+
+    def __init__(self, device, selector: dict, index: int = 0):
+        unsupported = set(selector) - LOCAL_SELECTOR_KEYS
+        if unsupported:
+            raise ValueError(f"Unsupported selector keys: {sorted(unsupported)}")
+        self.device = device
+        self.selector = selector
+        self.index = index
+
+    def _nodes(self):
+        return HierarchySnapshot(self.device.dump_hierarchy()).query(**self.selector)
+
+    def _node(self):
+        nodes = self._nodes()
+        if len(nodes) <= self.index:
+            raise LookupError(f"UiObject not found: {self.selector}")
+        return nodes[self.index]
+
+    def wait(self, timeout: float = 10.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            if len(self._nodes()) > self.index:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    @property
+    def exists(self) -> bool:
+        return len(self._nodes()) > self.index
+
+    @property
+    def count(self) -> int:
+        return len(self._nodes())
+
+    @property
+    def info(self) -> dict:
+        return self._node().info
+
+    def __getitem__(self, index: int) -> "FakeUiObject":
+        return FakeUiObject(self.device, self.selector, index)
+
+    def click(self, timeout: float | None = None):
+        self.device.click(*self._node().center)
+
+    def clear_text(self):
+        self.click()
+        self.device.send_keys("", clear=True)
+
+    def set_text(self, text: str):
+        self.click()
+        self.device.send_keys(text, clear=True)
+
+
+class FakeDevice:
+    """模拟的 u2.Device：每次 RPC 按场景配置的耗时休眠后操作 `DamaiApp`。"""
+
+    def __init__(self, scenario: Scenario | None = None):
+        self.scenario = scenario or Scenario()
+        self.app = DamaiApp(self.scenario)
+        self.running = True
+        self.rpc_count = 0
+        self.dump_count = 0
+
+    def _rpc(self, latency: float | None = None):
+        self.rpc_count += 1
+        time.sleep(self.scenario.rpc_latency if latency is None else latency)
+
+    def __call__(self, **selector) -> FakeUiObject:
+        return FakeUiObject(self, selector)
+
+    @property
+    def info(self) -> dict:
+        self._rpc()
+        w, h = SCREEN_SIZE
+        return {"productName": "simulator", "displayWidth": w, "displayHeight": h, "screenOn": True}
+
+    def window_size(self) -> tuple[int, int]:
+        return SCREEN_SIZE
+
+    def dump_hierarchy(self, *args, **kwargs) -> str:
+        self._rpc(self.scenario.dump_latency)
+        self.dump_count += 1
+        return self.app.dump()
+
+    def click(self, x: int, y: int):
+        self._rpc()
+        self.app.tap(int(x), int(y))
+
+    def swipe_ext(self, direction: str, scale: float = 0.9, **kwargs):
+        self._rpc()
+        logger.debug("模拟滑动: {} ({})", direction, scale)
+
+    def send_keys(self, text: str, clear: bool = False):
+        self._rpc()
+        self.app.type_text(text, clear=clear)
+
+    def press(self, key: str):
+        self._rpc()
+        self.app.press(key)
+
+    def screen_on(self):
+        self._rpc()
+
+    def screenshot(self, *args, **kwargs):
+        self._rpc()
+        from PIL import Image
+        return Image.new("RGB", SCREEN_SIZE, (255, 255, 255))
+
+    def app_current(self) -> dict:
+        self._rpc()
+        if not self.running:
+            return {"package": "com.android.launcher", "activity": ".Launcher"}
+        return {"package": DAMAI_PACKAGE, "activity": f".{self.app.page}"}
+
+    def app_start(self, package: str, *args, **kwargs):
+        self._rpc()
+        if package == DAMAI_PACKAGE:
+            self.running = True
+
+    def app_wait(self, package: str, front: bool = False, timeout: float = 20.0) -> int:
+        self._rpc()
+        return 1 if package == DAMAI_PACKAGE and self.running else 0
+
+    def app_info(self, package: str) -> dict:
+        self._rpc()
+        return {"packageName": package, "versionName": self.scenario.app_version}
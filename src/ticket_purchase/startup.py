@@ -0,0 +1,83 @@
+"""启动耗时统计：记录重量级依赖的按需导入耗时与各启动阶段，输出冷启动报告。
+
+重量级依赖（uiautomator2、yaml、dotenv、LLM SDK）只在首次使用时经 `lazy_import` 导入，
+入口在关键阶段调用 `mark`，设备就绪后 `report` 输出：
+
+    启动耗时: 进程启动 → 设备就绪 1.84s
+      阶段 包导入        0.21s
+      ...
+      导入 uiautomator2  312ms
+
+更细的导入分析可使用 `python -X importtime -m ticket_purchase.main`。
+"""
+import importlib
+import os
+import sys
+import threading
+import time
+
+from loguru import logger
+
+# 本模块导入时刻（包导入开始后不久），无法读取进程启动时间时作为起点
+_IMPORTED = time.perf_counter()
+
+_lock = threading.Lock()
+_imports: dict[str, float] = {}  # 模块名 -> 导入耗时（秒）
+_phases: list[tuple[str, float]] = []  # (阶段名, 距起点秒数)
+
+
+def _process_age() -> float | None:
+    """进程已运行的秒数（Linux /proc），不可用时返回 None。"""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            # comm 字段可能含空格，从最后一个 ")" 之后解析；starttime 为第 22 个字段
+            fields = f.read().rsplit(b")", 1)[1].split()
+        start_ticks = int(fields[19])
+        with open("/proc/uptime", "rb") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# 起点（perf_counter 读数）：尽量取进程启动时刻，使报告包含解释器启动与包导入
+_age = _process_age()
+ORIGIN = _IMPORTED - _age if _age is not None and 0 <= _age < 60 else _IMPORTED
+
+
+def lazy_import(name: str):
+    """导入模块并记录首次导入耗时（已导入时直接返回）。"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    with _lock:
+        _imports.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+def mark(phase: str):
+    """记录启动阶段完成的时刻。"""
+    with _lock:
+        _phases.append((phase, time.perf_counter() - ORIGIN))
+
+
+def elapsed() -> float:
+    """距起点的秒数。"""
+    return time.perf_counter() - ORIGIN
+
+
+def report(title: str = "设备就绪"):
+    """输出启动耗时报告：各阶段耗时与按需导入的依赖耗时。"""
+    with _lock:
+        phases = list(_phases)
+        imports = dict(_imports)
+    total = elapsed()
+    logger.info("启动耗时: 进程启动 → {} {:.2f}s", title, total)
+    previous = 0.0
+    for phase, at in phases:
+        logger.info("  阶段 {:<12} {:>6.2f}s (+{:.0f}ms)", phase, at, (at - previous) * 1000)
+        previous = at
+    for name, seconds in sorted(imports.items(), key=lambda kv: kv[1], reverse=True):
+        logger.info("  导入 {:<16} {:>6.0f}ms", name, seconds * 1000)
@@ -0,0 +1,54 @@
+"""演练录制的坐标点击计划：开抢时直接回放坐标，跳过元素识别。"""
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from loguru import logger
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DEFAULT_PLAN_PATH = BASE_DIR / "config" / "tap_plan.json"
+
+
+@dataclass
+class PlannedStep:
+    """单个步骤的演练结果。"""
+    step: str  # 步骤名
+    taps: list = field(default_factory=list)  # [[x, y], ...]
+    wait: float = 0.0  # 最后一次点击到步骤结束的耗时（秒），回放时作为等待页面的参考
+    page: str = ""  # 步骤结束后的页面（本地分类结果）
+    replayable: bool = True  # 只包含坐标点击的步骤才可回放
+    burst: bool = False  # 演练时为连拍点击，回放时同样连拍（taps 只含一个坐标）
+
+
+@dataclass
+class TapPlan:
+    """演练录制的点击计划，只对相同分辨率与演出有效。"""
+    keyword: str
+    window: list  # [宽, 高]
+    steps: list = field(default_factory=list)  # list[PlannedStep]
+    created: str = ""
+
+    def step(self, name: str) -> PlannedStep | None:
+        for planned in self.steps:
+            if planned.step == name:
+                return planned
+        return None
+
+    def matches(self, keyword: str, window: tuple[int, int]) -> bool:
+        """计划是否适用于当前演出与设备分辨率。"""
+        return self.keyword == keyword and list(window) == list(self.window)
+
+    def save(self, path: str | Path = DEFAULT_PLAN_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.created:
+            self.created = time.strftime("%Y-%m-%d %H:%M:%S")
+        path.write_text(json.dumps(asdict(self), ensure_ascii=False, indent=2), encoding="utf-8")
+        logger.info("点击计划已保存: {} ({} 个步骤)", path, len(self.steps))
+
+    @staticmethod
+    def load(path: str | Path = DEFAULT_PLAN_PATH) -> "TapPlan":
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        data["steps"] = [PlannedStep(**s) for s in data.get("steps", [])]
+        return TapPlan(**data)
@@ -0,0 +1,123 @@
+"""运行追踪：记录步骤 / 识别策略 / 设备 RPC / LLM 调用 / 等待的耗时 span，导出 Chrome trace JSON。
+
+导出文件可直接在 chrome://tracing 或 https://ui.perfetto.dev 打开。
+通过环境变量 TRACE_ENABLED=true 启用，未启用时 `span` 几乎没有开销。
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from loguru import logger
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+TRACE_DIR = BASE_DIR / "logs" / "traces"
+
+# 运行结束时输出的最慢 span 数量
+SLOWEST_SPANS = 15
+
+
+class Tracer:
+    """线程安全的 span 记录器。
+
+    span 以 (名称, 类别, 开始 ns, 时长 ns, 线程 id, 线程名, 参数) 保存，
+    时间戳来自 perf_counter_ns。
+    """
+
+    def __init__(self, enabled: bool | None = None):
+        self._enabled = enabled  # None 表示首次使用时读取 TRACE_ENABLED（.env 加载之后）
+        self._spans: list[tuple] = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        if self._enabled is None:
+            self._enabled = os.getenv("TRACE_ENABLED", "").lower() in ("1", "true", "yes")
+        return self._enabled
+
+    def enable(self, enabled: bool = True):
+        self._enabled = enabled
+
+    @contextmanager
+    def span(self, name: str, cat: str = "", **args):
+        """记录代码块的耗时。"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            thread = threading.current_thread()
+            with self._lock:
+                self._spans.append((name, cat, start, end - start, threading.get_native_id(),
+                                    thread.name, args))
+
+    def spans(self) -> list[tuple]:
+        with self._lock:
+            return list(self._spans)
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+
+    def export(self, path: str | Path) -> Path:
+        """导出 Chrome trace（Trace Event Format）JSON。"""
+        spans = self.spans()
+        pid = os.getpid()
+        events = []
+        threads = {}
+        for name, cat, start, duration, tid, thread_name, args in spans:
+            threads[tid] = thread_name
+            events.append({
+                "name": name, "cat": cat or "default", "ph": "X", "pid": pid, "tid": tid,
+                "ts": start / 1000, "dur": duration / 1000,
+                "args": {k: str(v) for k, v in args.items()},
+            })
+        for tid, thread_name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": thread_name}})
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"},
+                                   ensure_ascii=False), encoding="utf-8")
+        return path
+
+    def summary(self, limit: int = SLOWEST_SPANS):
+        """输出最慢的 span 与各类别的总耗时。"""
+        spans = self.spans()
+        if not spans:
+            return
+        logger.info("最慢的 {} 个 span:", min(limit, len(spans)))
+        logger.info("{:>9}  {:<6} {:<16} {}", "耗时(ms)", "类别", "线程", "名称")
+        for name, cat, _, duration, _, thread_name, _ in sorted(
+                spans, key=lambda s: s[3], reverse=True)[:limit]:
+            logger.info("{:>9.1f}  {:<6} {:<16} {}", duration / 1e6, cat, thread_name[:16], name)
+
+        totals: dict[str, list] = {}
+        for _, cat, _, duration, _, _, _ in spans:
+            entry = totals.setdefault(cat or "default", [0, 0])
+            entry[0] += 1
+            entry[1] += duration
+        for cat, (count, total) in sorted(totals.items(), key=lambda kv: kv[1][1], reverse=True):
+            logger.info("类别 {:<8} {:>5} 次, 共 {:.0f}ms", cat, count, total / 1e6)
+
+    def finish(self, label: str = "run") -> Path | None:
+        """运行结束：导出 trace、输出摘要并清空记录，未启用或无记录时返回 None。"""
+        if not self.enabled or not self.spans():
+            return None
+        path = TRACE_DIR / f"trace_{label}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.json"
+        self.export(path)
+        self.summary()
+        self.reset()
+        logger.info("Trace 已导出: {} (可在 ui.perfetto.dev 打开)", path)
+        return path
+
+
+# 进程内共享的追踪器
+tracer = Tracer()
@@ -1,15 +1,24 @@
 """核心抢票工作流编排。"""
+import threading
 import time
 from dataclasses import dataclass, field
 
-import yaml
 from loguru import logger
 
-from .detector import Detector
+from .arbiter import DeviceArbiter, DeviceProxy
+from .classifier import PageClassifier
+from .connection import ConnectionSupervisor
+from .detector import Detector, parse_json_response
 from .executor import Executor
-from .log import take_screenshot
-from .monitor import ensure_damai_running, wait_for_element
+from .hierarchy import COMPACT_FORMAT
+from .latency import measure_rpc_latency
+from .log import ScreenshotWriter, flush_debug_ring
+from .monitor import ensure_damai_running, wait_for_element, wait_for_settle
+from .recorder import RunRecorder
 from .recovery import RecoveryManager
+from .startup import lazy_import
+from .tapplan import PlannedStep, TapPlan
+from .trace import tracer
 
 
 @dataclass
@@ -23,11 +32,23 @@ class TicketConfig:
     target_time: str = ""  # 开抢时间，为空则立即执行
     if_commit_order: bool = True  # 是否提交订单
     max_retry: int = 3  # 最大重试次数
+    preposition: bool = False  # 开抢前预置到演出详情页，开抢时只执行点击预定及之后的步骤
+    latency_compensation: bool = False  # 开抢前测量设备延迟，按单程时延提前开抢
+    latency_percentile: float = 50.0  # 取 RPC 往返时延的该百分位估计单程时延
+    latency_margin_ms: float = 10.0  # 安全余量（毫秒）：提前量 = 单程时延 - 余量
+    burst_tap: bool = False  # 开抢时连续点击购买按钮，直到页面进入购买浮层
+    burst_rate: float = 8.0  # 连拍频率（次/秒）
+    burst_window: float = 3.0  # 连拍最长持续时间（秒）
 
     @staticmethod
     def load(path: str) -> "TicketConfig":
+        yaml = lazy_import("yaml")
         with open(path, "r", encoding="utf-8") as f:
             data = yaml.safe_load(f)
+        return TicketConfig.from_dict(data)
+
+    @staticmethod
+    def from_dict(data: dict) -> "TicketConfig":
         # 过滤已知字段，警告未知键
         known = set(TicketConfig.__dataclass_fields__)
         unknown = set(data) - known
@@ -54,22 +75,296 @@ class TicketWorkflow:
         "支付页面": ["支付", "付款", "微信", "支付宝"],
     }
 
-    def __init__(self, device, config: TicketConfig):
+    # 本地页面识别置信度低于该阈值时才询问 LLM
+    LOCAL_PAGE_CONFIDENCE = 0.5
+
+    def __init__(self, device, config: TicketConfig, stop_event=None, on_order_submitted=None):
+        # 所有模块经同一仲裁器访问设备：工作流 RPC 优先于后台弹窗监听
+        self.arbiter = device.arbiter if isinstance(device, DeviceProxy) else DeviceArbiter(device)
+        device = self.arbiter.proxy()
         self.device = device
         self.config = config
+        self.stop_event = stop_event  # 外部停止信号（如多设备中其他设备已成功）
+        self.on_order_submitted = on_order_submitted  # 订单提交成功后立即调用
         self.detector = Detector(device)
-        self.executor = Executor(device)
-        # 共享 LLM client 给 recovery 模块
-        self.recovery = RecoveryManager(device, llm_client=self.detector._llm)
+        self.executor = Executor(device, hierarchy=self.detector.hierarchy)
+        # 共享 LLM client、层级快照与定位缓存给 recovery 模块
+        self.recovery = RecoveryManager(device, llm_client=self.detector._llm,
+                                        hierarchy=self.detector.hierarchy,
+                                        locators=self.detector.locators,
+                                        arbiter=self.arbiter)
+        self.classifier = PageClassifier(self.PAGE_SIGNATURES)
+        self.screenshots = ScreenshotWriter.from_env(device, arbiter=self.arbiter)
+        # 运行录制（RECORD_ENABLED）：记录每次 dump 与执行器动作，供离线回放分析
+        self.recorder = RunRecorder.from_env()
+        self.detector.hierarchy.recorder = self.recorder
+        self.executor.recorder = self.recorder
         self._current_step_index = 0
+        self.prepositioned = False  # 已通过 prepare() 停在演出详情页
+        self.tap_plan: TapPlan | None = None  # 开抢时回放的点击计划
+        self._plan_steps: list | None = None  # 演练录制中的步骤
+        self._sheet_decision: dict | None = None  # LLM 对购买浮层的合并决策（场次 / 票档 / 数量）
+        self.supervisor: ConnectionSupervisor | None = None  # 设备连接保活（由入口设置）
+
+    # 预置模式的开抢起点：此步骤及之后依赖库存，必须在开抢后执行
+    FIRE_STEP = "点击预定"
+
+    # 演练时不会真正执行的步骤（演练禁用提交订单），回放到此处时改走常规流程
+    NON_REPLAYABLE_STEPS = {"提交订单"}
+
+    # 连拍点击的停止条件：页面已离开演出详情进入以下页面
+    BURST_TARGET_PAGES = {"场次选择", "票档选择", "数量选择", "确认订单"}
+
+    # 连拍期间探测线程两次 dump 之间的最短间隔（秒），为点击 RPC 留出设备访问窗口
+    BURST_PROBE_INTERVAL = 0.05
+    # 探测 dump 最多占用的设备时间比例：dump 较慢（真机 300ms+）时按实测耗时拉长探测间隔，保证连拍频率
+    BURST_PROBE_SHARE = 0.5
+
+    # 同一步骤内连续点击（回放、增加张数）之间等待页面响应的最长时间（秒）
+    TAP_SETTLE = 0.3
+
+    # 倒计时保活：距开抢不足 KEEP_ALIVE_MARGIN 秒时不再操作设备，
+    # 不足 REPREPARE_BUDGET 秒时不再重新预置（完整预置可能耗时数十秒，会错过开抢时刻）
+    KEEP_ALIVE_MARGIN = 3.0
+    REPREPARE_BUDGET = 60.0
+
+    def _steps(self) -> list:
+        return [
+            ("启动应用", self._step_launch_app),
+            ("搜索演出", self._step_search_event),
+            ("选择城市", self._step_select_city),
+            ("处理观演人弹窗", self._step_handle_viewer_popup),
+            ("点击预定", self._step_click_buy),
+            ("选择场次", self._step_select_session),
+            ("选择票档", self._step_select_price),
+            ("选择张数", self._step_select_quantity),
+            ("点击确定", self._step_confirm_purchase),
+            ("提交订单", self._step_submit_order),
+        ]
 
     def run(self) -> bool:
         """执行完整的抢票流程。
 
         订单提交成功返回 True。
         """
+        if self.tap_plan is None:
+            return self._run_steps(0, None, "开始执行抢票流程")
+        return self._run_steps(0, self._fire_index(), "开始执行抢票流程") and self.fire()
+
+    def prepare(self) -> bool:
+        """预置：提前执行与库存无关的步骤，停在演出详情页等待开抢。
+
+        成功后 `run_with_retry` 首次尝试只执行 `FIRE_STEP` 及之后的步骤。
+        """
+        fire_index = self._fire_index()
+        self.prepositioned = self._run_steps(0, fire_index, "开始预置流程（开抢前）")
+        if self.prepositioned:
+            logger.info("预置完成，已停在演出详情页")
+        return self.prepositioned
+
+    def fire(self) -> bool:
+        """开抢：从 `FIRE_STEP` 开始执行时间敏感的步骤（有点击计划时回放）。"""
+        if self.tap_plan is not None:
+            return self._replay_plan()
+        return self._run_steps(self._fire_index(), None, "开抢：从点击预定开始执行")
+
+    # === 演练与回放 ===
+
+    def rehearse(self, plan_path) -> bool:
+        """演练：不提交订单地执行完整流程，录制每步的点击坐标并保存点击计划。"""
+        commit = self.config.if_commit_order
+        self.config.if_commit_order = False
+        self._plan_steps = []
+        try:
+            success = self.run()
+        finally:
+            self.config.if_commit_order = commit
+            recorded, self._plan_steps = self._plan_steps, None
+            self.executor.actions = None
+
+        if not success:
+            logger.error("演练失败，未保存点击计划")
+            return False
+
+        w, h = self.device.window_size()
+        TapPlan(keyword=self.config.keyword, window=[w, h], steps=recorded).save(plan_path)
+        return True
+
+    def use_tap_plan(self, plan: TapPlan) -> bool:
+        """启用点击计划，演出或分辨率不匹配时忽略。"""
+        window = self.device.window_size()
+        if not plan.matches(self.config.keyword, window):
+            logger.warning("点击计划与当前演出/分辨率不匹配 (计划: '{}' {}, 当前: '{}' {})，忽略",
+                           plan.keyword, plan.window, self.config.keyword, list(window))
+            return False
+        self.tap_plan = plan
+        logger.info("已启用点击计划 ({} 个步骤, 录制于 {})", len(plan.steps), plan.created)
+        return True
+
+    def _recording(self, step_name: str, step_func):
+        """包装步骤函数：每次尝试重新记录动作，成功后写入演练结果。"""
+        def wrapper() -> bool:
+            self.executor.actions = []
+            success = step_func()
+            if success:
+                self._record_step(step_name)
+            return success
+        return wrapper
+
+    def _record_step(self, step_name: str):
+        actions, self.executor.actions = self.executor.actions, None
+        taps = [[a[2], a[3]] for a in actions if a[1] in ("tap", "burst")]
+        burst = any(a[1] == "burst" for a in actions)
+        wait = time.monotonic() - actions[-1][0] if actions else 0.0
+        page = self._detect_current_page(refresh=True) or ""
+        replayable = (step_name not in self.NON_REPLAYABLE_STEPS
+                      and all(a[1] in ("tap", "burst") for a in actions)
+                      and (not burst or len(taps) == 1))
+        self._plan_steps.append(PlannedStep(step_name, taps, round(wait, 3), page, replayable, burst))
+        logger.debug("演练录制: {} 点击={}{} 页面={} 可回放={}",
+                     step_name, taps, " (连拍)" if burst else "", page, replayable)
+
+    def _replay_plan(self) -> bool:
+        """回放点击计划；页面偏离或遇到不可回放步骤时回退到常规流程。"""
+        steps = self._steps()
+        start_time = time.time()
+        for idx in range(self._fire_index(), len(steps)):
+            step_name = steps[idx][0]
+            planned = self.tap_plan.step(step_name)
+            if planned is None or not planned.replayable:
+                logger.info("回放至 '{}' 结束 (耗时 {:.2f}秒)，继续常规流程",
+                            step_name, time.time() - start_time)
+                return self._run_steps(idx, None, f"常规流程：从 {step_name} 继续")
+
+            logger.info("--- {} (回放) ---", step_name)
+            with self.arbiter.critical(), tracer.span(step_name, "step", mode="replay"):
+                if planned.burst or (self.config.burst_tap and step_name == self.FIRE_STEP
+                                     and len(planned.taps) == 1):
+                    self._burst_tap(*planned.taps[0])
+                else:
+                    for i, (x, y) in enumerate(planned.taps):
+                        if i:
+                            self._settle(self.TAP_SETTLE)
+                        self.executor.tap(x, y)
+                arrived = self._await_page(planned.page, timeout=max(planned.wait * 2, 1.0))
+
+            if not arrived:
+                logger.warning("回放偏离: '{}' 后未到达页面 '{}'，回退常规流程", step_name, planned.page)
+                self.tap_plan = None
+                return self._run_steps(idx, None, f"常规流程：从 {step_name} 重试")
+
+        logger.info("点击计划回放完成，耗时 {:.2f}秒", time.time() - start_time)
+        return True
+
+    def _settle(self, timeout: float, changed: bool = True, baseline: str | None = None) -> bool:
+        """等待页面稳定，最多 timeout 秒（替代固定 sleep，页面响应快时立即返回）。
+
+        changed 为 True 时先等待页面相对 baseline 发生变化；未给出 baseline 时使用执行器
+        在最近一次动作前记录的指纹（弹窗监听线程在动作后的 dump 不会改变基准）。
+        """
+        if not changed:
+            baseline = None
+        elif baseline is None:
+            baseline = self.executor.baseline or self.detector.hierarchy.last_fingerprint
+        with tracer.span("settle", "sleep", timeout=timeout):
+            try:
+                return wait_for_settle(self.detector.hierarchy, timeout, baseline=baseline)
+            except Exception as e:
+                logger.debug("等待页面稳定失败，改为固定等待: {}", e)
+                time.sleep(timeout)
+                return False
+
+    def _await_page(self, expected: str, timeout: float) -> bool:
+        """轮询本地页面分类，直到到达预期页面或超时。"""
+        if not expected or expected == "未知":
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            page, _ = self.classifier.classify(self.detector.hierarchy.refresh())
+            if page == expected:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+
+    def calibrate_fire_lead(self) -> float:
+        """开抢前校准设备延迟，返回应提前开抢的秒数（未启用延迟补偿时为 0）。
+
+        提前量按单程时延估计，前提是开抢后的首个 RPC 就是点击：只有已预置且按点击计划
+        回放 `FIRE_STEP` 时才成立；常规流程点击前还要 dump 与识别，提前开抢只会让识别
+        看到开售前的页面，此时返回 0。
+        """
+        if not self.config.latency_compensation:
+            return 0.0
+        if not self._fire_starts_with_tap():
+            logger.info("延迟补偿: 开抢首个动作不是预置点击（未预置或无可回放的点击计划），不提前开抢")
+            return 0.0
+        profile = measure_rpc_latency(self.device)
+        margin = self.config.latency_margin_ms / 1000
+        lead = profile.fire_lead(self.config.latency_percentile, margin)
+        logger.info("延迟补偿: 提前 {:.0f}ms 开抢 (p{:g} 单程 {:.0f}ms, 余量 {:.0f}ms)",
+                    lead * 1000, self.config.latency_percentile,
+                    profile.one_way(self.config.latency_percentile) * 1000, margin * 1000)
+        return lead
+
+    def _fire_starts_with_tap(self) -> bool:
+        """开抢后的首个设备动作是否为点击计划中预置的点击（无需先 dump 识别）。"""
+        if not self.prepositioned or self.tap_plan is None:
+            return False
+        planned = self.tap_plan.step(self.FIRE_STEP)
+        return planned is not None and planned.replayable and bool(planned.taps)
+
+    def keep_alive(self, remaining: float | None = None):
+        """倒计时期间保持预置的演出详情页可用（由 wait_until 以距开抢的秒数周期调用）。
+
+        页面丢失且无法恢复时重新预置，仍失败则开抢后执行完整流程。每次操作设备前检查剩余时间，
+        保证回调在开抢前返回：不足 `KEEP_ALIVE_MARGIN` 秒时不再操作，不足 `REPREPARE_BUDGET` 秒时不再重新预置。
+        """
+        if not self.prepositioned:
+            return
+        deadline = time.monotonic() + remaining if remaining is not None else None
+
+        def time_left() -> float:
+            return deadline - time.monotonic() if deadline is not None else float("inf")
+
+        if time_left() < self.KEEP_ALIVE_MARGIN:
+            return
+        try:
+            self.device.screen_on()
+            self.recovery.ensure_in_app()
+            page = self._detect_current_page(refresh=True)
+            if page in (None, "演出详情"):
+                return
+
+            logger.warning("预置页面已变化 (当前: {})，尝试恢复", page)
+            if time_left() < self.KEEP_ALIVE_MARGIN:
+                return
+            if self.recovery.dismiss_popup() and self._detect_current_page(refresh=True) == "演出详情":
+                return
+            if time_left() < self.KEEP_ALIVE_MARGIN:
+                return
+            self.recovery.press_back_to_recover()
+        except Exception as e:
+            logger.warning("预置页面检查失败: {}", e)
+            return
+
+        if time_left() < self.REPREPARE_BUDGET:
+            self.prepositioned = False
+            logger.warning("距开抢 {:.0f}秒，来不及重新预置，开抢后将执行完整流程", time_left())
+            return
+        if not self.prepare():
+            logger.warning("重新预置失败，开抢后将执行完整流程")
+
+    @property
+    def stopped(self) -> bool:
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def _fire_index(self) -> int:
+        return [name for name, _ in self._steps()].index(self.FIRE_STEP)
+
+    def _run_steps(self, start: int, end: int | None, title: str) -> bool:
+        """执行 steps[start:end]，全部成功返回 True。"""
         logger.info("=" * 50)
-        logger.info("开始执行抢票流程")
+        logger.info(title)
         logger.info("关键词: {}, 城市: {}, 场次: {}, 购票人: {}",
                     self.config.keyword, self.config.city or "自动",
                     self.config.session or "自动", self.config.users)
@@ -79,35 +374,44 @@ class TicketWorkflow:
         self.recovery.start_popup_watcher()
 
         try:
-            steps = [
-                ("启动应用", self._step_launch_app),
-                ("搜索演出", self._step_search_event),
-                ("选择城市", self._step_select_city),
-                ("处理观演人弹窗", self._step_handle_viewer_popup),
-                ("点击预定", self._step_click_buy),
-                ("选择场次", self._step_select_session),
-                ("选择票档", self._step_select_price),
-                ("选择张数", self._step_select_quantity),
-                ("点击确定", self._step_confirm_purchase),
-                ("提交订单", self._step_submit_order),
-            ]
-
-            for idx, (step_name, step_func) in enumerate(steps):
+            steps = self._steps()
+            end = len(steps) if end is None else end
+            fire_index = self._fire_index()
+
+            for idx in range(start, end):
+                step_name, step_func = steps[idx]
                 self._current_step_index = idx
+                if self.stopped:
+                    logger.info("收到停止信号，终止流程 (步骤: {})", step_name)
+                    return False
                 logger.info("--- {} ---", step_name)
+                if self.recorder is not None:
+                    self.recorder.mark(step_name)
 
                 # 检测当前页面状态，确保与预期步骤同步
                 if not self._verify_page_state(step_name, steps):
                     logger.error("页面状态异常，无法继续执行: {}", step_name)
-                    take_screenshot(self.device, f"page_mismatch_{step_name.replace(' ', '_')}")
+                    self.screenshots.capture(f"page_mismatch_{step_name.replace(' ', '_')}", failure=True)
+                    flush_debug_ring("step_failure")
                     return False
 
-                success = self.recovery.retry_step(step_func, step_name)
+                if self._plan_steps is not None:
+                    step_func = self._recording(step_name, step_func)
+                if idx >= fire_index:
+                    # 开抢后的步骤为关键区，暂停后台弹窗监听的设备访问
+                    with self.arbiter.critical(), tracer.span(step_name, "step"):
+                        success = self.recovery.retry_step(step_func, step_name)
+                else:
+                    with tracer.span(step_name, "step"):
+                        success = self.recovery.retry_step(step_func, step_name)
                 if not success:
                     logger.error("步骤失败: {}", step_name)
-                    take_screenshot(self.device, f"fail_{step_name.replace(' ', '_')}")
+                    self.screenshots.capture(f"fail_{step_name.replace(' ', '_')}", failure=True)
+                    flush_debug_ring("step_failure")
                     return False
-                take_screenshot(self.device, f"step_{step_name.replace(' ', '_')}")
+                if step_name == "提交订单" and self.config.if_commit_order and self.on_order_submitted:
+                    self.on_order_submitted()
+                self.screenshots.capture(f"step_{step_name.replace(' ', '_')}")
 
             elapsed = time.time() - start_time
             logger.info("=" * 50)
@@ -117,26 +421,51 @@ class TicketWorkflow:
 
         except Exception as e:
             logger.error("意外错误: {}", e)
-            take_screenshot(self.device, "exception")
+            self.screenshots.capture("exception", failure=True)
+            flush_debug_ring("step_failure")
             return False
         finally:
             self.recovery.stop_popup_watcher()
+            self.detector.locators.flush()
+            self.arbiter.log_stats()
 
     def run_with_retry(self) -> bool:
-        """带整体重试逻辑的流程执行。"""
+        """带整体重试逻辑的流程执行。
+
+        已预置时首次尝试只执行开抢步骤，之后的重试执行完整流程。
+        """
+        try:
+            return self._run_attempts()
+        finally:
+            # 等待后台截图写完（多设备子进程退出时不会执行 atexit）
+            self.screenshots.drain()
+            self.detector._llm.stop_heartbeat()
+            tracer.finish("run")
+            if self.recorder is not None:
+                self.recorder.close()
+
+    def _run_attempts(self) -> bool:
         for attempt in range(1, self.config.max_retry + 1):
+            if self.stopped:
+                logger.info("收到停止信号，不再重试")
+                return False
             logger.info("第 {}/{} 次尝试", attempt, self.config.max_retry)
-            if self.run():
+            if self.supervisor is not None and not self.supervisor.ensure_connected():
+                logger.warning("设备连接异常且重连失败: {}", self.supervisor.health.summary())
+            success = self.fire() if self.prepositioned else self.run()
+            self.prepositioned = False
+            if success:
                 logger.info("抢票成功！")
                 return True
 
             if attempt < self.config.max_retry:
-                logger.info("2秒后重试...")
-                time.sleep(2)
+                logger.info("等待页面稳定后重试...")
+                self._settle(2.0, changed=False)
                 # 按返回键重置状态
                 self.recovery.press_back_to_recover()
 
         logger.error("全部 {} 次尝试均失败", self.config.max_retry)
+        flush_debug_ring("run_failure")
         return False
 
     # === 页面状态检测 ===
@@ -155,7 +484,7 @@ class TicketWorkflow:
             return True
 
         for attempt in range(max_retries):
-            current_page = self._detect_current_page()
+            current_page = self._detect_current_page(refresh=attempt > 0)
             if not current_page or current_page == "未知":
                 logger.debug("无法识别当前页面，继续执行")
                 return True
@@ -177,7 +506,7 @@ class TicketWorkflow:
                 # 页面滞后，等待页面加载
                 logger.warning("页面滞后: 当前在 '{}', 等待加载到 '{}'",
                              current_page, expected_step)
-                time.sleep(1)
+                self._settle(1.0)
                 continue
             elif page_step_idx is not None and page_step_idx > current_step_idx:
                 # 页面超前，跳过中间步骤
@@ -190,14 +519,26 @@ class TicketWorkflow:
         logger.warning("页面状态验证超时，继续执行")
         return True
 
-    def _detect_current_page(self) -> str | None:
-        """使用 LLM 检测当前页面状态。"""
-        if not (self.detector._llm and self.detector._llm.enabled):
+    def _detect_current_page(self, refresh: bool = False) -> str | None:
+        """检测当前页面状态。
+
+        优先使用本地规则分类，置信度不足时才使用 LLM。
+        """
+        hierarchy = self.detector.hierarchy
+        try:
+            snapshot = hierarchy.refresh() if refresh else hierarchy.get()
+        except Exception as e:
+            logger.debug("获取页面层级失败: {}", e)
             return None
 
-        import json
+        page, confidence = self.classifier.classify(snapshot)
+        if confidence >= self.LOCAL_PAGE_CONFIDENCE:
+            return page
+
+        if not (self.detector._llm and self.detector._llm.enabled):
+            return None
 
-        prompt = """分析以下 Android UI XML，判断当前页面处于抢票流程的哪个阶段。
+        prompt = """分析以下 Android 界面节点列表，判断当前页面处于抢票流程的哪个阶段。
 
 可能的页面状态：
 - 首页: 大麦首页，有搜索框、推荐内容
@@ -216,27 +557,16 @@ class TicketWorkflow:
 只输出 JSON:
 {"page": "页面状态", "confidence": 0.0-1.0, "reason": "判断依据"}
 
-XML (末尾是最上层):
+""" + COMPACT_FORMAT + """
+
+节点 (末尾是最上层):
 """
         try:
-            xml_full = self.device.dump_hierarchy()
-            # 取末尾部分（弹窗等覆盖层）+ 中间部分（主要内容）
-            if len(xml_full) > 30000:
-                xml = xml_full[-25000:]
-            else:
-                xml = xml_full
-
-            response = self.detector._llm.chat(prompt + xml)
+            response = self.detector._llm.chat(prompt + snapshot.compact())
             if not response:
                 return None
 
-            json_str = response.strip()
-            if "```json" in json_str:
-                json_str = json_str.split("```json")[1].split("```")[0].strip()
-            elif "```" in json_str:
-                json_str = json_str.split("```")[1].split("```")[0].strip()
-
-            result = json.loads(json_str)
+            result = parse_json_response(response)
             logger.debug("LLM 页面识别: {}", result)
 
             if result.get("confidence", 0) >= 0.6:
@@ -294,7 +624,7 @@ XML (末尾是最上层):
     def _step_launch_app(self) -> bool:
         """步骤：确保大麦 App 正在运行。"""
         ensure_damai_running(self.device)
-        time.sleep(2)  # 等待首页加载
+        self._settle(2.0, changed=False)  # 等待首页加载
         return True
 
     def _step_search_event(self) -> bool:
@@ -314,7 +644,7 @@ XML (末尾是最上层):
             return False
 
         self.executor.click(search)
-        time.sleep(0.5)
+        self._settle(0.5)
 
         # 输入关键词
         input_box = self.detector.find("search input", className="android.widget.EditText")
@@ -327,7 +657,7 @@ XML (末尾是最上层):
 
         # 按回车搜索
         self.executor.press_key("enter")
-        time.sleep(1.5)
+        self._settle(1.5)
 
         # 点击第一个搜索结果
         result = self.detector.find(
@@ -337,7 +667,7 @@ XML (末尾是最上层):
         )
         if result:
             self.executor.click(result)
-            time.sleep(1.5)
+            self._settle(1.5)
             return True
 
         # 备用方案：点击 RecyclerView 中第一项
@@ -350,7 +680,7 @@ XML (末尾是最上层):
             # 点击上方区域中心（第一个结果通常在此处）
             w, h = self.device.window_size()
             self.executor.tap(w // 2, h // 4)
-            time.sleep(1.5)
+            self._settle(1.5)
             return True
 
         logger.error("未找到搜索结果")
@@ -362,7 +692,7 @@ XML (末尾是最上层):
             logger.info("未配置城市，跳过城市选择")
             return True
 
-        time.sleep(1)
+        self._settle(1.0, changed=False)
 
         # 查找城市
         city = self.detector.find(
@@ -373,13 +703,13 @@ XML (末尾是最上层):
         if city:
             self.executor.click(city)
             logger.info("已选择城市: {}", self.config.city)
-            time.sleep(0.5)
+            self._settle(0.5)
             return True
 
         # 尝试滚动查找
         for _ in range(3):
             self.executor.swipe("left", scale=0.5)  # 城市列表可能是横向滚动
-            time.sleep(0.3)
+            self._settle(0.3)
             city = self.detector.find(
                 f"city: {self.config.city}",
                 textContains=self.config.city,
@@ -388,7 +718,7 @@ XML (末尾是最上层):
             if city:
                 self.executor.click(city)
                 logger.info("滑动后已选择城市: {}", self.config.city)
-                time.sleep(0.5)
+                self._settle(0.5)
                 return True
 
         # 使用 LLM 查找
@@ -401,10 +731,20 @@ XML (末尾是最上层):
         return True
 
     def _llm_select_city(self) -> bool:
-        """使用 LLM 智能选择城市。"""
-        import json
+        """使用 LLM 智能选择城市（结果按页面与 App 版本缓存）。"""
+        city = self.detector.resolve_cached(
+            f"{self.config.keyword}|city|{self.config.city}", self._llm_query_city,
+        )
+        if city:
+            self.executor.click(city)
+            logger.info("LLM 已选择城市: {}", self.config.city)
+            self._settle(0.5)
+            return True
+        return False
 
-        prompt = f"""分析以下 Android UI XML，找到城市/观演地选择列表。
+    def _llm_query_city(self, snapshot) -> dict | None:
+        """询问 LLM 城市的定位选择器。"""
+        prompt = f"""分析以下 Android 界面节点列表，找到城市/观演地选择列表。
 
 任务：找到并定位城市 "{self.config.city}"。
 
@@ -416,44 +756,30 @@ XML (末尾是最上层):
 只输出 JSON:
 {{"found": true/false, "strategy": "resourceId"|"text"|"textContains", "value": "定位值", "reason": "说明"}}
 
-XML:
+{COMPACT_FORMAT}
+
+节点:
 """
         try:
-            xml_full = self.device.dump_hierarchy()
-            xml = xml_full[:30000] if len(xml_full) > 30000 else xml_full
-
-            response = self.detector._llm.chat(prompt + xml)
+            response = self.detector._llm.chat(prompt + snapshot.compact())
             if not response:
-                return False
-
-            json_str = response.strip()
-            if "```json" in json_str:
-                json_str = json_str.split("```json")[1].split("```")[0].strip()
-            elif "```" in json_str:
-                json_str = json_str.split("```")[1].split("```")[0].strip()
+                return None
 
-            result = json.loads(json_str)
+            result = parse_json_response(response)
             logger.debug("LLM 城市选择: {}", result)
 
             if not result.get("found", False):
-                return False
+                return None
 
             strategy = result.get("strategy", "")
             value = result.get("value", "")
-
             if strategy and value:
-                selector = {strategy: value}
-                element = self.device(**selector)
-                if element.exists(timeout=2.0):
-                    element.click()
-                    logger.info("LLM 已选择城市: {} ({})", self.config.city, selector)
-                    time.sleep(0.5)
-                    return True
+                return {strategy: value}
 
         except Exception as e:
             logger.debug("LLM 城市选择失败: {}", e)
 
-        return False
+        return None
 
     def _step_handle_viewer_popup(self) -> bool:
         """步骤：处理预填观演人弹窗（可选步骤）。
@@ -481,7 +807,7 @@ XML:
             if know_btn:
                 self.executor.click(know_btn)
                 logger.info("点击知道了，跳过观演人弹窗")
-                time.sleep(0.3)
+                self._settle(0.3)
                 return True
             # 没有弹窗，直接跳过此步骤
             logger.info("未检测到观演人弹窗，跳过此步骤")
@@ -498,7 +824,7 @@ XML:
             if preselect_btn:
                 self.executor.click(preselect_btn)
                 logger.info("点击预选实名观演人")
-                time.sleep(0.5)
+                self._settle(0.5)
 
                 # 选择配置的观演人
                 selected = 0
@@ -512,7 +838,7 @@ XML:
                         self.executor.click(user_el)
                         logger.info("已选择观演人: {}", user_name)
                         selected += 1
-                        time.sleep(0.2)
+                        self._settle(0.2)
                     else:
                         logger.warning("未找到观演人: {}", user_name)
 
@@ -526,7 +852,7 @@ XML:
                     if confirm:
                         self.executor.click(confirm)
                         logger.info("确认观演人选择")
-                        time.sleep(0.5)
+                        self._settle(0.5)
                         return True
 
         # 回退：点击 "知道了" 跳过
@@ -538,14 +864,14 @@ XML:
         if skip_btn:
             self.executor.click(skip_btn)
             logger.info("跳过观演人预选")
-            time.sleep(0.5)
+            self._settle(0.5)
             return True
 
         # 尝试 LLM 处理
         if self.detector._llm and self.detector._llm.enabled:
             logger.info("使用 LLM 处理观演人弹窗")
             # 弹窗监听会处理
-            time.sleep(2)
+            self._settle(2.0)
             return True
 
         logger.warning("观演人弹窗处理失败，继续执行")
@@ -553,7 +879,7 @@ XML:
 
     def _step_select_session(self) -> bool:
         """步骤：选择场次（显示有票/预售的场次）。"""
-        time.sleep(1)
+        self._settle(1.0, changed=False)
 
         # 使用 LLM 智能选择场次
         if self.detector._llm and self.detector._llm.enabled:
@@ -579,87 +905,115 @@ XML:
                         logger.debug("场次状态位置: {}, 点击偏移位置: ({}, {})", bounds, x, y)
                         self.executor.tap(x, y)
                         logger.info("已选择可购买场次 ({})", status_text)
-                        time.sleep(0.5)
+                        self._settle(0.5)
                         return True
                 except Exception as e:
                     logger.debug("获取场次位置失败: {}", e)
                     # 尝试直接点击
                     self.executor.click(session)
                     logger.info("已点击场次状态 ({})", status_text)
-                    time.sleep(0.5)
+                    self._settle(0.5)
                     return True
 
         logger.warning("未找到可购买场次，继续执行")
         return True
 
     def _llm_select_session(self) -> bool:
-        """使用 LLM 智能选择场次。"""
-        import json
+        """使用 LLM 智能选择场次（结果按页面与 App 版本缓存）。
+
+        场次的 LLM 查询同时决定同一购买浮层上的票档与数量按钮，后续步骤直接使用；
+        场次命中定位缓存时不询问 LLM，决策由后续步骤在需要时获取（每个浮层一次）。
+        """
+        self._sheet_decision = None
+        session = self.detector.resolve_cached(
+            f"{self.config.keyword}|session|{self.config.session}",
+            lambda snapshot: self._sheet(snapshot).get("session"),
+        )
+        if session:
+            self.executor.click(session)
+            logger.info("LLM 已选择场次")
+            self._settle(0.5)
+            return True
+        return False
 
-        prompt = f"""分析以下 Android UI XML，找到演唱会/演出的场次列表。
+    def _sheet(self, snapshot) -> dict:
+        """当前购买浮层的 LLM 决策：已有决策时直接返回，否则询问 LLM（每个浮层只询问一次）。"""
+        if self._sheet_decision is not None:
+            return self._sheet_decision
+        return self._llm_query_sheet(snapshot)
+
+    def _sheet_element(self, key: str, timeout: float = 0.0, fetch: bool = False):
+        """在当前页面上验证购买浮层决策中的元素；fetch=True 且尚无决策时先询问 LLM。"""
+        decision = self._sheet_decision
+        if decision is None and fetch and self.detector._llm.enabled:
+            try:
+                decision = self._llm_query_sheet(self.detector.hierarchy.get())
+            except Exception as e:
+                logger.debug("购买浮层决策获取失败: {}", e)
+                return None
+        selector = (decision or {}).get(key)
+        return self.detector.match(timeout, **selector) if selector else None
+
+    def _llm_query_sheet(self, snapshot) -> dict:
+        """一次 LLM 调用决定购买浮层上的场次、票档与数量 "+" 按钮。
 
-任务：找到一个可以购买的场次（显示"有票"或"预售"状态的）。
-{f'优先选择包含 "{self.config.session}" 的场次。' if self.config.session else '选择第一个可购买的场次。'}
+        返回 {"session": 选择器或 None, "price": ..., "plus": ...}，同时保存在
+        `_sheet_decision` 供票档 / 数量步骤使用（使用前仍会在当前页面上验证）。
+        """
+        quantity = max(len(self.config.users), 1)
+        if self.config.session:
+            session_rule = f'优先选择包含 "{self.config.session}" 的场次。'
+        else:
+            session_rule = "选择第一个可购买的场次。"
+        if self.config.price_index > 0:
+            price_rule = f"优先选择第 {self.config.price_index + 1} 个票档（如果可购买）。"
+        else:
+            price_rule = "选择第一个可购买的票档。"
+        prompt = f"""分析以下 Android 界面节点列表（大麦购买浮层），一次给出本页面上所有需要的选择。
 
-场次特征：
-- 通常显示日期时间信息（如 "03月15日 周六 20:00"）
-- 旁边有状态标签："有票"、"预售"、"即将开售"、"已售罄"
-- 只有 "有票" 和 "预售" 状态的才能购买
+1. 场次：找到一个可以购买的场次（显示"有票"或"预售"状态的）。{session_rule}
+   - 场次通常显示日期时间信息（如 "03月15日 周六 20:00"），旁边有状态标签："有票"、"预售"、"即将开售"、"已售罄"
+   - 返回场次条目的**可点击区域**：优先返回日期/时间文本或条目容器 resourceId，不要返回 "有票"、"预售" 等状态标签
+2. 票档：找到一个可以购买的票档。{price_rule}
+   - 只显示金额（如 "¥680"、"680元"）或显示 "预售"、"有票" = 可购买
+   - 显示 "缺货登记"、"缺货"、"售罄"、"暂无" 或 disabled = 不可购买
+3. 数量：需要购买 {quantity} 张。{'找到增加数量的 "+" 按钮。' if quantity > 1 else '无需调整数量，plus 返回 null。'}
 
-重要：返回场次条目的**可点击区域**，不是状态标签本身！
-- 优先返回场次的日期/时间文本（如 "03月15日"）
-- 或者返回场次条目的父容器 resourceId
-- 不要返回 "有票"、"预售" 等状态标签
+页面上不存在的项返回 null。定位方式 strategy 为 "resourceId"|"text"|"textContains"。
 
 只输出 JSON:
-{{"found": true/false, "strategy": "resourceId"|"text"|"textContains", "value": "场次日期或容器ID，不是状态标签", "session_info": "场次描述", "reason": "说明"}}
+{{"session": {{"strategy": "...", "value": "...", "info": "场次描述"}} 或 null, "price": {{"strategy": "...", "value": "...", "info": "票档描述如¥680"}} 或 null, "plus": {{"strategy": "...", "value": "..."}} 或 null, "reason": "说明"}}
 
-XML:
+{COMPACT_FORMAT}
+
+节点:
 """
+        decision = {"session": None, "price": None, "plus": None}
         try:
-            xml_full = self.device.dump_hierarchy()
-            # 场次通常在页面中部
-            xml = xml_full[:40000] if len(xml_full) > 40000 else xml_full
-
-            response = self.detector._llm.chat(prompt + xml)
+            response = self.detector._llm.chat(prompt + snapshot.compact())
             if not response:
-                return False
-
-            # 提取 JSON
-            json_str = response.strip()
-            if "```json" in json_str:
-                json_str = json_str.split("```json")[1].split("```")[0].strip()
-            elif "```" in json_str:
-                json_str = json_str.split("```")[1].split("```")[0].strip()
-
-            result = json.loads(json_str)
-            logger.debug("LLM 场次选择: {}", result)
-
-            if not result.get("found", False):
+                return decision
+
+            result = parse_json_response(response)
+            logger.debug("LLM 购买浮层决策: {}", result)
+            for key in decision:
+                item = result.get(key)
+                if isinstance(item, dict) and item.get("strategy") and item.get("value"):
+                    decision[key] = {item["strategy"]: item["value"]}
+            logger.info("LLM 购买浮层决策: 场次={} 票档={} 加号={}",
+                        (result.get("session") or {}).get("info", decision["session"]),
+                        (result.get("price") or {}).get("info", decision["price"]), decision["plus"])
+            if decision["session"] is None:
                 logger.warning("LLM 未找到可购买场次: {}", result.get("reason", ""))
-                return False
-
-            strategy = result.get("strategy", "")
-            value = result.get("value", "")
-            session_info = result.get("session_info", "")
-
-            if strategy and value:
-                selector = {strategy: value}
-                element = self.device(**selector)
-                if element.exists(timeout=2.0):
-                    element.click()
-                    logger.info("LLM 已选择场次: {} ({})", session_info, selector)
-                    time.sleep(0.5)
-                    return True
-
         except Exception as e:
-            logger.debug("LLM 场次选择失败: {}", e)
+            logger.debug("LLM 购买浮层决策失败: {}", e)
 
-        return False
+        self._sheet_decision = decision
+        return decision
 
     def _step_click_buy(self) -> bool:
         """步骤：点击购买按钮。"""
-        time.sleep(1)
+        self._settle(1.0, changed=False)
 
         # 尝试已知按钮 ID
         buy_ids = [
@@ -669,9 +1023,8 @@ XML:
         for rid in buy_ids:
             btn = self.detector.find(f"buy button ({rid})", resourceId=rid, timeout=2.0)
             if btn:
-                self.executor.click(btn)
+                self._press_buy(btn)
                 logger.info("已点击购买按钮")
-                time.sleep(1)
                 return True
 
         # 尝试文本匹配
@@ -679,18 +1032,89 @@ XML:
         for text in buy_texts:
             btn = self.detector.find(f"buy: {text}", textContains=text, timeout=1.0)
             if btn:
-                self.executor.click(btn)
+                self._press_buy(btn)
                 logger.info("已点击购买按钮: {}", text)
-                time.sleep(1)
                 return True
 
         # 最后手段：点击底部中心（购买按钮通常在底部）
         w, h = self.device.window_size()
-        self.executor.tap(w // 2, int(h * 0.95))
+        self._press_buy((w // 2, int(h * 0.95)))
         logger.warning("Tapped bottom center as buy button fallback")
-        time.sleep(1)
         return True
 
+    def _press_buy(self, target):
+        """点击购买按钮（元素或坐标）；启用连拍时按坐标连续点击直到页面跳转。"""
+        if not self.config.burst_tap:
+            if isinstance(target, tuple):
+                self.executor.tap(*target)
+            else:
+                self.executor.click(target)
+            self._settle(1.0)
+            return
+
+        if isinstance(target, tuple):
+            x, y = target
+        else:
+            bounds = target.info.get("bounds", {})
+            x = (bounds.get("left", 0) + bounds.get("right", 0)) // 2
+            y = (bounds.get("top", 0) + bounds.get("bottom", 0)) // 2
+        self._burst_tap(x, y)
+
+    def _burst_tap(self, x: int, y: int) -> bool:
+        """以 `burst_rate` 连续点击 (x, y)，最长 `burst_window` 秒。
+
+        探测线程轮询本地页面分类，页面进入 `BURST_TARGET_PAGES` 时立即停止点击。
+        返回窗口内是否检测到页面跳转。演练录制时整个连拍记为一个 "burst" 动作。
+        """
+        interval = 1.0 / max(self.config.burst_rate, 1.0)
+        window = self.config.burst_window
+        transitioned = threading.Event()
+        done = threading.Event()
+        result = {}
+        start = time.perf_counter()
+
+        def probe():
+            while not done.is_set():
+                probe_start = time.perf_counter()
+                try:
+                    page, _ = self.classifier.classify(self.detector.hierarchy.refresh())
+                except Exception as e:
+                    logger.debug("连拍探测失败: {}", e)
+                    page = None
+                if page in self.BURST_TARGET_PAGES:
+                    result["page"] = page
+                    result["elapsed"] = time.perf_counter() - start
+                    transitioned.set()
+                    return
+                cost = time.perf_counter() - probe_start
+                share = self.BURST_PROBE_SHARE
+                done.wait(max(self.BURST_PROBE_INTERVAL, cost * (1 - share) / share))
+
+        recorded = self.executor.actions
+        mark = len(recorded) if recorded is not None else None
+        prober = threading.Thread(target=probe, name="burst-probe", daemon=True)
+        prober.start()
+        taps = 0
+        next_tap = start
+        try:
+            while not transitioned.is_set() and time.perf_counter() - start < window:
+                self.executor.tap(x, y)
+                taps += 1
+                next_tap += interval
+                transitioned.wait(max(next_tap - time.perf_counter(), 0.0))
+        finally:
+            done.set()
+            prober.join(timeout=1.0)
+            if mark is not None:
+                # 回放时整体按连拍重放，而不是逐个回放每次点击
+                recorded[mark:] = [(time.monotonic(), "burst", x, y)]
+
+        if transitioned.is_set():
+            logger.info("连拍点击: {} 次, {:.0f}ms 后进入 {}", taps, result["elapsed"] * 1000, result["page"])
+            return True
+        logger.warning("连拍点击: {} 次, {:.1f}秒内未检测到页面跳转", taps, window)
+        return False
+
     def _step_select_price(self) -> bool:
         """步骤：选择票档。
 
@@ -698,7 +1122,7 @@ XML:
         - 只显示金额 = 可购买
         - 显示"缺货登记" = 不可购买
         """
-        time.sleep(0.5)
+        self._settle(0.5, changed=False)
 
         # 优先使用 LLM 智能选择
         if self.detector._llm and self.detector._llm.enabled:
@@ -725,17 +1149,37 @@ XML:
             if price:
                 self.executor.click(price)
                 logger.info("已选择票档")
-                time.sleep(0.3)
+                self._settle(0.3)
                 return True
 
         logger.warning("票档选择失败，继续执行")
         return True
 
     def _llm_select_price(self) -> bool:
-        """使用 LLM 智能选择可购买的票档。"""
-        import json
+        """使用 LLM 智能选择可购买的票档（结果按页面与 App 版本缓存）。
 
-        prompt = f"""分析以下 Android UI XML，找到票档/价格选择列表。
+        票档定位缓存未命中时使用购买浮层决策（尚无决策时在此获取），决策中没有票档时才单独询问 LLM。
+        """
+        def query(snapshot):
+            decided = self._sheet(snapshot).get("price")
+            if decided:
+                logger.debug("使用购买浮层决策中的票档: {}", decided)
+                return decided
+            return self._llm_query_price(snapshot)
+
+        price = self.detector.resolve_cached(
+            f"{self.config.keyword}|price|{self.config.price_index}", query,
+        )
+        if price:
+            self.executor.click(price)
+            logger.info("LLM 已选择票档")
+            self._settle(0.3)
+            return True
+        return False
+
+    def _llm_query_price(self, snapshot) -> dict | None:
+        """询问 LLM 可购买票档的定位选择器。"""
+        prompt = f"""分析以下 Android 界面节点列表，找到票档/价格选择列表。
 
 任务：找到一个可以购买的票档。
 {'优先选择第 ' + str(self.config.price_index + 1) + ' 个票档（如果可购买）。' if self.config.price_index > 0 else '选择第一个可购买的票档。'}
@@ -750,46 +1194,32 @@ XML:
 只输出 JSON:
 {{"found": true/false, "strategy": "resourceId"|"text"|"textContains", "value": "定位值", "price_info": "票档描述如¥680", "reason": "说明"}}
 
-XML:
+{COMPACT_FORMAT}
+
+节点:
 """
         try:
-            xml_full = self.device.dump_hierarchy()
-            xml = xml_full[:35000] if len(xml_full) > 35000 else xml_full
-
-            response = self.detector._llm.chat(prompt + xml)
+            response = self.detector._llm.chat(prompt + snapshot.compact())
             if not response:
-                return False
-
-            json_str = response.strip()
-            if "```json" in json_str:
-                json_str = json_str.split("```json")[1].split("```")[0].strip()
-            elif "```" in json_str:
-                json_str = json_str.split("```")[1].split("```")[0].strip()
+                return None
 
-            result = json.loads(json_str)
+            result = parse_json_response(response)
             logger.debug("LLM 票档选择: {}", result)
 
             if not result.get("found", False):
                 logger.warning("LLM 未找到可购买票档: {}", result.get("reason", ""))
-                return False
+                return None
 
             strategy = result.get("strategy", "")
             value = result.get("value", "")
-            price_info = result.get("price_info", "")
-
             if strategy and value:
-                selector = {strategy: value}
-                element = self.device(**selector)
-                if element.exists(timeout=2.0):
-                    element.click()
-                    logger.info("LLM 已选择票档: {} ({})", price_info, selector)
-                    time.sleep(0.3)
-                    return True
+                logger.info("LLM 定位票档: {} ({}={})", result.get("price_info", ""), strategy, value)
+                return {strategy: value}
 
         except Exception as e:
             logger.debug("LLM 票档选择失败: {}", e)
 
-        return False
+        return None
 
     def _step_select_quantity(self) -> bool:
         """Step: adjust ticket quantity."""
@@ -798,16 +1228,21 @@ XML:
             logger.info("Single ticket, skipping quantity adjustment")
             return True
 
-        # Find the + button
-        plus = self.detector.find("plus button", resourceId="img_jia", timeout=2.0)
+        # Find the + button: the sheet decision and known selectors on the current page first,
+        # then the sheet decision (one LLM call per sheet), waiting for the sheet only after that
+        plus = (self._sheet_element("plus")
+                or self.detector.match(0, resourceId="img_jia")
+                or self.detector.match(0, description="增加"))
+        if not plus:
+            plus = self._sheet_element("plus", timeout=1.0, fetch=True)
         if not plus:
-            plus = self.detector.find("plus button alt", description="增加", timeout=1.0)
+            plus = self.detector.match(2.0, resourceId="img_jia") or self.detector.match(1.0, description="增加")
 
         if plus:
             clicks = quantity_needed - 1
             for _ in range(clicks):
                 self.executor.click(plus)
-                time.sleep(0.05)
+                self._settle(self.TAP_SETTLE)
             logger.info("Set quantity to {}", quantity_needed)
         else:
             logger.warning("Quantity button not found, continuing")
@@ -821,7 +1256,7 @@ XML:
         if confirm:
             self.executor.click(confirm)
             logger.info("Clicked confirm button")
-            time.sleep(0.8)
+            self._settle(0.8)
             return True
 
         # Try text
@@ -830,7 +1265,7 @@ XML:
             if confirm:
                 self.executor.click(confirm)
                 logger.info("Clicked confirm: {}", text)
-                time.sleep(0.8)
+                self._settle(0.8)
                 return True
 
         logger.warning("No confirm button found, page may have auto-advanced")
@@ -13,6 +13,7 @@ fi
 
 # Parse arguments
 RUN_NOW=""
+EXTRA_ARGS=""
 USE_DOCKER=false
 CONFIG_PATH="config/config.yaml"
 ENV_PATH="config/.env"
@@ -21,6 +22,7 @@ while [[ $# -gt 0 ]]; do
     case $1 in
         --docker) USE_DOCKER=true; shift ;;
         --now) RUN_NOW="--now"; shift ;;
+        --rehearse|--replay) EXTRA_ARGS="$EXTRA_ARGS $1"; shift ;;
         --config) CONFIG_PATH="$2"; shift 2 ;;
         *) shift ;;
     esac
@@ -84,4 +86,4 @@ echo ""
 echo "Starting ticket automation..."
 # Set PYTHONPATH for local (non-installed) development
 export PYTHONPATH="${PYTHONPATH:+$PYTHONPATH:}$(dirname "$0")/src"
-python -m ticket_purchase.main --config "$CONFIG_PATH" --env "$ENV_PATH" $RUN_NOW
+python -m ticket_purchase.main --config "$CONFIG_PATH" --env "$ENV_PATH" $RUN_NOW $EXTRA_ARGS
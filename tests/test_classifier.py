@@ -0,0 +1,109 @@
+"""PageClassifier 测试：对手写的层级 XML 分类，覆盖覆盖层位置、resourceId 权重与歧义页面。"""
+from xml.sax.saxutils import quoteattr
+
+import pytest
+
+from ticket_purchase.classifier import PageClassifier
+from ticket_purchase.hierarchy import HierarchySnapshot
+from ticket_purchase.workflow import TicketWorkflow
+
+
+def _node(text: str = "", rid: str = "", desc: str = "") -> str:
+    return (f'<node text={quoteattr(text)} resource-id={quoteattr(rid)} class="android.widget.TextView" '
+            f'package="cn.damai" content-desc={quoteattr(desc)} clickable="false" enabled="true" '
+            f'bounds="[0,0][100,100]" />')
+
+
+def _snapshot(*nodes: str) -> HierarchySnapshot:
+    return HierarchySnapshot(f'<hierarchy rotation="0">{"".join(nodes)}</hierarchy>')
+
+
+# 演出详情页主体（不含覆盖层），与模拟器的详情页结构一致
+DETAIL = [
+    _node(rid="cn.damai:id/title_bar"),
+    _node("巡回演唱会 上海站"),
+    _node("北京"),
+    _node("上海"),
+    _node("场次"),
+    _node("票档"),
+    _node("2026-03-10 周二 19:30"),
+    _node("购票须知"),
+    _node(rid="cn.damai:id/trade_project_detail_purchase_status_bar_container_fl"),
+    _node("立即购买"),
+]
+
+VIEWER_POPUP = [
+    _node("观演人信息"),
+    _node("预选实名观演人"),
+    _node("知道了"),
+]
+
+
+@pytest.fixture
+def classifier() -> PageClassifier:
+    return PageClassifier(TicketWorkflow.PAGE_SIGNATURES)
+
+
+def test_detail_page(classifier):
+    page, confidence = classifier.classify(_snapshot(*DETAIL))
+    assert page == "演出详情"
+    # 命中 3 个关键词与 1 个 resourceId：(3 + 2) / (5 + 2 * 2)；"场次" 同时使搜索结果得 1/3
+    assert confidence == pytest.approx(5 / 9 - 0.5 * 1 / 3)
+
+
+def test_overlay_at_tail_wins_over_page_below(classifier):
+    # 观演人弹窗绘制在详情页之上（XML 末尾）：详情页特征仍在，但应识别为弹窗
+    page, confidence = classifier.classify(_snapshot(*DETAIL, *VIEWER_POPUP))
+    assert page == "观演人弹窗"
+    assert confidence >= TicketWorkflow.LOCAL_PAGE_CONFIDENCE
+
+
+def test_overlay_keywords_buried_under_page_are_discounted(classifier):
+    # 同样的文本出现在页面开头（非覆盖层区域）时按折扣计分，不应压过详情页
+    snapshot = _snapshot(*VIEWER_POPUP, *DETAIL, *[_node(f"猜你喜欢 {i}") for i in range(6)])
+    scores = classifier.score(snapshot)
+    assert scores["观演人弹窗"] == pytest.approx(3 * 0.4 / 3)
+    assert classifier.classify(snapshot)[0] == "演出详情"
+
+
+def test_sheet_overlay_matched_by_short_resource_id(classifier):
+    # 数量浮层的 resourceId 带包名前缀，按短 ID（"/" 之后部分）匹配
+    sheet = [
+        _node("数量"),
+        _node(rid="cn.damai:id/img_jian", desc="减少"),
+        _node("1张"),
+        _node(rid="cn.damai:id/img_jia", desc="增加"),
+    ]
+    page, _ = classifier.classify(_snapshot(*DETAIL, *sheet))
+    assert page == "数量选择"
+
+
+def test_resource_id_outweighs_keyword(classifier):
+    scores = classifier.score(_snapshot(_node("立即购买"), _node(rid="cn.damai:id/btn_buy")))
+    keyword_only = classifier.score(_snapshot(_node("立即购买"), _node(rid="cn.damai:id/other")))
+    assert scores["演出详情"] > keyword_only["演出详情"]
+
+
+def test_ambiguous_page_has_low_confidence(classifier):
+    # 只有 "场次"：搜索结果 / 演出详情 / 场次选择 均部分命中，置信度低于阈值（由 LLM 判定）
+    page, confidence = classifier.classify(_snapshot(_node("场次"), _node("2026-03-10")))
+    assert page in ("搜索结果", "演出详情", "场次选择")
+    assert 0 < confidence < TicketWorkflow.LOCAL_PAGE_CONFIDENCE
+
+
+def test_confidence_drops_with_close_runner_up():
+    classifier = PageClassifier({"A": ["甲", "乙"], "B": ["甲", "丙"]}, resource_ids={}, overlay_pages=set())
+    clear_page, clear = classifier.classify(_snapshot(_node("甲"), _node("乙")))
+    tied_page, tied = classifier.classify(_snapshot(_node("甲")))
+    assert clear_page == "A"
+    # A 全部命中 (1.0)，B 命中一半 (0.5)：1.0 * (1 - 0.5 * 0.5)
+    assert clear == pytest.approx(0.75)
+    # 并列时置信度减半
+    assert tied_page in ("A", "B")
+    assert tied == pytest.approx(0.25)
+
+
+def test_unknown_page(classifier):
+    assert classifier.classify(_snapshot(_node("设置"), _node("关于我们"))) == ("未知", 0.0)
+    assert classifier.classify(_snapshot()) == ("未知", 0.0)
+    assert classifier.classify(HierarchySnapshot("<hierarchy><node")) == ("未知", 0.0)
@@ -0,0 +1,87 @@
+"""JsonStreamScanner tests: string-aware brace matching over streamed chunks."""
+import json
+
+import pytest
+
+from ticket_purchase.detector import JsonStreamScanner, parse_json_response
+
+
+def scan(*chunks: str) -> tuple[str | None, int]:
+    """Feed chunks in order; return the first completed object and how many chunks it took."""
+    scanner = JsonStreamScanner()
+    for i, chunk in enumerate(chunks, 1):
+        result = scanner.feed(chunk)
+        if result is not None:
+            return result, i
+    return None, len(chunks)
+
+
+def test_single_chunk():
+    assert scan('{"found": true, "strategy": "text"}') == ('{"found": true, "strategy": "text"}', 1)
+
+
+def test_nested_object():
+    text = '{"a": {"b": {"c": 1}}, "d": [1, {"e": 2}]}'
+    result, _ = scan(text)
+    assert json.loads(result) == {"a": {"b": {"c": 1}}, "d": [1, {"e": 2}]}
+
+
+def test_braces_inside_strings():
+    text = '{"value": "a } b { c", "reason": "}}}"}'
+    result, _ = scan(text)
+    assert json.loads(result) == {"value": "a } b { c", "reason": "}}}"}
+
+
+def test_escaped_quotes_and_backslashes():
+    text = r'{"value": "say \"}\" now", "path": "C:\\", "next": "{"}'
+    result, _ = scan(text)
+    assert json.loads(result) == {"value": 'say "}" now', "path": "C:\\", "next": "{"}
+
+
+def test_leading_prose():
+    result, _ = scan('Sure, here is the answer: {"found": false}')
+    assert result == '{"found": false}'
+
+
+def test_leading_prose_with_balanced_braces_is_skipped():
+    # A balanced but invalid candidate in the prose is dropped and scanning resumes after its "{"
+    result, _ = scan('Using the format {x, y} the result is {"x": 1, "y": 2}')
+    assert json.loads(result) == {"x": 1, "y": 2}
+
+
+def test_fenced_code_block():
+    text = 'Result:\n```json\n{\n  "found": true,\n  "value": "立即购买"\n}\n```\nDone.'
+    result, _ = scan(text)
+    assert json.loads(result) == {"found": True, "value": "立即购买"}
+    assert parse_json_response(text) == json.loads(result)
+
+
+def test_stops_at_first_object_without_waiting_for_rest():
+    result, chunks = scan('{"a": 1}', ' trailing text', ' {"b": 2}')
+    assert (result, chunks) == ('{"a": 1}', 1)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_split_chunks(size):
+    text = r'```json' + '\n' + r'{"value": "a \"{\" b", "n": {"m": "}"}}' + '\n```'
+    chunks = [text[i:i + size] for i in range(0, len(text), size)]
+    result, used = scan(*chunks)
+    assert json.loads(result) == {"value": 'a "{" b', "n": {"m": "}"}}
+    # Completes on the chunk holding the closing brace, before the closing fence arrives
+    assert used == (text.rindex("}") // size) + 1
+
+
+def test_escape_split_across_chunks():
+    result, _ = scan('{"v": "a\\', '"', '}"}')
+    assert json.loads(result) == {"v": 'a"}'}
+
+
+def test_incomplete_object():
+    scanner = JsonStreamScanner()
+    assert scanner.feed('{"found": true, "value": "{') is None
+    assert scanner.feed('"') is None
+    assert scanner.feed('}') == '{"found": true, "value": "{"}'
+
+
+def test_no_object():
+    assert scan("no json here", " at all") == (None, 2)
@@ -0,0 +1,166 @@
+"""LocatorCache 测试：LRU 淘汰、App 版本隔离、按页面指纹 / 描述区分的键与原子落盘。"""
+import json
+import os
+
+import pytest
+
+from ticket_purchase import locators
+from ticket_purchase.hierarchy import HierarchySnapshot
+from ticket_purchase.locators import LocatorCache
+
+
+def _snapshot(*resource_ids: str, text: str = "") -> HierarchySnapshot:
+    nodes = "".join(f'<node resource-id="{rid}" text="{text}" bounds="[0,0][10,10]" />' for rid in resource_ids)
+    return HierarchySnapshot(f"<hierarchy>{nodes}</hierarchy>")
+
+
+class FakeDevice:
+    def __init__(self, version: str | None):
+        self.version = version
+        self.calls = 0
+
+    def app_info(self, package: str) -> dict:
+        self.calls += 1
+        if self.version is None:
+            raise RuntimeError("app not installed")
+        return {"versionName": self.version}
+
+
+DETAIL = _snapshot("cn.damai:id/btn_buy", "cn.damai:id/title")
+SHEET = _snapshot("img_jia", "btn_buy_view")
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "cache" / "locators.json"
+
+
+def test_lru_eviction(path):
+    cache = LocatorCache(path, max_entries=2)
+    cache.put("a", DETAIL, {"text": "a"})
+    cache.put("b", DETAIL, {"text": "b"})
+    assert cache.get("a", DETAIL) == {"text": "a"}  # a 成为最近使用
+    cache.put("c", DETAIL, {"text": "c"})
+
+    assert cache.get("b", DETAIL) is None
+    assert cache.get("a", DETAIL) == {"text": "a"}
+    assert cache.get("c", DETAIL) == {"text": "c"}
+    assert (cache.hits, cache.misses) == (3, 1)
+    # 落盘内容同样只保留两条，按 LRU 顺序
+    keys = [e["key"] for e in json.loads(path.read_text(encoding="utf-8"))["entries"]]
+    assert [k.rsplit("|", 1)[-1] for k in keys] == ["a", "c"]
+
+
+def test_load_keeps_most_recent_entries(path):
+    cache = LocatorCache(path, max_entries=3)
+    for desc in "abc":
+        cache.put(desc, DETAIL, {"text": desc})
+
+    smaller = LocatorCache(path, max_entries=2)
+    assert smaller.get("a", DETAIL) is None
+    assert smaller.get("c", DETAIL) == {"text": "c"}
+
+
+def test_app_version_change_resets_entries(path):
+    cache = LocatorCache(path)
+    device = FakeDevice("10.2.0")
+    assert cache.ensure_app_version(device) == "10.2.0"
+    cache.ensure_app_version(device)
+    assert device.calls == 1  # 每个进程只查询一次
+    cache.put("buy", DETAIL, {"resourceId": "cn.damai:id/btn_buy"})
+
+    upgraded = LocatorCache(path)
+    upgraded.ensure_app_version(FakeDevice("10.3.0"))
+    assert upgraded.get("buy", DETAIL) is None
+
+    same = LocatorCache(path)
+    same.ensure_app_version(FakeDevice("10.2.0"))
+    assert same.get("buy", DETAIL) == {"resourceId": "cn.damai:id/btn_buy"}
+
+
+def test_unknown_app_version(path):
+    cache = LocatorCache(path)
+    assert cache.ensure_app_version(FakeDevice(None)) == "unknown"
+    assert cache.ensure_app_version(FakeDevice("10.2.0")) == "unknown"
+    # 查询前写入的条目同样归入 "unknown"
+    assert LocatorCache(path)._key("buy", DETAIL).startswith("unknown|")
+
+
+def test_keys_isolated_by_page_and_desc(path):
+    cache = LocatorCache(path)
+    cache.put("buy", DETAIL, {"text": "立即购买"})
+
+    assert cache.get("buy", SHEET) is None
+    assert cache.get("confirm", DETAIL) is None
+    # 页面指纹只由 resourceId 集合决定：文本与顺序不同仍视为同一页面
+    same_page = _snapshot("cn.damai:id/title", "cn.damai:id/btn_buy", text="即将开售")
+    assert cache.get("buy", same_page) == {"text": "立即购买"}
+
+    cache.put("buy", SHEET, {"text": "确定"})
+    assert cache.get("buy", DETAIL) == {"text": "立即购买"}
+    assert cache.get("buy", SHEET) == {"text": "确定"}
+
+
+def test_get_returns_copy(path):
+    cache = LocatorCache(path)
+    cache.put("buy", DETAIL, {"text": "立即购买"})
+    cache.get("buy", DETAIL)["text"] = "changed"
+    assert cache.get("buy", DETAIL) == {"text": "立即购买"}
+
+
+def test_persistence_round_trip(path, monkeypatch):
+    replaced = []
+    real_replace = os.replace
+
+    def spy(src, dst):
+        replaced.append((str(src), str(dst)))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(locators.os, "replace", spy)
+    cache = LocatorCache(path)
+    cache.put("buy", DETAIL, {"resourceId": "cn.damai:id/btn_buy", "text": "立即购买"})
+    cache.get("buy", DETAIL)
+    cache.flush()
+
+    # 先写临时文件再 os.replace，目录中不残留临时文件
+    assert replaced == [(str(path.with_suffix(".tmp")), str(path))] * 2
+    assert sorted(p.name for p in path.parent.iterdir()) == ["locators.json"]
+
+    reloaded = LocatorCache(path)
+    assert reloaded.get("buy", DETAIL) == {"resourceId": "cn.damai:id/btn_buy", "text": "立即购买"}
+    entry = json.loads(path.read_text(encoding="utf-8"))["entries"][0]
+    assert entry["hits"] == 1
+
+    reloaded.discard("buy", DETAIL)
+    assert LocatorCache(path).get("buy", DETAIL) is None
+
+
+def test_flush_skipped_without_changes(path, monkeypatch):
+    cache = LocatorCache(path)
+    cache.put("buy", DETAIL, {"text": "立即购买"})
+    monkeypatch.setattr(locators.os, "replace", lambda *args: pytest.fail("unexpected write"))
+    cache.flush()
+    cache.discard("missing", DETAIL)
+
+
+def test_failed_write_keeps_previous_file(path, monkeypatch):
+    cache = LocatorCache(path)
+    cache.put("buy", DETAIL, {"text": "立即购买"})
+    before = path.read_text(encoding="utf-8")
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(locators.os, "replace", fail)
+    cache.put("confirm", SHEET, {"text": "确定"})
+    assert path.read_text(encoding="utf-8") == before
+    assert cache.get("confirm", SHEET) == {"text": "确定"}  # 内存中仍可用
+
+
+def test_ignores_stale_or_corrupt_file(path):
+    path.parent.mkdir(parents=True)
+    path.write_text(json.dumps({"version": 0, "entries": [{"key": "k", "selector": {}}]}), encoding="utf-8")
+    assert LocatorCache(path)._entries == {}
+
+    path.write_text("{not json", encoding="utf-8")
+    assert LocatorCache(path)._entries == {}
@@ -0,0 +1,193 @@
+"""scheduler 的 NTP 采样、偏移估计与单调时钟推算测试（使用本地 UDP NTP 替身，无需外网）。"""
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from ticket_purchase import scheduler
+from ticket_purchase.scheduler import ClockSync, NtpSample, estimate_offset, ntp_servers, sample_ntp
+
+_NS = 1_000_000_000
+NTP_EPOCH = 2208988800  # 1900-01-01 到 1970-01-01 的秒数
+
+
+def _to_ntp(seconds: float) -> tuple[int, int]:
+    seconds += NTP_EPOCH
+    return int(seconds), int((seconds % 1) * 2 ** 32)
+
+
+class NtpStandIn:
+    """本地 UDP NTP 服务器替身：服务器时间 = 本地时间 + offset，可为每次请求注入额外往返时延。"""
+
+    def __init__(self, offset: float, delays: list[float] | None = None):
+        self.offset = offset
+        self.delays = list(delays or [])
+        self.requests = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def __enter__(self) -> "NtpStandIn":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+
+    @property
+    def server(self) -> tuple[str, int]:
+        return "127.0.0.1", self.port
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                data, addr = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            delay = self.delays[self.requests % len(self.delays)] if self.delays else 0.0
+            self.requests += 1
+            # 先等待再打接收时间戳：额外时延计入 RTT，且偏移估计偏差 delay / 2
+            time.sleep(delay)
+            stamp = _to_ntp(time.time() + self.offset)
+            # LI=0, VN=3, Mode=4 (server)；originate 取自客户端的 transmit 时间戳
+            header = struct.pack("!B B B b 11I", (3 << 3) | 4, 2, 0, -20, 0, 0, 0, 0, 0,
+                                 *struct.unpack("!2I", data[40:48]), *stamp, *stamp)
+            self.sock.sendto(header, addr)
+
+
+def test_ntp_servers_parses_host_port(monkeypatch):
+    monkeypatch.setenv("NTP_SERVERS", "ntp.example.com, 127.0.0.1:12345,")
+    assert ntp_servers() == [("ntp.example.com", scheduler.NTP_PORT), ("127.0.0.1", 12345)]
+    monkeypatch.delenv("NTP_SERVERS")
+    assert ntp_servers() == [(host, scheduler.NTP_PORT) for host in scheduler.DEFAULT_NTP_SERVERS]
+
+
+def test_sample_ntp_against_stand_in():
+    pytest.importorskip("ntplib")
+    with NtpStandIn(offset=2.5) as stand_in:
+        samples = sample_ntp([stand_in.server], samples=3)
+
+    assert len(samples) == 3
+    assert stand_in.requests == 3
+    for sample in samples:
+        assert sample.server == f"127.0.0.1:{stand_in.port}"
+        assert sample.offset == pytest.approx(2.5, abs=0.05)
+        assert 0 <= sample.delay < 0.05
+
+
+def test_sample_ntp_stops_after_failure():
+    pytest.importorskip("ntplib")
+    # 绑定后不应答的端口：第一次请求超时后不再继续采样
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(("127.0.0.1", 0))
+    try:
+        start = time.monotonic()
+        samples = sample_ntp([silent.getsockname()], samples=4, timeout=0.2)
+        elapsed = time.monotonic() - start
+    finally:
+        silent.close()
+
+    assert samples == []
+    assert elapsed < 0.6
+
+
+def test_estimate_offset_drops_high_rtt_samples():
+    samples = [
+        NtpSample("a", offset=1.000, delay=0.010),
+        NtpSample("a", offset=1.002, delay=0.012),
+        NtpSample("b", offset=1.004, delay=0.014),
+        NtpSample("b", offset=1.250, delay=0.500),
+        NtpSample("c", offset=0.800, delay=0.400),
+        NtpSample("c", offset=1.300, delay=0.600),
+    ]
+    offset, delay = estimate_offset(samples)
+    # 保留 RTT 最小的一半 (1.000, 1.002, 1.004)，取中位数
+    assert offset == pytest.approx(1.002)
+    assert delay == pytest.approx(0.014)
+
+
+def test_estimate_offset_median_of_even_count():
+    samples = [NtpSample("a", offset=o, delay=0.01) for o in (0.1, 0.3, 0.2, 0.4)]
+    offset, _ = estimate_offset(samples)
+    # 全部 RTT 相同：保留按 RTT 稳定排序后的前两个 (0.1, 0.3)
+    assert offset == pytest.approx(0.2)
+
+
+def test_estimate_offset_edge_cases():
+    assert estimate_offset([]) is None
+    assert estimate_offset([NtpSample("a", offset=-0.5, delay=0.2)]) == (-0.5, 0.2)
+
+
+def test_clock_sync_filters_delayed_responses():
+    pytest.importorskip("ntplib")
+    # 一半请求额外延迟 200ms（偏移偏差约 +100ms），RTT 过滤后应得到真实偏移
+    with NtpStandIn(offset=-3.0, delays=[0.0, 0.2]) as stand_in:
+        clock = ClockSync(servers=[stand_in.server])
+        assert clock.sync()
+
+    assert clock.synced
+    assert clock.offset == pytest.approx(-3.0, abs=0.02)
+    assert clock.now_ns() == pytest.approx(time.time_ns() - 3 * _NS, abs=0.05 * _NS)
+
+
+def test_failed_sync_keeps_previous_anchor(monkeypatch):
+    clock = ClockSync.from_offset(1.5)
+    anchor = clock._anchor_perf, clock._anchor_true
+    monkeypatch.setattr(scheduler, "sample_ntp", lambda servers: [])
+
+    assert clock.sync() is False
+    assert clock.offset == 1.5
+    assert (clock._anchor_perf, clock._anchor_true) == anchor
+
+
+def test_deadline_and_remaining():
+    clock = ClockSync.from_offset(10.0)
+    target_ns = clock.now_ns() + 2 * _NS
+
+    assert clock.remaining(target_ns) == pytest.approx(2.0, abs=0.01)
+    assert clock.deadline_ns(target_ns) - time.perf_counter_ns() == pytest.approx(2 * _NS, abs=0.01 * _NS)
+    # 偏移只影响真实时间，不影响单调时钟上的等待时长
+    assert clock.now_ns() - time.time_ns() == pytest.approx(10 * _NS, abs=0.01 * _NS)
+
+
+def test_drift_math():
+    clock = ClockSync.from_offset(0.0)
+    clock._anchor_perf = 1_000 * _NS
+    clock._anchor_true = 1_700_000_000 * _NS
+    clock.drift = 100e-6  # 单调时钟每秒慢 100µs
+
+    # 锚点后 100 秒（单调时钟）的真实时间多出 10ms；deadline_ns 为其逆运算
+    target_ns = clock._anchor_true + 100 * _NS + 10_000_000
+    assert clock.deadline_ns(target_ns) == pytest.approx(clock._anchor_perf + 100 * _NS, abs=1_000)
+    assert clock.deadline_ns(clock._anchor_true) == clock._anchor_perf
+
+
+def test_estimate_drift():
+    clock = ClockSync.from_offset(0.0)
+    clock._anchor_perf, clock._anchor_true = 0, 1_700_000_000 * _NS
+    clock._estimate_drift()
+    assert clock._first == (0, 1_700_000_000 * _NS)
+
+    # 间隔不足 DRIFT_MIN_SPAN：不估计
+    clock._anchor_perf = 10 * _NS
+    clock._anchor_true = clock._first[1] + 10 * _NS + 1_000
+    clock._estimate_drift()
+    assert clock.drift == 0.0
+
+    # 1000 秒内真实时间多走 50ms：+50ppm
+    clock._anchor_perf = 1_000 * _NS
+    clock._anchor_true = clock._first[1] + 1_000 * _NS + 50_000_000
+    clock._estimate_drift()
+    assert clock.drift == pytest.approx(50e-6)
+
+    # 超出 MAX_DRIFT 视为异常，保留之前的估计
+    clock._anchor_true = clock._first[1] + 1_000 * _NS + 1_000_000_000
+    clock._estimate_drift()
+    assert clock.drift == pytest.approx(50e-6)